@@ -0,0 +1,73 @@
+import os
+import argparse
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utils.d4j_infra import extract_projects_and_bugs, checkout_repo
+from utils.test_impact import get_test_impact_index, read_all_tests, measure_test_coverage
+from utils.work_dir_manager import discard_tree
+
+parser = argparse.ArgumentParser(description='Records which test methods cover which lines of the classes each bug modifies, for --test_impact_dir of the repair scripts')
+parser.add_argument('--index_dir', type=str, default=os.path.expanduser("~/D4J_TEST_IMPACT"), help='Directory of the per-bug test impact indexes')
+parser.add_argument('--dataset_path', type=str, nargs='*', default=["./config/d4j_dataset.json"], help='Dataset JSON files whose bugs are indexed')
+parser.add_argument('--work_dir', type=str, default="/tmp/test_impact_work_dir", help='Where buggy versions are checked out while they are measured')
+parser.add_argument('--pristine_dir', type=str, default=None, help='Compiled checkouts to copy from, as in the repair scripts')
+parser.add_argument('--worktree_store', type=str, default=None, help='Per-project git repositories to materialize checkouts from, as in the repair scripts')
+parser.add_argument('--force', action='store_true', help='Re-index bugs that already have an index')
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of bugs measured in parallel')
+
+def index_bug(index, project, bug_id, work_dir, pristine_dir=None, worktree_store=None):
+    if not checkout_repo(project, bug_id, work_dir, pristine_dir, worktree_store=worktree_store):
+        return False
+    repo_dir_path = os.path.join(work_dir, f"{project}_{bug_id}")
+    try:
+        # The relevant tests are the only ones loading a modified class.
+        subprocess.run(['defects4j', 'test', '-r'], capture_output=True, cwd=repo_dir_path)
+        tests = read_all_tests(repo_dir_path)
+        modified_classes = subprocess.run(['defects4j', 'export', '-p', 'classes.modified'],
+                                          capture_output=True, text=True, cwd=repo_dir_path).stdout.split()
+        if not tests or not modified_classes:
+            logging.error(f"No relevant tests or modified classes for {project}-{bug_id}")
+            return False
+
+        instrument_classes_path = os.path.join(repo_dir_path, 'instrument_classes.txt')
+        with open(instrument_classes_path, 'w') as f:
+            f.write('\n'.join(modified_classes) + '\n')
+        test_coverage = {}
+        for test in tests:
+            covered = measure_test_coverage(repo_dir_path, test, instrument_classes_path)
+            if covered is None:
+                # A test whose coverage is unknown could touch any line.
+                logging.error(f"Not indexing {project}-{bug_id}: coverage of {test} is unknown")
+                return False
+            test_coverage[test] = covered
+        index.put(project, bug_id, test_coverage)
+        return True
+    finally:
+        discard_tree(repo_dir_path)
+
+def main():
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    projects_bugs = []
+    for dataset_path in args.dataset_path:
+        projects_bugs.extend(extract_projects_and_bugs(dataset_path))
+    projects_bugs = list(dict.fromkeys(projects_bugs))
+
+    index = get_test_impact_index(args.index_dir)
+    if not args.force:
+        projects_bugs = [(project, bug_id) for project, bug_id in projects_bugs if index.get(project, bug_id) is None]
+
+    def run_task(project_bug):
+        project, bug_id = project_bug
+        ok = index_bug(index, project, bug_id, args.work_dir, args.pristine_dir, args.worktree_store)
+        print(f"{project}-{bug_id}: {'OK' if ok else 'FAILED'}")
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(run_task, projects_bugs))
+    print(f"Indexed {sum(results)}/{len(results)} bugs in {index.index_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 import os
 import json
 import argparse
-from utils.d4j_infra import write_result_csv, checkout_repo, run_test, compile_repo, get_fix_code, save_test_results, save_compile_results, clear_work_dir, extract_projects_and_bugs, load_processed, save_processed
-from patch_validation import PatchValidation
+from utils.d4j_infra import get_fix_code, extract_projects_and_bugs, load_dataset_cached
+from utils.worker_pool import run_in_worker_pool
+from utils.run_journal import RunJournal
+from utils.completion_store import CompletionStore
+from utils.bug_scheduler import order_longest_first
+from utils.repair_pipeline import RepairPipeline
+from utils.repair_config import RepairConfig
+from utils.single_pass_repair import generate_bug_patches, validate_bug_patches, process_bug
+from utils.replay import RecordedOutputs, replay_results_path
 from calculate_results import analyze_results
 import logging
 import time
@@ -16,13 +23,36 @@ parser.add_argument('--baseline_dataset_path', type=str, default="../redwood/con
 parser.add_argument('--baseline_block_dataset_path', type=str, default="../redwood/config/block_multihunk.json", help='Path to the alternate dataset JSON file')
 parser.add_argument('--baseline_class_dataset_path', type=str, default="../redwood/config/class_multihunk.json", help='Path to the alternate dataset JSON file')
 parser.add_argument('--baseline_file_dataset_path', type=str, default="../redwood/config/files_multihunk.json", help='Path to the alternate dataset JSON file')
-parser.add_argument('--processed_file', type=str, default="processed.json", help='Path to the processed bugs JSON file (will be created/updated in the same directory as the dataset file)')
+parser.add_argument('--processed_file', type=str, default="processed.json", help='Name of the legacy processed bugs JSON file in the dataset directory. Progress is journaled next to it as <name>.jsonl; an existing JSON file is imported on first use.')
+parser.add_argument('--schedule', type=str, choices=['dataset', 'longest_first'], default='dataset', help='Order in which bugs are dispatched: dataset order or predicted longest first (from earlier trajectory logs).')
+parser.add_argument('--schedule_history', type=str, nargs='*', default=[], help='Additional trajectory_logs directories of earlier runs used to predict bug durations.')
+parser.add_argument('--reuse_completions', type=str, choices=['yes', 'no'], default='yes', help='Reuse LLM completions stored in <results_path>/completions.jsonl by an earlier, interrupted run instead of querying the LLM again.')
+parser.add_argument('--reset_processed', action='store_true', help='Archive the run journal and start over instead of resuming.')
 parser.add_argument('--mode', type=int, choices=range(1, 5), default=1, help='Mode of operation, ranging from 1 to 4')
 parser.add_argument('--model', type=str, required=True, help='Model to use')
 parser.add_argument('--multihunk', type=str, choices=['yes', 'no'], default='no', help='Run with multihunk dataset if "yes", otherwise use the primary dataset')
 parser.add_argument('--scope', type=str, choices=['block', 'method', 'class', 'file'], default='method', help='Choose the appropriate scope you want to run the experiment with')
 parser.add_argument('--api_host', type=str, default=None, help='API host address for connecting to an external service')
 parser.add_argument('--results_path', type=str, default=None, help='Optional parameter to configure results directory location. Default location is results/ under this directory.')
+parser.add_argument('--workers', type=int, default=1, help='Number of bugs processed in parallel. Each worker gets its own subdirectory of --work_dir.')
+parser.add_argument('--llm_workers', type=int, default=0, help='If > 0, run as a pipeline: this many threads generate patches while --workers threads compile and test them.')
+parser.add_argument('--hunk_concurrency', type=int, default=1, help='Maximum number of concurrent LLM requests for the hunks of one bug.')
+parser.add_argument('--pristine_dir', type=str, default=None, help='If set, every bug is checked out and compiled once into this directory and copied from there, so repeated runs over the same bugs skip `defects4j checkout`.')
+parser.add_argument('--clone_mode', type=str, choices=['reflink', 'hardlink'], default='reflink', help='How work trees are cloned from --pristine_dir: "reflink" copies with `cp -a --reflink=auto` (copy-on-write where the file system supports it), "hardlink" hard-links the source directories and copies only build outputs.')
+parser.add_argument('--worktree_store', type=str, default=None, help='Directory of per-project git repositories filled by prepare_corpus.py. If set, checkouts are created as git worktrees from it instead of with `defects4j checkout`.')
+parser.add_argument('--incremental_compile', type=str, choices=['yes', 'no'], default='no', help='With --pristine_dir, compile only the patched files with javac against the cached build of the buggy version instead of running `defects4j compile`.')
+parser.add_argument('--trigger_tests_first', type=str, choices=['yes', 'no'], default='no', help='Run the triggering tests of the dataset first and the full test suite only if they pass.')
+parser.add_argument('--warm_test_runner', type=str, choices=['yes', 'no'], default='no', help='With --trigger_tests_first and --pristine_dir, run the triggering tests in a long-lived JUnit JVM per worker instead of one `defects4j test -t` each.')
+parser.add_argument('--tmpfs_dir', type=str, default=None, help='RAM-backed directory (e.g. /dev/shm/birch) for checkouts whose measured footprint fits the per-worker share of memory; others stay in --work_dir.')
+parser.add_argument('--test_baseline_dir', type=str, default=None, help='Directory of per-bug baselines of the buggy version\'s test outcomes; failures that are flaky or pre-existing in the baseline do not fail a patch.')
+parser.add_argument('--baseline_runs', type=int, default=3, help='Test suite runs per bug when measuring a baseline (flaky tests fail in some runs only)')
+parser.add_argument('--test_impact_dir', type=str, default=None, help='Directory of per-bug coverage indexes (build_test_impact_index.py); the tests covering the patched lines run with the triggering tests before the suite.')
+parser.add_argument('--impact_full_suite', type=str, choices=['yes', 'no'], default='no', help='Confirm a pass of the tests selected by --test_impact_dir with the full test suite instead of the relevant tests')
+parser.add_argument('--async_patch_files', type=str, choices=['yes', 'no'], default='no', help='Write the linux_patches/*.patch files from a background thread')
+parser.add_argument('--validation_cache', type=str, default=None, help='SQLite file caching compile and test outcomes by bug and patched-file content; identical patch sets skip compilation and testing')
+parser.add_argument('--syntax_gate', type=str, choices=['yes', 'no'], default='no', help='Parse the patched files with javalang first and report syntax errors as compile errors without running defects4j compile')
+parser.add_argument('--replay', type=str, default=None, help='Results directory of an earlier run. Re-validates the LLM outputs recorded in its trajectory logs without calling any model; results go to --results_path (default: <replay>_replay).')
+parser.add_argument('--queue_size', type=int, default=None, help='Maximum number of generated patch sets waiting for validation in pipeline mode. Defaults to --workers.')
 
 args = parser.parse_args()
 
@@ -32,8 +62,12 @@ MODE = args.mode
 MODEL = args.model
 BASELINE = args.multihunk.lower() == 'yes'
 API_HOST = args.api_host
-RESULTS_PATH = args.results_path
+REPLAY = RecordedOutputs(args.replay) if args.replay else None
+RESULTS_PATH = replay_results_path(args.replay, args.results_path) if REPLAY else args.results_path
 SCOPE = args.scope
+WORKERS = max(1, args.workers)
+LLM_WORKERS = max(0, args.llm_workers)
+HUNK_CONCURRENCY = max(1, args.hunk_concurrency)
 
 if BASELINE:
     if SCOPE == 'block':
@@ -61,138 +95,75 @@ TEST_RESULTS_PATH = os.path.join(results_base_path, "test_results")
 COMPILE_RESULTS_PATH = os.path.join(results_base_path, "compile_results")
 TRAJECTORY_LOGS_PATH = os.path.join(results_base_path, "trajectory_logs")
 
-def process_bug(project, bug_id, MODE, MODEL, processed):
-    clear_work_dir(WORK_DIR)
+CONFIG = RepairConfig(
+    model=MODEL,
+    mode=MODE,
+    dataset_path=DATASET_PATH,
+    work_dir=WORK_DIR,
+    scope=SCOPE,
+    api_host=API_HOST,
+    results_path=RESULTS_PATH,
+    processed_file=args.processed_file,
+    hunk_concurrency=HUNK_CONCURRENCY,
+    pristine_dir=args.pristine_dir,
+    clone_mode=args.clone_mode,
+    worktree_store=args.worktree_store,
+    incremental_compile=args.incremental_compile == 'yes',
+    trigger_tests_first=args.trigger_tests_first == 'yes',
+    warm_test_runner=args.warm_test_runner == 'yes',
+    tmpfs_dir=args.tmpfs_dir,
+    workers=args.workers,
+    test_baseline_dir=args.test_baseline_dir,
+    baseline_runs=args.baseline_runs,
+    test_impact_dir=args.test_impact_dir,
+    impact_full_suite=args.impact_full_suite == 'yes',
+    async_patch_files=args.async_patch_files == 'yes',
+    validation_cache=args.validation_cache,
+    syntax_gate=args.syntax_gate == 'yes'
+)
+
+def fix_code(project, bug_id, bug_num, dataset):
+    return get_fix_code(project, bug_id, bug_num, dataset, MODE, MODEL, PROMPT_PATH, GENERATED_PATCHES_PATH, DATASET_PATH, API_HOST, SCOPE)
 
-    trajectory_log = {
-        "bug_id": f"{project}_{bug_id}",
-        "resolution_status": None,  
-        "duration_seconds": 0,
-        "hunks": []
-    }
-
-    start_time = time.time()
-
-
-    dataset_path = DATASET_PATH
-    dataset = json.load(open(dataset_path, "r"))
-
-    current_bug = f"{project}_{bug_id}"
-    bug_count = dataset[current_bug]["bug_count"]
-
-    if not checkout_repo(project, bug_id, WORK_DIR):
-        return
-
-    llm_error = False
-
-    encodings = ['utf-8', 'ISO-8859-1', 'latin-1', 'cp1252']
-
-    total_llm_time = 0
-    for bug_num in range(bug_count - 1, -1, -1):
-        patches, llm_invocation_time, prompt = get_fix_code(project, bug_id, bug_num, dataset, MODE, MODEL, PROMPT_PATH, GENERATED_PATCHES_PATH, DATASET_PATH, API_HOST, SCOPE)
-        if patches is None:
-            llm_error = True
-            continue
-        input_tokens = count_tokens(prompt)
-        output = "\n".join(patches) if isinstance(patches, list) else str(patches)
-        output_tokens = count_tokens(output)
-        hunk_log = {
-                "hunk_index": bug_num,
-                "input": prompt,
-                "output": "\n".join(patches) if isinstance(patches, list) else str(patches),
-                "latency_ms": llm_invocation_time / 1000.0,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
-            }
-        trajectory_log["hunks"].append(hunk_log)
-        patch_validation = PatchValidation(patches)
-        
-        patch_validation.apply_patch(dataset[current_bug], os.path.join(WORK_DIR, f'{project}_{bug_id}', dataset[current_bug]["buggy_code"][str(bug_num)]["file"]), encodings, bug_num, current_bug, LINUX_PATCHES_PATH, MODE)
-    total_llm_time += llm_invocation_time
-
-    compile_start_time = time.time()
-    compile_returncode, compile_errormsg = compile_repo(os.path.join(WORK_DIR, f'{project}_{bug_id}'))
-    compile_end_time = time.time()
-    compile_time = compile_end_time - compile_start_time if compile_returncode == 0 else 0
-
-    if compile_returncode != 0:
-        write_result_csv(project, bug_id, compile_returncode, -1, [], MODE, results_base_path, total_llm_time, compile_time, 0)
-        save_compile_results(project, bug_id, compile_errormsg, COMPILE_RESULTS_PATH)
-        logging.error(f"Compilation failed for {project}-{bug_id}:\n{compile_errormsg}")
-        print(f"Compilation failed for {project}-{bug_id}:\n{compile_errormsg}")
-        processed[str(MODE)].append(current_bug)
-        save_processed(processed, PROCESSED_FILE)
-        end_time = time.time()
-        total_duration = end_time - start_time
-        trajectory_log["duration_seconds"] = total_duration
-        if llm_error:
-            trajectory_log["resolution_status"] = "llm_failure"
-        else:
-            trajectory_log["resolution_status"] = "compile_failure"
-        logs_output_path = os.path.join(TRAJECTORY_LOGS_PATH, f"{current_bug}_trajectory.json")
-        os.makedirs(os.path.dirname(logs_output_path), exist_ok=True)
-
-        with open(logs_output_path, 'w', encoding='utf-8') as log_f:
-            json.dump(trajectory_log, log_f, indent=4)
-
-        logging.info(f"Trajectory logs saved to: {logs_output_path}")
-        return
-
-    test_start_time = time.time()
-    test_returncode, failed_tests, stdout, stderr = run_test(os.path.join(WORK_DIR, f'{project}_{bug_id}'))
-    test_end_time = time.time()
-    test_time = test_end_time - test_start_time
-
-    test_pass = test_returncode == 0 and len(failed_tests) == 0
-
-    write_result_csv(project, bug_id, compile_returncode, test_pass, failed_tests, MODE, results_base_path, total_llm_time, compile_time, test_time)
-    save_test_results(project, bug_id, stdout, stderr, TEST_RESULTS_PATH)
-
-    if not test_pass:
-        logging.error(f"Test failures for {project}-{bug_id}:\nFailed tests: {failed_tests}")
-        print(f"Test failures for {project}-{bug_id}:\nFailed tests: {failed_tests}")
-
-    # Add processed bug to the processed list
-    processed[str(MODE)].append(current_bug)
-    save_processed(processed, PROCESSED_FILE)
-
-    end_time = time.time()
-    total_duration = end_time - start_time
-    trajectory_log["time_compilation_iteration"] = compile_time
-    trajectory_log["time_test_iteration"] = test_time
-    trajectory_log["duration_seconds"] = total_duration
-
-    if llm_error:
-        trajectory_log["resolution_status"] = "llm_failure"
+if __name__ == "__main__":
+    if REPLAY:
+        # Replays are resumed from their own results directory and never
+        # touch the completion store.
+        journal = RunJournal.for_processed_file(os.path.join(results_base_path, "processed.json"), reset=args.reset_processed)
+        completions = None
+        dataset_bugs = set(extract_projects_and_bugs(DATASET_PATH))
+        PROJECTS = [entry for entry in REPLAY.bugs() if entry in dataset_bugs]
+        fix_code = REPLAY.fix_code_fn()
     else:
-        if test_pass:
-            trajectory_log["resolution_status"] = "pass"
-        else:
-            trajectory_log["resolution_status"] = "test_failure"
-
-    logs_output_path = os.path.join(TRAJECTORY_LOGS_PATH, f"{current_bug}_trajectory.json")
-    os.makedirs(os.path.dirname(logs_output_path), exist_ok=True)
-
-    with open(logs_output_path, 'w', encoding='utf-8') as log_f:
-        json.dump(trajectory_log, log_f, indent=4)
+        journal = RunJournal.for_processed_file(PROCESSED_FILE, reset=args.reset_processed)
+        completions = CompletionStore.for_results(results_base_path) if args.reuse_completions == 'yes' else None
+        PROJECTS = extract_projects_and_bugs(DATASET_PATH)
 
-    logging.info(f"Trajectory logs saved to: {logs_output_path}")
+    unprocessed_projects = [entry for entry in PROJECTS if not journal.is_done(MODE, f"{entry[0]}_{entry[1]}")]
 
-if __name__ == "__main__":
-    processed = load_processed(PROCESSED_FILE)
-    PROJECTS = extract_projects_and_bugs(DATASET_PATH)
-
-    unprocessed_projects = [entry for entry in PROJECTS if f"{entry[0]}_{entry[1]}" not in processed[str(MODE)]]
+    if args.schedule == 'longest_first':
+        unprocessed_projects = order_longest_first(unprocessed_projects, args.schedule_history + [TRAJECTORY_LOGS_PATH], load_dataset_cached(DATASET_PATH))
 
     if not unprocessed_projects:
-        # Clear processed.json if all bugs are processed
-        save_processed({str(i): [] for i in range(1, 5)}, PROCESSED_FILE)
-        print("All bugs have been processed. Processed file cleared.")
+        print(f"All bugs have been processed. Run with --reset_processed to start over ({journal.path}).")
     else:
-        for entry in unprocessed_projects:
-            project, bug_id = entry
-            bug_id = int(bug_id)
-            process_bug(project, bug_id, MODE, MODEL, processed)
+        if LLM_WORKERS > 0:
+            pipeline = RepairPipeline(
+                lambda entry: generate_bug_patches(entry[0], int(entry[1]), CONFIG, fix_code, journal, completions),
+                lambda job, worker_dir: validate_bug_patches(job, CONFIG, journal, worker_dir),
+                WORK_DIR,
+                generate_workers=LLM_WORKERS,
+                validate_workers=WORKERS,
+                queue_size=args.queue_size
+            )
+            pipeline.run(unprocessed_projects)
+        else:
+            run_in_worker_pool(
+                unprocessed_projects,
+                lambda project, bug_id, worker_dir: process_bug(project, bug_id, CONFIG, fix_code, journal, completions, worker_dir),
+                WORK_DIR,
+                WORKERS
+            )
         input_csv = os.path.abspath(os.path.join(results_base_path, f"test_results_mode_{MODE}.csv"))
         output_csv = os.path.abspath(os.path.join(results_base_path, f"test_statistics_mode_{MODE}.csv"))
         analyze_results(input_csv, output_csv)
\ No newline at end of file
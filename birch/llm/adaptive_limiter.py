@@ -0,0 +1,103 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from contextlib import contextmanager
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one provider/model. Every successful request
+    raises the limit by `increase / limit` (about +1 per window of requests);
+    a rate limit or connection error multiplies it by `decrease`. A
+    Retry-After from the provider pauses every request to it until then.
+    """
+    def __init__(self, initial=2, minimum=1, maximum=32, increase=1.0, decrease=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while True:
+                wait = self.blocked_until - time.time()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after=None):
+        with self._cond:
+            now = time.time()
+            # Requests that were already in flight fail together; count them
+            # as one congestion signal instead of collapsing to the minimum.
+            if now - self._last_decrease > 1.0:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._last_decrease = now
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def backoff(self, attempt, retry_after=None, base=2, cap=60):
+        """Seconds to wait before retrying: Retry-After if given, else jittered exponential."""
+        if retry_after:
+            return retry_after
+        return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+# Import this module as llm.adaptive_limiter only: birch.llm.* callers would
+# otherwise load a second copy with its own registry, and one model would get
+# two independent limits.
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(model_name):
+    with _limiters_lock:
+        if model_name not in _limiters:
+            _limiters[model_name] = AdaptiveLimiter()
+        return _limiters[model_name]
+
+def retry_after_seconds(e):
+    """
+    Extracts Retry-After (seconds or HTTP date, or retry-after-ms) from a
+    provider exception, or None when the provider did not send one.
+    """
+    headers = None
+    response = getattr(e, 'response', None)
+    if response is not None:
+        headers = getattr(response, 'headers', None)
+    if headers is None:
+        headers = getattr(e, 'headers', None)
+    if headers:
+        try:
+            retry_after_ms = headers.get('retry-after-ms')
+            if retry_after_ms:
+                return float(retry_after_ms) / 1000.0
+            retry_after = headers.get('retry-after')
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+    retry_after = getattr(e, 'retry_after', None)
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+    return None
@@ -4,6 +4,7 @@ from google import genai
 from google.genai import types
 import os
 from dotenv import load_dotenv
+from llm.adaptive_limiter import get_limiter, retry_after_seconds
 
 load_dotenv()
 
@@ -19,26 +20,28 @@ def invoke_gemini(model_name,
     client = genai.Client(api_key=api_key)
 
     attempt = 0
-    backoff = 60  # base backoff in seconds
     max_cumulative_backoff = 600  # total allowed backoff
     cumulative_backoff = 0
 
     content = f"{system_prompt}\n\n{user_prompt}"
+    limiter = get_limiter(model_name)
 
     while True:
         try:
-            start_time = time.time()
-            response = client.models.generate_content(
-                model=model_name,
-                contents=content,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
-                    temperature=temperature,
-                    top_p=top_p,
-                    max_output_tokens=max_output_tokens
+            with limiter.slot():
+                start_time = time.time()
+                response = client.models.generate_content(
+                    model=model_name,
+                    contents=content,
+                    config=types.GenerateContentConfig(
+                        thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
+                        temperature=temperature,
+                        top_p=top_p,
+                        max_output_tokens=max_output_tokens
+                    )
                 )
-            )
-            end_time = time.time()
+                end_time = time.time()
+            limiter.on_success()
 
             inference_time_ms = (end_time - start_time) * 1000
             completion = response.text
@@ -47,8 +50,13 @@ def invoke_gemini(model_name,
 
         except Exception as e:
             print(f"Gemini API error: {e}")
-            # Exponential backoff
-            wait_time = backoff * (2 ** attempt)
+            if is_throttle_error(e):
+                retry_after = retry_after_seconds(e)
+                limiter.on_throttle(retry_after)
+            else:
+                # Not congestion: retry without lowering the limit.
+                retry_after = None
+            wait_time = limiter.backoff(attempt, retry_after)
             cumulative_backoff += wait_time
 
             if cumulative_backoff >= max_cumulative_backoff:
@@ -63,6 +71,17 @@ def invoke_gemini(model_name,
     return None, 0
 
 
+def is_throttle_error(e):
+    """True for rate limits (429 / RESOURCE_EXHAUSTED) and connection errors."""
+    code = getattr(e, 'code', None) or getattr(e, 'status_code', None)
+    if code == 429 or 'RESOURCE_EXHAUSTED' in str(e):
+        return True
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    # httpx transport errors do not derive from the builtin ones.
+    return any(name in type(e).__name__ for name in ('ConnectError', 'Timeout', 'RemoteProtocolError'))
+
+
 def process_with_gemini(model_name, system_prompt, user_prompt, api_key, **kwargs):
     """
     Wrapper function to invoke Gemini, mimicking the process_with_llm signature.
@@ -6,6 +6,7 @@ import litellm
 from litellm import APIConnectionError, BadRequestError
 
 from llm.models import Models
+from llm.adaptive_limiter import get_limiter, retry_after_seconds
 import os
 from dotenv import load_dotenv
 
@@ -45,7 +46,6 @@ def invoke_llm(model_name,
                max_tokens=4096,
                top_p=1, frequency_penalty=0, presence_penalty=0):
     attempt = 0
-    backoff = 60  # Initial backoff duration in seconds
     max_cumulative_backoff = 600  # Maximum cumulative backoff time in seconds (e.g., 100 minutes)
     cumulative_backoff = 0
         
@@ -63,25 +63,31 @@ def invoke_llm(model_name,
         {"role": "user", "content": user_prompt}
     ]
 
+    # Concurrent callers (hunks, pipeline workers) share one adaptive limit
+    # per model, so throughput follows the provider's actual quota.
+    limiter = get_limiter(model_name)
+
     while True:
         try:
-            start_time = time.time()
-            if api_host:
-                response = litellm.completion(
-                    model=model_name,
-                    messages=messages,
-                    temperature=temperature,
-                    top_p=top_p,
-                    api_base=api_host
-                )
-            else:
-                response = litellm.completion(
-                    model=model_name,
-                    messages=messages,
-                    temperature=temperature,
-                    top_p=top_p
-                )
-            end_time = time.time()
+            with limiter.slot():
+                start_time = time.time()
+                if api_host:
+                    response = litellm.completion(
+                        model=model_name,
+                        messages=messages,
+                        temperature=temperature,
+                        top_p=top_p,
+                        api_base=api_host
+                    )
+                else:
+                    response = litellm.completion(
+                        model=model_name,
+                        messages=messages,
+                        temperature=temperature,
+                        top_p=top_p
+                    )
+                end_time = time.time()
+            limiter.on_success()
             inference_time_ms = (end_time - start_time) * 1000
             completion = response.choices[0].message.content
             print("Completion obtained")
@@ -105,7 +111,9 @@ def invoke_llm(model_name,
 
             # Handle specific error actions
             if error_type == "RateLimitError":
-                wait_time = backoff * (2 ** attempt)  # Exponential backoff
+                retry_after = retry_after_seconds(e)
+                limiter.on_throttle(retry_after)
+                wait_time = limiter.backoff(attempt, retry_after)
                 cumulative_backoff += wait_time
 
                 if cumulative_backoff >= max_cumulative_backoff:
@@ -118,7 +126,8 @@ def invoke_llm(model_name,
                 time.sleep(wait_time)
                 attempt += 1
             elif error_type == "APIConnectionError":
-                wait_time = backoff * (2 ** attempt)  # Exponential backoff
+                limiter.on_throttle()
+                wait_time = limiter.backoff(attempt)
                 cumulative_backoff += wait_time
 
                 if cumulative_backoff >= max_cumulative_backoff:
@@ -1,50 +1,464 @@
 import os
-import subprocess
+import time
+import queue
+import atexit
 import shutil
+import logging
+import threading
+from collections import Counter
+from utils.file_content import read_lines
 
 class PatchValidation:
     def __init__(self, patch_code):
         self.patch_code = patch_code
 
     def apply_patch(self, bug_info, buggy_file_path, encodings, bug_num, current_bug, LINUX_PATCHES_PATH, MODE):
-        start_loc = bug_info["buggy_code"][str(bug_num)]['start_line']
-        end_loc = bug_info["buggy_code"][str(bug_num)]['end_line']
-        patch_lines = self.patch_code.strip().split('\n')
-        patched_lines = []
-
-        pre_patch_path = f"{buggy_file_path}.pre_patch"
-        shutil.copy(buggy_file_path, pre_patch_path)
-
-        orig_buggy_code = None
-        encoding_used = None
-        for encoding in encodings:
-            try:
-                with open(buggy_file_path, 'r', encoding=encoding) as file:
-                    orig_buggy_code = file.readlines()
-                    encoding_used = encoding
-                    break
-            except Exception as e:
-                print(f"Error reading {buggy_file_path} with encoding {encoding}: {e}")
+        # buggy_file_path is the checkout joined with the hunk's file.
+        repo_dir_path = buggy_file_path[:-len(bug_info["buggy_code"][str(bug_num)]["file"])]
+        apply_patches(bug_info, repo_dir_path, [(bug_num, self.patch_code)], encodings, current_bug, LINUX_PATCHES_PATH, MODE)
+
+def apply_patches(bug_info, repo_dir_path, hunk_patches, encodings, current_bug, LINUX_PATCHES_PATH, MODE, async_write=False):
+    '''
+    Applies the patches of several hunks ((bug_num, patch_code) pairs) to a
+    checkout. Each file is read once, every hunk's lines are replaced in
+    memory in line order, keeping track of how far earlier hunks shifted the
+    file, and the file is written once; the order of `hunk_patches` does not
+    matter. Each hunk's diff against the buggy file is written to
+    LINUX_PATCHES_PATH as `<bug>_bug_<bug_num>_<MODE>.patch`, and the diff of
+    all hunks as `<bug>_<MODE>.patch` (applies with `patch -p1` in a
+    checkout). With `async_write`, the patch files are written by a
+    background thread. Returns `{file: (buggy text, patched text)}` of the
+    files written.
+    '''
+    hunks_by_file = {}
+    for bug_num, patch_code in hunk_patches:
+        hunk = bug_info["buggy_code"][str(bug_num)]
+        hunks_by_file.setdefault(hunk["file"], []).append((hunk["start_line"], hunk["end_line"], bug_num, patch_code))
+
+    if not os.path.exists(LINUX_PATCHES_PATH):
+        os.makedirs(LINUX_PATCHES_PATH, exist_ok=True)
+
+    combined_diffs = []
+    patched_files = {}
+    for relative_path, hunks in hunks_by_file.items():
+        buggy_file_path = os.path.join(repo_dir_path, relative_path)
+        orig_buggy_code, encoding_used = _read_lines(buggy_file_path, encodings)
+        if orig_buggy_code is None:
+            continue
 
+        timestamp = _diff_timestamp()
+        patched_code = []
+        copied_up_to = 0
+        offset = 0
+        for start_loc, end_loc, bug_num, patch_code in sorted(hunks, key=lambda hunk: hunk[0]):
+            if start_loc - 1 < copied_up_to:
+                logging.error(f"Hunk {bug_num} of {current_bug} overlaps an earlier hunk in {relative_path}; not applied")
+                continue
+            patch_lines = [patch_line.rstrip() + '\n' for patch_line in patch_code.strip().split('\n')]
+            patched_code.extend(orig_buggy_code[copied_up_to:start_loc - 1])
+            patched_code.extend(patch_lines)
+            copied_up_to = max(copied_up_to, end_loc, start_loc - 1)
+            logging.debug(f"Hunk {bug_num} of {current_bug}: lines {start_loc}-{end_loc} now start at {start_loc + offset}")
+            offset += len(patch_lines) - (end_loc - start_loc + 1)
+
+            hunk_only = orig_buggy_code[:start_loc - 1] + patch_lines + orig_buggy_code[end_loc:]
+            _write_patch_file(
+                os.path.join(LINUX_PATCHES_PATH, f'{current_bug}_bug_{bug_num}_{MODE}.patch'),
+                unified_diff(orig_buggy_code, hunk_only, f"{buggy_file_path}.pre_patch\t{timestamp}", f"{buggy_file_path}.post_patch\t{timestamp}"),
+                encoding_used, async_write)
+        patched_code.extend(orig_buggy_code[copied_up_to:])
+        combined_diffs.append((unified_diff(orig_buggy_code, patched_code, f"a/{relative_path}", f"b/{relative_path}"), encoding_used))
+
+        _break_hardlink(buggy_file_path)
         with open(buggy_file_path, 'w', encoding=encoding_used, errors='ignore') as file:
-            for idx, line in enumerate(orig_buggy_code):
-                if idx == start_loc - 1:
-                    for patch_line in patch_lines:
-                        file.write(patch_line.rstrip() + '\n')
-                        patched_lines.append(patch_line.rstrip())
-                if idx < start_loc - 1 or idx > end_loc - 1:
-                    file.write(line)
-
-        post_patch_path = f"{buggy_file_path}.post_patch"
-        shutil.copy(buggy_file_path, post_patch_path)
-
-        if not os.path.exists(LINUX_PATCHES_PATH):
-            os.makedirs(LINUX_PATCHES_PATH)
-        patch_file_path = os.path.join(LINUX_PATCHES_PATH, f'{current_bug}_bug_{bug_num}_{MODE}.patch')
-        with open(patch_file_path, 'w') as patch_file:
-            subprocess.run(['diff', '-u', pre_patch_path, post_patch_path], stdout=patch_file)
-
-        os.remove(pre_patch_path)
-        os.remove(post_patch_path)
-
-        return
\ No newline at end of file
+            file.writelines(patched_code)
+        patched_files[relative_path] = (''.join(orig_buggy_code), ''.join(patched_code))
+
+    if combined_diffs:
+        # Files of one bug share their encoding in practice; use the first.
+        _write_patch_file(
+            os.path.join(LINUX_PATCHES_PATH, f'{current_bug}_{MODE}.patch'),
+            ''.join(diff for diff, _ in combined_diffs), combined_diffs[0][1], async_write)
+    return patched_files
+
+def unified_diff(before, after, from_label, to_label, context=3):
+    '''
+    Returns the unified diff of two lists of lines (with line endings) as
+    `diff -u` prints it: same headers (labels are printed as given, so pass
+    `path\\ttimestamp` for GNU-style ones), hunk ranges, merging of hunks
+    closer than 2 * `context` lines and "\\ No newline at end of file"
+    markers, with lines aligned by the same algorithm (see _change_blocks).
+    GNU's give-up heuristic for very expensive comparisons is not ported, so
+    only diffs of thousands of scattered changes may be aligned differently.
+    '''
+    blocks = _change_blocks(before, after, context)
+    if not blocks:
+        return ''
+
+    groups = [[blocks[0]]]
+    for block in blocks[1:]:
+        if block[0] - groups[-1][-1][1] <= 2 * context:
+            groups[-1].append(block)
+        else:
+            groups.append([block])
+
+    out = [f"--- {from_label}\n", f"+++ {to_label}\n"]
+    for group in groups:
+        first_i1, _, first_j1, _ = group[0]
+        _, last_i2, _, last_j2 = group[-1]
+        start_a = max(0, first_i1 - context)
+        end_a = min(len(before), last_i2 + context)
+        start_b = first_j1 - (first_i1 - start_a)
+        end_b = last_j2 + (end_a - last_i2)
+        out.append(f"@@ -{_format_range(start_a, end_a - start_a)} +{_format_range(start_b, end_b - start_b)} @@\n")
+        i = start_a
+        for i1, i2, j1, j2 in group:
+            out.extend(_diff_line(' ', line) for line in before[i:i1])
+            out.extend(_diff_line('-', line) for line in before[i1:i2])
+            out.extend(_diff_line('+', line) for line in after[j1:j2])
+            i = i2
+        out.extend(_diff_line(' ', line) for line in before[i:end_a])
+    return ''.join(out)
+
+def _format_range(start, length):
+    # Same convention as GNU diff: an empty range names the line before it.
+    if length == 1:
+        return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+def _diff_line(tag, line):
+    if line.endswith('\n'):
+        return tag + line
+    return f"{tag}{line}\n\\ No newline at end of file\n"
+
+def _change_blocks(before, after, horizon):
+    '''
+    Returns the changed regions as (i1, i2, j1, j2) slices of before and
+    after, found the way GNU diff finds them: the common prefix and suffix are
+    cut down to `horizon` lines, lines without a match in the other file (and
+    runs of very frequent ones) are set aside, a shortest edit script of the
+    rest is searched from both ends, and change boundaries are shifted to
+    merge adjacent changes.
+    '''
+    n, m = len(before), len(after)
+    prefix = 0
+    while prefix < n and prefix < m and before[prefix] == after[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and before[-1 - suffix] == after[-1 - suffix]:
+        suffix += 1
+    start = max(0, prefix - horizon)
+    a = before[start:n - suffix + min(suffix, horizon)]
+    b = after[start:m - suffix + min(suffix, horizon)]
+
+    classes = {}
+    a_equivs = [classes.setdefault(line, len(classes) + 1) for line in a]
+    b_equivs = [classes.setdefault(line, len(classes) + 1) for line in b]
+    a_discards = _discard_confusing_lines(a_equivs, Counter(b_equivs))
+    b_discards = _discard_confusing_lines(b_equivs, Counter(a_equivs))
+    a_kept = [i for i, discard in enumerate(a_discards) if not discard]
+    b_kept = [j for j, discard in enumerate(b_discards) if not discard]
+    # One trailing False serves as the sentinel at both ends.
+    a_changed = [bool(discard) for discard in a_discards] + [False]
+    b_changed = [bool(discard) for discard in b_discards] + [False]
+
+    a_edits, b_edits = [], []
+    _compareseq([a_equivs[i] for i in a_kept], [b_equivs[j] for j in b_kept], 0, len(a_kept), 0, len(b_kept), a_edits, b_edits)
+    for x in a_edits:
+        a_changed[a_kept[x]] = True
+    for y in b_edits:
+        b_changed[b_kept[y]] = True
+    _shift_boundaries(a_equivs, a_changed, b_changed)
+    _shift_boundaries(b_equivs, b_changed, a_changed)
+
+    blocks = []
+    i = j = 0
+    while i < len(a) or j < len(b):
+        if a_changed[i] or b_changed[j]:
+            i1, j1 = i, j
+            while a_changed[i]:
+                i += 1
+            while b_changed[j]:
+                j += 1
+            blocks.append((start + i1, start + i, start + j1, start + j))
+        else:
+            i += 1
+            j += 1
+    return blocks
+
+def _discard_confusing_lines(equivs, counts_other):
+    # Ported from GNU diffutils' analyze.c: 1 = discard, 2 = provisional.
+    end = len(equivs)
+    discards = [0] * end
+    many = 5
+    tem = end // 64
+    while True:
+        tem >>= 2
+        if tem <= 0:
+            break
+        many *= 2
+    for i in range(end):
+        nmatch = counts_other.get(equivs[i], 0)
+        if nmatch == 0:
+            discards[i] = 1
+        elif nmatch > many:
+            discards[i] = 2
+    i = 0
+    while i < end:
+        if discards[i] == 2:
+            discards[i] = 0
+        elif discards[i] != 0:
+            provisional = 0
+            j = i
+            while j < end:
+                if discards[j] == 0:
+                    break
+                if discards[j] == 2:
+                    provisional += 1
+                j += 1
+            while j > i and discards[j - 1] == 2:
+                j -= 1
+                discards[j] = 0
+                provisional -= 1
+            length = j - i
+            if provisional * 4 > length:
+                while j > i:
+                    j -= 1
+                    if discards[j] == 2:
+                        discards[j] = 0
+            else:
+                minimum = 1
+                tem = length >> 2
+                while True:
+                    tem >>= 2
+                    if tem <= 0:
+                        break
+                    minimum <<= 1
+                minimum += 1
+                j = 0
+                consec = 0
+                while j < length:
+                    if discards[i + j] != 2:
+                        consec = 0
+                    else:
+                        consec += 1
+                        if minimum == consec:
+                            j -= consec
+                        elif minimum < consec:
+                            discards[i + j] = 0
+                    j += 1
+                consec = 0
+                for j in range(length):
+                    if j >= 8 and discards[i + j] == 1:
+                        break
+                    if discards[i + j] == 2:
+                        consec = 0
+                        discards[i + j] = 0
+                    elif discards[i + j] == 0:
+                        consec = 0
+                    else:
+                        consec += 1
+                    if consec == 3:
+                        break
+                i += length - 1
+                consec = 0
+                for j in range(length):
+                    if j >= 8 and discards[i - j] == 1:
+                        break
+                    if discards[i - j] == 2:
+                        consec = 0
+                        discards[i - j] = 0
+                    elif discards[i - j] == 0:
+                        consec = 0
+                    else:
+                        consec += 1
+                    if consec == 3:
+                        break
+        i += 1
+    return discards
+
+def _diag(xv, yv, xoff, xlim, yoff, ylim):
+    # Midpoint of a shortest edit script, searched from both ends (diffseq.h).
+    fd = {}
+    bd = {}
+    dmin = xoff - ylim
+    dmax = xlim - yoff
+    fmid = xoff - yoff
+    bmid = xlim - ylim
+    fmin = fmax = fmid
+    bmin = bmax = bmid
+    odd = (fmid - bmid) & 1
+    fd[fmid] = xoff
+    bd[bmid] = xlim
+    while True:
+        if fmin > dmin:
+            fmin -= 1
+            fd[fmin - 1] = -1
+        else:
+            fmin += 1
+        if fmax < dmax:
+            fmax += 1
+            fd[fmax + 1] = -1
+        else:
+            fmax -= 1
+        for d in range(fmax, fmin - 1, -2):
+            tlo = fd[d - 1]
+            thi = fd[d + 1]
+            x = thi if tlo < thi else tlo + 1
+            y = x - d
+            while x < xlim and y < ylim and xv[x] == yv[y]:
+                x += 1
+                y += 1
+            fd[d] = x
+            if odd and bmin <= d <= bmax and bd[d] <= x:
+                return x, y
+        if bmin > dmin:
+            bmin -= 1
+            bd[bmin - 1] = float('inf')
+        else:
+            bmin += 1
+        if bmax < dmax:
+            bmax += 1
+            bd[bmax + 1] = float('inf')
+        else:
+            bmax -= 1
+        for d in range(bmax, bmin - 1, -2):
+            tlo = bd[d - 1]
+            thi = bd[d + 1]
+            x = tlo if tlo < thi else thi - 1
+            y = x - d
+            while xoff < x and yoff < y and xv[x - 1] == yv[y - 1]:
+                x -= 1
+                y -= 1
+            bd[d] = x
+            if not odd and fmin <= d <= fmax and x <= fd[d]:
+                return x, y
+
+def _compareseq(xv, yv, xoff, xlim, yoff, ylim, x_changed, y_changed):
+    # Divide and conquer on _diag's midpoints, with a stack instead of recursion.
+    stack = [(xoff, xlim, yoff, ylim)]
+    while stack:
+        xoff, xlim, yoff, ylim = stack.pop()
+        while xoff < xlim and yoff < ylim and xv[xoff] == yv[yoff]:
+            xoff += 1
+            yoff += 1
+        while xoff < xlim and yoff < ylim and xv[xlim - 1] == yv[ylim - 1]:
+            xlim -= 1
+            ylim -= 1
+        if xoff == xlim:
+            for y in range(yoff, ylim):
+                y_changed.append(y)
+        elif yoff == ylim:
+            for x in range(xoff, xlim):
+                x_changed.append(x)
+        else:
+            xmid, ymid = _diag(xv, yv, xoff, xlim, yoff, ylim)
+            stack.append((xmid, xlim, ymid, ylim))
+            stack.append((xoff, xmid, yoff, ymid))
+
+def _shift_boundaries(equivs, changed, other_changed):
+    # changed / other_changed carry a False sentinel at index -1 (stored
+    # last) and at their end, as GNU's arrays do.
+    i_end = len(equivs)
+    i = j = 0
+    while True:
+        while i < i_end and not changed[i]:
+            while other_changed[j]:
+                j += 1
+            j += 1
+            i += 1
+        if i == i_end:
+            break
+        start = i
+        i += 1
+        while changed[i]:
+            i += 1
+        while other_changed[j]:
+            j += 1
+        while True:
+            runlength = i - start
+            while start and equivs[start - 1] == equivs[i - 1]:
+                start -= 1
+                changed[start] = True
+                i -= 1
+                changed[i] = False
+                while changed[start - 1]:
+                    start -= 1
+                j -= 1
+                while other_changed[j]:
+                    j -= 1
+            corresponding = i if other_changed[j - 1] else i_end
+            while i != i_end and equivs[start] == equivs[i]:
+                changed[start] = False
+                start += 1
+                changed[i] = True
+                i += 1
+                while changed[i]:
+                    i += 1
+                j += 1
+                while other_changed[j]:
+                    corresponding = i
+                    j += 1
+            if runlength == i - start:
+                break
+        while corresponding < i:
+            start -= 1
+            changed[start] = True
+            i -= 1
+            changed[i] = False
+            j -= 1
+            while other_changed[j]:
+                j -= 1
+
+def _diff_timestamp():
+    # The modification time format of `diff -u` headers.
+    now_ns = time.time_ns()
+    local = time.localtime(now_ns // 10**9)
+    return time.strftime('%Y-%m-%d %H:%M:%S', local) + f".{now_ns % 10**9:09d} " + time.strftime('%z', local)
+
+_pending_patch_files = queue.Queue()
+_patch_writer = None
+_patch_writer_lock = threading.Lock()
+
+def _write_patch_file(path, text, encoding, async_write=False):
+    if not async_write:
+        with open(path, 'w', encoding=encoding, errors='ignore') as patch_file:
+            patch_file.write(text)
+        return
+    global _patch_writer
+    with _patch_writer_lock:
+        if _patch_writer is None:
+            _patch_writer = threading.Thread(target=_patch_writer_loop, name="patch-file-writer", daemon=True)
+            _patch_writer.start()
+    _pending_patch_files.put((path, text, encoding))
+
+def _patch_writer_loop():
+    while True:
+        path, text, encoding = _pending_patch_files.get()
+        try:
+            _write_patch_file(path, text, encoding)
+        except OSError as e:
+            logging.error(f"Could not write patch file {path}: {e}")
+        finally:
+            _pending_patch_files.task_done()
+
+@atexit.register
+def flush_patch_files():
+    '''Blocks until every patch file queued with async_write is written.'''
+    _pending_patch_files.join()
+
+def _read_lines(buggy_file_path, encodings):
+    try:
+        return read_lines(buggy_file_path, encodings)
+    except (OSError, UnicodeError) as e:
+        print(f"Error reading {buggy_file_path}: {e}")
+    logging.error(f"Could not decode {buggy_file_path}; its hunks are not applied")
+    return None, None
+
+def _break_hardlink(path):
+    # Checkouts cloned with clone_mode "hardlink" share source files with the
+    # pristine checkout; give the file its own inode before rewriting it.
+    if os.stat(path).st_nlink > 1:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.unlink"
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, path)
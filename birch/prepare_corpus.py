@@ -0,0 +1,100 @@
+import os
+import argparse
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utils.d4j_infra import extract_projects_and_bugs, compile_repo, run_test
+from utils.worktree_store import get_worktree_store
+
+parser = argparse.ArgumentParser(description='Imports Defects4J bugs into per-project git repositories and materializes the buggy and fixed corpus as worktrees, in parallel')
+parser.add_argument('--store_dir', type=str, default=os.path.expanduser("~/D4J_STORE"), help='Directory of the per-project git repositories')
+parser.add_argument('--dataset_path', type=str, nargs='*', default=["./config/d4j_dataset.json"], help='Dataset JSON files whose bugs are prepared')
+parser.add_argument('--all', action='store_true', help='Prepare every active bug reported by `defects4j pids` and `defects4j bids` instead of the dataset bugs')
+parser.add_argument('--checkout_dir', type=str, default=os.path.expanduser("~/WORK_DIR"), help='Where buggy versions are materialized (the --checkout_dir of the Redwood scripts); empty to only import')
+parser.add_argument('--fixed_dir', type=str, default=os.path.expanduser("~/WORK_DIR_FIXED"), help='Where fixed versions are materialized (the --fixed_dir of the Redwood scripts); empty to skip fixed versions')
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of versions imported in parallel')
+parser.add_argument('--verify', type=str, choices=['none', 'first', 'all'], default='first', help='Run `defects4j compile` and `defects4j test -r` in the first materialized version of each project (or in all of them) and check that the triggering tests fail in buggy versions only')
+
+def all_bugs():
+    projects_bugs = []
+    pids = subprocess.run(['defects4j', 'pids'], capture_output=True, text=True, check=True).stdout.split()
+    for project in pids:
+        bids = subprocess.run(['defects4j', 'bids', '-p', project], capture_output=True, text=True, check=True).stdout.split()
+        projects_bugs.extend((project, int(bug_id)) for bug_id in bids)
+    return projects_bugs
+
+def prepare(store, project, bug_id, version, target_root):
+    if not store.import_bug(project, bug_id):
+        return False
+    if not target_root:
+        return True
+    target_dir = os.path.join(target_root, f"{project}_{bug_id}")
+    if os.path.exists(target_dir):
+        return True
+    os.makedirs(target_root, exist_ok=True)
+    return store.materialize(project, bug_id, target_dir, version)
+
+def verify(target_dir, version):
+    """Checks that Defects4J builds and tests the materialized worktree as it does a checkout."""
+    compile_returncode, compile_errormsg = compile_repo(target_dir)
+    if compile_returncode != 0:
+        logging.error(f"defects4j compile failed in {target_dir}:\n{compile_errormsg}")
+        return False
+    trigger_tests = set(subprocess.run(['defects4j', 'export', '-p', 'tests.trigger'], capture_output=True, text=True, cwd=target_dir).stdout.split())
+    test_returncode, failed_tests, _, _ = run_test(target_dir, relevant_only=True)
+    if test_returncode != 0:
+        logging.error(f"defects4j test produced no results in {target_dir}")
+        return False
+    if version == "b" and not trigger_tests <= set(failed_tests):
+        logging.error(f"Triggering tests {sorted(trigger_tests - set(failed_tests))} pass in buggy worktree {target_dir}")
+        return False
+    if version == "f" and trigger_tests & set(failed_tests):
+        logging.error(f"Triggering tests {sorted(trigger_tests & set(failed_tests))} fail in fixed worktree {target_dir}")
+        return False
+    return True
+
+def main():
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.all:
+        projects_bugs = all_bugs()
+    else:
+        projects_bugs = []
+        for dataset_path in args.dataset_path:
+            projects_bugs.extend(extract_projects_and_bugs(dataset_path))
+        projects_bugs = list(dict.fromkeys(projects_bugs))
+
+    store = get_worktree_store(args.store_dir)
+    versions = [("b", args.checkout_dir)]
+    if args.fixed_dir:
+        versions.append(("f", args.fixed_dir))
+    # Interleave projects so that workers do not queue up on one project's
+    # worktree lock.
+    tasks = sorted(
+        ((project, bug_id, version, target_root) for project, bug_id in projects_bugs for version, target_root in versions),
+        key=lambda task: (task[1], task[2], task[0])
+    )
+
+    verified_projects = set()
+    verified_lock = threading.Lock()
+
+    def run_task(task):
+        project, bug_id, version, target_root = task
+        ok = prepare(store, project, bug_id, version, target_root)
+        if ok and target_root and args.verify != 'none':
+            with verified_lock:
+                check = args.verify == 'all' or project not in verified_projects
+                verified_projects.add(project)
+            if check:
+                ok = verify(os.path.join(target_root, f"{project}_{bug_id}"), version)
+        print(f"{project}-{bug_id}{version}: {'OK' if ok else 'FAILED'}")
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(run_task, tasks))
+    print(f"Prepared {sum(results)}/{len(results)} versions of {len(projects_bugs)} bugs in {store.store_dir}")
+
+if __name__ == "__main__":
+    main()
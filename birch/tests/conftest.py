@@ -0,0 +1,10 @@
+import os
+import sys
+
+# BIRCH scripts run from birch/ (`from utils...`) and Redwood from the
+# repository root (`from birch.utils...`); a Redwood process has both on
+# sys.path, and so do the tests.
+BIRCH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.dirname(BIRCH_DIR), BIRCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,112 @@
+import os
+import ast
+import time
+import threading
+from email.utils import formatdate
+
+import pytest
+
+from llm.adaptive_limiter import AdaptiveLimiter, get_limiter, retry_after_seconds
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+class _ProviderError(Exception):
+    def __init__(self, headers=None, retry_after=None):
+        super().__init__("rate limited")
+        self.response = _Response(headers) if headers is not None else None
+        self.retry_after = retry_after
+
+def test_success_raises_limit_by_about_one_per_window():
+    limiter = AdaptiveLimiter(initial=4, maximum=32)
+    for _ in range(4):
+        limiter.on_success()
+    assert 4.9 < limiter.limit < 5.0
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=3)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 3
+    for _ in range(5):
+        limiter._last_decrease = 0.0
+        limiter.on_throttle()
+    assert limiter.limit == 1
+
+def test_throttles_of_one_burst_decrease_once():
+    limiter = AdaptiveLimiter(initial=16)
+    for _ in range(8):
+        limiter.on_throttle()
+    assert limiter.limit == 8
+    limiter._last_decrease = time.time() - 2
+    limiter.on_throttle()
+    assert limiter.limit == 4
+
+def test_slot_holds_in_flight_requests_to_the_limit():
+    limiter = AdaptiveLimiter(initial=2, maximum=2)
+    peak, lock = [0], threading.Lock()
+
+    def request():
+        with limiter.slot():
+            with lock:
+                peak[0] = max(peak[0], limiter.in_flight)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert limiter.in_flight == 0
+
+def test_retry_after_pauses_new_requests():
+    limiter = AdaptiveLimiter(initial=4)
+    limiter.on_throttle(retry_after=0.2)
+    start = time.time()
+    with limiter.slot():
+        pass
+    assert time.time() - start >= 0.15
+
+def test_backoff_prefers_retry_after():
+    limiter = AdaptiveLimiter()
+    assert limiter.backoff(3, retry_after=7) == 7
+    assert 2 <= limiter.backoff(1) <= 4
+    assert limiter.backoff(20, cap=60) <= 60
+
+@pytest.mark.parametrize("error, expected", [
+    (_ProviderError({"retry-after": "3"}), 3.0),
+    (_ProviderError({"retry-after-ms": "1500", "retry-after": "3"}), 1.5),
+    (_ProviderError({"retry-after": "-1"}), 0.0),
+    (_ProviderError(retry_after=4), 4.0),
+    (_ProviderError({}), None),
+    (_ProviderError({"retry-after": "soon"}), None),
+    (Exception("connection reset"), None),
+])
+def test_retry_after_seconds(error, expected):
+    assert retry_after_seconds(error) == expected
+
+def test_retry_after_http_date():
+    seconds = retry_after_seconds(_ProviderError({"retry-after": formatdate(time.time() + 30, usegmt=True)}))
+    assert 25 <= seconds <= 31
+
+def test_one_limiter_per_model():
+    assert get_limiter("model-a") is get_limiter("model-a")
+    assert get_limiter("model-a") is not get_limiter("model-b")
+
+def test_every_client_imports_the_canonical_module():
+    modules = set()
+    for root, dirs, files in os.walk(REPO_DIR):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if not name.endswith(".py"):
+                continue
+            with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+            for node in ast.walk(tree):
+                if isinstance(node, ast.ImportFrom) and (node.module or "").endswith("adaptive_limiter"):
+                    modules.add(("." * node.level) + node.module)
+    assert modules == {"llm.adaptive_limiter"}
@@ -0,0 +1,53 @@
+from utils import test_baseline
+from utils.test_baseline import classify_failures, only_modified_classes_patched, patched_classes
+
+BASELINE = {
+    "runs": 3,
+    "failing": ["org.A::env"],
+    "flaky": ["org.A::timing"],
+    "src_dir": "src/main/java",
+    "modified_classes": ["org.A", "org.B"],
+}
+
+def test_without_baseline_every_failure_counts():
+    assert classify_failures(["org.A::env"], None) == (["org.A::env"], [], [])
+    assert classify_failures(["org.A::env"], {}) == (["org.A::env"], [], [])
+
+def test_failures_are_split_by_baseline():
+    failed_tests = ["org.A::env", "org.A::timing", "org.A::new", "org.B::trigger"]
+    assert classify_failures(failed_tests, BASELINE, ["org.B::trigger"]) == (
+        ["org.A::new", "org.B::trigger"], ["org.A::timing"], ["org.A::env"])
+
+def test_triggering_tests_always_count():
+    # A triggering test failing in the buggy version is in the baseline, but
+    # the patch has to make it pass.
+    assert classify_failures(["org.A::env", "org.A::timing"], BASELINE, ["org.A::env", "org.A::timing"]) == (
+        ["org.A::env", "org.A::timing"], [], [])
+
+def test_store_keeps_consistent_and_intermittent_failures(tmp_path):
+    store = test_baseline.TestBaselineStore(str(tmp_path))
+    baseline = store.put("Lang", 1, [["t1", "t2"], ["t1"], ["t1", "t3"]], [1.23456, 2.0, 3.0], "src/main/java", {"org.B", "org.A"})
+    assert baseline["failing"] == ["t1"]
+    assert baseline["flaky"] == ["t2", "t3"]
+    assert baseline["suite_seconds"] == [1.235, 2.0, 3.0]
+    assert baseline["modified_classes"] == ["org.A", "org.B"]
+    assert test_baseline.TestBaselineStore(str(tmp_path)).get("Lang", 1) == baseline
+    assert store.get("Lang", 2) is None
+
+def test_unreadable_baseline_is_ignored(tmp_path):
+    store = test_baseline.TestBaselineStore(str(tmp_path))
+    with open(store.path("Lang", 1), 'w') as f:
+        f.write("{")
+    assert store.get("Lang", 1) is None
+
+def test_patched_classes():
+    assert patched_classes(["src/main/java/org/A.java", "src/main/java/org/b/C.java"], "src/main/java/") == ["org.A", "org.b.C"]
+    assert patched_classes(["src/test/java/org/A.java"], "src/main/java") is None
+    assert patched_classes(["src/main/java/org/A.kt"], "src/main/java") is None
+
+def test_relevant_tests_only_when_patching_modified_classes():
+    assert only_modified_classes_patched(BASELINE, ["src/main/java/org/A.java"])
+    assert not only_modified_classes_patched(BASELINE, ["src/main/java/org/C.java"])
+    assert not only_modified_classes_patched(BASELINE, [])
+    assert not only_modified_classes_patched(dict(BASELINE, modified_classes=[]), ["src/main/java/org/A.java"])
+    assert not only_modified_classes_patched(None, ["src/main/java/org/A.java"])
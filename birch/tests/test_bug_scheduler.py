@@ -0,0 +1,34 @@
+import json
+
+from utils.bug_scheduler import estimate_bug_costs, load_bug_costs, order_longest_first
+
+def _write_log(logs_dir, bug, trajectory_log):
+    logs_dir.mkdir(exist_ok=True)
+    (logs_dir / f"{bug}_trajectory.json").write_text(json.dumps(trajectory_log))
+
+def test_costs_come_from_duration_or_jvm_time(tmp_path):
+    logs_dir = tmp_path / "trajectory_logs"
+    _write_log(logs_dir, "Lang_1", {"duration_seconds": 12.5, "time_test_iteration": 99})
+    _write_log(logs_dir, "Lang_2", {"time_compilation_iteration": 2, "time_test_iteration": 3})
+    _write_log(logs_dir, "Chart_1", {"iterations": [{"time_total_iteration": 4}, {"time_compilation_iteration": 1, "time_test_iteration": 2}]})
+    _write_log(logs_dir, "Chart_2", {})
+    (logs_dir / "Math_1_trajectory.json").write_text("{")
+    assert load_bug_costs([str(logs_dir)]) == {"Lang_1": 12.5, "Lang_2": 5.0, "Chart_1": 7.0}
+
+def test_later_directories_win(tmp_path):
+    _write_log(tmp_path / "old", "Lang_1", {"duration_seconds": 10})
+    _write_log(tmp_path / "new", "Lang_1", {"duration_seconds": 20})
+    assert load_bug_costs([str(tmp_path / "old"), str(tmp_path / "new")]) == {"Lang_1": 20.0}
+
+def test_estimates_fall_back_to_project_then_hunks():
+    history = {"Lang_1": 10.0, "Lang_2": 30.0, "Chart_1": 8.0}
+    dataset = {"Lang_1": {"bug_count": 1}, "Lang_2": {"bug_count": 3}, "Chart_1": {"bug_count": 1}, "Math_5": {"bug_count": 2}}
+    estimates = estimate_bug_costs([("Lang", 1), ("Lang", 9), ("Math", 5), ("Time", 1)], history, dataset)
+    assert estimates == {"Lang_1": 10.0, "Lang_9": 20.0, "Math_5": 48.0 / 5 * 2, "Time_1": 48.0 / 5}
+
+def test_longest_first_keeps_dataset_order_on_ties(tmp_path):
+    logs_dir = tmp_path / "trajectory_logs"
+    _write_log(logs_dir, "Closure_1", {"duration_seconds": 100})
+    _write_log(logs_dir, "Lang_1", {"duration_seconds": 5})
+    bugs = [("Lang", 1), ("Math", 1), ("Math", 2), ("Closure", 1), ("Closure", 2)]
+    assert order_longest_first(bugs, [str(logs_dir)]) == [("Closure", 1), ("Closure", 2), ("Math", 1), ("Math", 2), ("Lang", 1)]
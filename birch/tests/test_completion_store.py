@@ -0,0 +1,48 @@
+from utils.completion_store import CompletionStore, completion_key, reuse_completions
+
+def test_completions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "completions.jsonl")
+    store = CompletionStore(path)
+    store.put(completion_key("Lang_1", 2, "MODE.SF", "gpt"), ["patch"], 1.5, "prompt")
+    store.close()
+    store = CompletionStore(path)
+    assert len(store) == 1
+    assert store.get(completion_key("Lang_1", "2", "MODE.SF", "gpt")) == {"completion": ["patch"], "llm_time": 1.5, "prompt": "prompt"}
+    assert store.get(completion_key("Lang_1", 2, "MODE.SF", "gpt", iteration=1)) is None
+    store.close()
+
+def test_records_without_a_key_are_ignored(tmp_path):
+    path = tmp_path / "completions.jsonl"
+    path.write_text('{"bug": "Lang_1", "completion": "x"}\n')
+    store = CompletionStore(str(path))
+    assert len(store) == 0
+    store.close()
+
+def test_stored_completions_skip_the_llm(tmp_path):
+    store = CompletionStore.for_results(str(tmp_path))
+    calls = []
+
+    def generate_fn(bug_num):
+        calls.append(bug_num)
+        return ["patch"], 2.0, "prompt"
+
+    generate = reuse_completions(store, generate_fn, "Lang_1", "MODE.SF", "gpt")
+    assert generate(0) == (["patch"], 2.0, "prompt")
+    assert generate(0) == (["patch"], 2.0, "prompt")
+    assert generate(1) == (["patch"], 2.0, "prompt")
+    assert calls == [0, 1]
+    store.close()
+
+def test_failed_generations_are_not_stored(tmp_path):
+    store = CompletionStore.for_results(str(tmp_path))
+    results = [None, (None, 0, ""), (["patch"], 1.0, "prompt")]
+    generate = reuse_completions(store, lambda bug_num: results.pop(0), "Lang_1", "MODE.SF", "gpt")
+    assert generate(0) is None
+    assert generate(0) == (None, 0, "")
+    assert generate(0) == (["patch"], 1.0, "prompt")
+    assert len(store) == 1
+    store.close()
+
+def test_without_store_the_generator_is_unchanged():
+    generate_fn = lambda bug_num: None
+    assert reuse_completions(None, generate_fn, "Lang_1", "MODE.SF", "gpt") is generate_fn
@@ -0,0 +1,82 @@
+import os
+import ast
+import importlib
+
+import pytest
+
+from utils.file_content import FileContentCache, read_lines, read_text
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+@pytest.mark.parametrize("data, encoding", [
+    (b"class A {\x0c\n int x;\r\n}\r", "utf-8"),
+    (b"// caf\xe9 \x85 done\nclass A {}\n", "latin-1"),
+    ("//   separator\nclass A {}".encode("utf-8"), "utf-8"),
+])
+def test_lines_match_readlines(tmp_path, data, encoding):
+    path = _write(tmp_path, "A.java", data)
+    with open(path, "r", encoding=encoding) as f:
+        expected = f.readlines()
+    lines, _ = read_lines(path)
+    assert lines == expected
+    assert read_text(path)[0] == "".join(expected)
+
+def test_falls_back_to_iso_8859_1(tmp_path):
+    path = _write(tmp_path, "A.java", b"// caf\xe9\n")
+    assert read_text(path) == ("// caf\xe9\n", "ISO-8859-1")
+
+def test_changed_file_is_read_again(tmp_path):
+    cache = FileContentCache()
+    path = _write(tmp_path, "A.java", b"a\n")
+    assert cache.read(path)[0] == "a\n"
+    with open(path, "wb") as f:
+        f.write(b"b\nc\n")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert cache.read(path)[1] == ("b\n", "c\n")
+
+def test_least_recently_used_file_is_evicted(tmp_path):
+    cache = FileContentCache(max_files=2)
+    paths = [_write(tmp_path, f"{name}.java", b"x\n") for name in "abc"]
+    cache.read(paths[0])
+    cache.read(paths[1])
+    cache.read(paths[0])
+    cache.read(paths[2])
+    cached_paths = {key[0] for key in cache._entries}
+    assert cached_paths == {paths[0], paths[2]}
+
+def test_returned_lines_are_a_copy(tmp_path):
+    path = _write(tmp_path, "A.java", b"a\nb\n")
+    lines, _ = read_lines(path)
+    lines.append("c\n")
+    assert read_lines(path)[0] == ["a\n", "b\n"]
+
+def test_both_import_paths_share_one_cache():
+    # BIRCH imports patch_validation, Redwood birch.patch_validation.
+    birch_side = importlib.import_module("patch_validation")
+    redwood_side = importlib.import_module("birch.patch_validation")
+    general_utils = importlib.import_module("utils.general_utils")
+    caches = {
+        id(birch_side.read_lines.__globals__["_file_contents"]),
+        id(redwood_side.read_lines.__globals__["_file_contents"]),
+        id(general_utils.read_text.__globals__["_file_contents"]),
+    }
+    assert len(caches) == 1
+
+def test_every_reader_imports_the_canonical_module():
+    modules = set()
+    for root, dirs, files in os.walk(REPO_DIR):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if not name.endswith(".py"):
+                continue
+            with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+            for node in ast.walk(tree):
+                if isinstance(node, ast.ImportFrom) and (node.module or "").endswith("file_content"):
+                    modules.add(("." * node.level) + node.module)
+    assert modules == {"utils.file_content"}
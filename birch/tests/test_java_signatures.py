@@ -0,0 +1,66 @@
+import pytest
+
+from utils.java_signatures import api_changed, api_signature
+
+BUGGY = """package org.example;
+
+import java.util.List;
+
+public class A {
+    public static final int LIMIT = 10;
+    protected int count;
+    private int cache;
+
+    /** Adds one. */
+    public int add(int x) {
+        return x + 1;
+    }
+
+    private void helper() {
+    }
+
+    static class Inner {
+        void run() {}
+    }
+}
+"""
+
+@pytest.mark.parametrize("old, new", [
+    ("return x + 1;", "return x + 2;"),
+    ("private int cache;", "private long cache;"),
+    ("    private void helper() {\n    }\n", ""),
+    ("/** Adds one. */", "/** Adds one to x. */"),
+    ("protected int count;", "protected int count = 3;"),
+    ("import java.util.List;", "import java.util.*;"),
+    ("void run() {}", "void run() { run(); }"),
+])
+def test_body_and_private_changes_keep_the_signature(old, new):
+    assert not api_changed(BUGGY, BUGGY.replace(old, new))
+
+@pytest.mark.parametrize("old, new", [
+    ("public int add(int x)", "public int add(long x)"),
+    ("public int add(int x)", "public long add(int x)"),
+    ("public int add(int x)", "public int add(int x) throws Exception"),
+    ("public int add(int x)", "int add(int x)"),
+    ("LIMIT = 10", "LIMIT = 11"),
+    ("protected int count;", "protected long count;"),
+    ("public class A {", "public class A extends Object {"),
+    ("public class A {", "public final class A {"),
+    ("package org.example;", "package org.other;"),
+    ("    private void helper() {", "    public void other() {}\n\n    private void helper() {"),
+    ("void run() {}", "void run(int times) {}"),
+])
+def test_api_changes_are_detected(old, new):
+    assert api_changed(BUGGY, BUGGY.replace(old, new))
+
+def test_unparsable_versions_count_as_changed():
+    assert api_signature("class A {") is None
+    assert api_changed(BUGGY, BUGGY.replace("return x + 1;", "return x +;"))
+    assert api_changed("class A {", "class A {}")
+
+def test_interface_constants_and_enum_constants():
+    interface = "interface I {\n    int X = 1;\n    void f();\n}\n"
+    assert api_changed(interface, interface.replace("X = 1", "X = 2"))
+    enum = "enum E {\n    A, B;\n    int f() { return 1; }\n}\n"
+    assert not api_changed(enum, enum.replace("return 1;", "return 2;"))
+    assert api_changed(enum, enum.replace("A, B;", "A, B, C;"))
@@ -0,0 +1,103 @@
+import time
+import threading
+
+from utils.repair_pipeline import RepairPipeline
+
+def _run(pipeline, jobs, timeout=10):
+    # A deadlocked pipeline fails the test instead of hanging the suite.
+    thread = threading.Thread(target=pipeline.run, args=(jobs,), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline did not finish"
+
+def test_every_job_leaves_the_pipeline_once(tmp_path):
+    done, lock = [], threading.Lock()
+
+    def done_fn(job):
+        with lock:
+            done.append(job)
+
+    pipeline = RepairPipeline(lambda job: job, lambda job, work_dir: False, str(tmp_path),
+                              generate_workers=3, validate_workers=2, done_fn=done_fn)
+    _run(pipeline, range(50))
+    assert sorted(done) == list(range(50))
+
+def test_feedback_rounds_are_generated_again(tmp_path):
+    rounds = {}
+
+    def generate_fn(job):
+        rounds[job] = rounds.get(job, 0) + 1
+        return job
+
+    pipeline = RepairPipeline(generate_fn, lambda job, work_dir: rounds[job] < 3, str(tmp_path), validate_workers=2)
+    _run(pipeline, range(10))
+    assert rounds == {job: 3 for job in range(10)}
+
+def test_dropped_and_failing_jobs_are_finished(tmp_path):
+    done = []
+
+    def generate_fn(job):
+        if job == "fail_generation":
+            raise RuntimeError(job)
+        return None if job == "drop" else job
+
+    def validate_fn(job, work_dir):
+        if job == "fail_validation":
+            raise RuntimeError(job)
+        return False
+
+    pipeline = RepairPipeline(generate_fn, validate_fn, str(tmp_path), done_fn=done.append)
+    _run(pipeline, ["ok", "drop", "fail_generation", "fail_validation"])
+    assert sorted(done) == ["drop", "fail_generation", "fail_validation", "ok"]
+
+def test_jobs_in_flight_are_bounded(tmp_path):
+    state = {"admitted": 0, "finished": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def jobs():
+        for job in range(30):
+            with lock:
+                state["admitted"] += 1
+                state["peak"] = max(state["peak"], state["admitted"] - state["finished"])
+            yield job
+
+    def validate_fn(job, work_dir):
+        time.sleep(0.005)
+        return False
+
+    def done_fn(job):
+        with lock:
+            state["finished"] += 1
+
+    pipeline = RepairPipeline(lambda job: job, validate_fn, str(tmp_path),
+                              generate_workers=2, validate_workers=1, queue_size=1, done_fn=done_fn)
+    _run(pipeline, jobs())
+    assert state["finished"] == 30
+    # The job being admitted counts too.
+    assert state["peak"] <= pipeline.max_in_flight + 1
+
+def test_concurrent_validators_get_private_work_dirs(tmp_path):
+    active, lock = set(), threading.Lock()
+    shared = []
+
+    def validate_fn(job, work_dir):
+        with lock:
+            if work_dir in active:
+                shared.append(work_dir)
+            active.add(work_dir)
+        time.sleep(0.005)
+        with lock:
+            active.discard(work_dir)
+        return False
+
+    pipeline = RepairPipeline(lambda job: job, validate_fn, str(tmp_path), generate_workers=4, validate_workers=3)
+    _run(pipeline, range(30))
+    assert shared == []
+    assert len(pipeline.work_dir_pool.work_dirs) == 3
+
+def test_pipeline_can_run_again(tmp_path):
+    done = []
+    pipeline = RepairPipeline(lambda job: job, lambda job, work_dir: False, str(tmp_path), done_fn=done.append)
+    _run(pipeline, [])
+    _run(pipeline, [1, 2])
+    assert sorted(done) == [1, 2]
@@ -0,0 +1,91 @@
+import os
+import json
+
+from utils.run_journal import JsonLinesLog, RunJournal, journal_path_for, reset_journal
+
+class _Recorder(JsonLinesLog):
+    def __init__(self, path, **kwargs):
+        self.entries = []
+        super().__init__(path, **kwargs)
+
+    def _apply(self, entry):
+        self.entries.append(entry)
+
+def _lines(path):
+    with open(path, 'rb') as f:
+        return f.read().split(b"\n")
+
+def test_appended_records_are_replayed(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    log = _Recorder(path)
+    log.append({"n": 1})
+    log.append({"n": "é"})
+    log.close()
+    assert _Recorder(path).entries == [{"n": 1}, {"n": "é"}]
+
+def test_torn_last_record_is_truncated(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    with open(path, 'wb') as f:
+        f.write(b'{"n": 1}\n{"n": 2}\n{"n": 3')
+    log = _Recorder(path)
+    assert log.entries == [{"n": 1}, {"n": 2}]
+    assert os.path.getsize(path) == len(b'{"n": 1}\n{"n": 2}\n')
+    log.append({"n": 4})
+    log.close()
+    assert _lines(path) == [b'{"n": 1}', b'{"n": 2}', b'{"n": 4}', b'']
+    assert _Recorder(path).entries == [{"n": 1}, {"n": 2}, {"n": 4}]
+
+def test_unreadable_record_is_skipped_and_kept(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    with open(path, 'wb') as f:
+        f.write(b'{"n": 1}\n{"n": \xff\n{"n": 3}\n')
+    size = os.path.getsize(path)
+    log = _Recorder(path)
+    log.close()
+    assert log.entries == [{"n": 1}, {"n": 3}]
+    assert os.path.getsize(path) == size
+
+def test_journal_tracks_done_bugs_per_mode(tmp_path):
+    path = str(tmp_path / "processed.jsonl")
+    journal = RunJournal(path)
+    journal.record("hunk_generated", "MODE.SF", "Lang_1", hunk=0)
+    journal.mark_done("MODE.SF", "Lang_1", status="plausible")
+    journal.close()
+    journal = RunJournal(path)
+    assert journal.is_done("MODE.SF", "Lang_1")
+    assert not journal.is_done("MODE.SF", "Lang_2")
+    assert not journal.is_done("MODE.AR", "Lang_1")
+    assert journal.done_bugs("MODE.SF") == {"Lang_1": "plausible"}
+    journal.close()
+
+def test_legacy_processed_file_is_imported_once(tmp_path):
+    processed_file = str(tmp_path / "processed.json")
+    with open(processed_file, 'w') as f:
+        json.dump({"MODE.SF": ["Lang_1", "Chart_2"]}, f)
+    journal = RunJournal.for_processed_file(processed_file)
+    assert journal.path == journal_path_for(processed_file) == str(tmp_path / "processed.jsonl")
+    assert journal.done_bugs("MODE.SF") == {"Lang_1": None, "Chart_2": None}
+    journal.close()
+
+    with open(processed_file, 'w') as f:
+        json.dump({"MODE.SF": ["Math_3"]}, f)
+    journal = RunJournal.for_processed_file(processed_file)
+    assert set(journal.done_bugs("MODE.SF")) == {"Lang_1", "Chart_2"}
+    journal.close()
+
+def test_reset_moves_the_journal_aside(tmp_path):
+    processed_file = str(tmp_path / "processed.json")
+    with open(processed_file, 'w') as f:
+        json.dump({"MODE.SF": ["Lang_1"]}, f)
+    RunJournal.for_processed_file(processed_file).close()
+
+    journal = RunJournal.for_processed_file(processed_file, reset=True)
+    assert journal.done_bugs("MODE.SF") == {}
+    journal.close()
+    archived = [name for name in os.listdir(tmp_path) if name.startswith("processed.") and name != "processed.jsonl" and name.endswith(".jsonl")]
+    assert len(archived) == 1
+
+def test_reset_without_journal_creates_an_empty_one(tmp_path):
+    path = str(tmp_path / "processed.jsonl")
+    assert reset_journal(path) is None
+    assert os.path.getsize(path) == 0
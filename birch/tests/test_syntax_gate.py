@@ -0,0 +1,44 @@
+from utils.syntax_gate import reject_unparsable, syntax_error
+
+BUGGY = "class A {\n  int f() {\n    return 1;\n  }\n}\n"
+
+def test_valid_source_has_no_error():
+    assert syntax_error(BUGGY) is None
+
+def test_error_position_is_reported():
+    assert syntax_error("class A {\n  int f() {\n    return 1 +;\n  }\n}\n") == (3, 15, "syntax error: Expected expression at ';'")
+
+def test_missing_semicolon_is_an_error():
+    # javalang reports the token after its lookahead, not the end of line 3.
+    line, _, message = syntax_error("class A {\n  int f() {\n    return 1\n  }\n}\n")
+    assert line >= 3
+    assert message.startswith("syntax error: Expected ';'")
+
+def test_unterminated_source_reports_end_of_file():
+    assert syntax_error("class A {\n  int f() {\n") == (3, None, "reached end of file while parsing")
+
+def test_parsing_patches_pass_to_javac(tmp_path):
+    patched = BUGGY.replace("return 1;", "return 2;")
+    assert reject_unparsable(str(tmp_path), {"src/A.java": (BUGGY, patched)}) is None
+
+def test_unparsable_patch_is_rejected_like_javac(tmp_path):
+    patched = BUGGY.replace("return 1;", "return 1 +;")
+    returncode, errors = reject_unparsable(str(tmp_path), {"src/A.java": (BUGGY, patched)})
+    lines = errors.split("\n")
+    assert returncode == 1
+    assert lines[0].startswith(f"    [javac] {tmp_path}/src/A.java:3: error: syntax error: ")
+    assert lines[1] == "    [javac]     return 1 +;"
+    assert lines[2].endswith("^")
+    assert lines[-1] == "    [javac] 1 error"
+
+def test_errors_of_every_file_are_counted(tmp_path):
+    broken = BUGGY.replace("return 1;", "return 1 +;")
+    returncode, errors = reject_unparsable(str(tmp_path), {"src/A.java": (BUGGY, broken), "src/B.java": (BUGGY, broken)})
+    assert errors.count(": error: ") == 2
+    assert errors.endswith("    [javac] 2 errors")
+
+def test_files_javalang_cannot_parse_unpatched_are_left_to_javac(tmp_path):
+    # Pre-Java 5 sources may use enum as an identifier.
+    buggy = "class A {\n  int enum = 1;\n}\n"
+    patched = "class A {\n  int enum = 2;\n}\n"
+    assert reject_unparsable(str(tmp_path), {"src/A.java": (buggy, patched)}) is None
@@ -0,0 +1,56 @@
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from patch_validation import unified_diff
+
+pytestmark = pytest.mark.skipif(shutil.which("diff") is None, reason="needs diff")
+
+def _gnu_diff(tmp_path, before, after, context=3):
+    a, b = tmp_path / "a.java", tmp_path / "b.java"
+    a.write_text("".join(before), newline="")
+    b.write_text("".join(after), newline="")
+    proc = subprocess.run(["diff", f"-U{context}", "--label", "a/A.java", "--label", "b/A.java", str(a), str(b)],
+                          capture_output=True)
+    return proc.stdout.decode("utf-8")
+
+def _mutate(rng, lines, vocabulary):
+    lines = list(lines)
+    for _ in range(rng.randint(1, 6)):
+        op = rng.choice(("insert", "delete", "replace"))
+        position = rng.randint(0, len(lines))
+        if op == "insert" or not lines:
+            lines[position:position] = [rng.choice(vocabulary) for _ in range(rng.randint(1, 3))]
+        elif op == "delete":
+            del lines[position:position + rng.randint(1, 3)]
+        else:
+            lines[position:position + 1] = [rng.choice(vocabulary)]
+    return lines
+
+@pytest.mark.parametrize("before, after", [
+    ([], []),
+    (["a\n"], ["a\n"]),
+    ([], ["a\n", "b\n"]),
+    (["a\n", "b\n"], []),
+    (["a\n", "b"], ["a\n", "b\n"]),
+    (["a\n", "b\n"], ["a\n", "c"]),
+    (["}\n", "x\n", "}\n", "y\n", "}\n"], ["}\n", "y\n", "}\n"]),
+    ([f"{i}\n" for i in range(20)], [f"{i}\n" for i in range(20) if i not in (3, 10)]),
+    ([f"{i}\n" for i in range(20)], [f"{i}\n" for i in range(20) if i not in (3, 12)]),
+])
+def test_matches_diff_u(tmp_path, before, after):
+    assert unified_diff(before, after, "a/A.java", "b/A.java") == _gnu_diff(tmp_path, before, after)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_edits_match_diff_u(tmp_path, seed):
+    rng = random.Random(seed)
+    # A small vocabulary makes repeated lines, where alignment choices differ.
+    vocabulary = ["{\n", "}\n", "\n", "return x;\n", "int x = 0;\n", "x++;\n", "// comment\n"]
+    before = [rng.choice(vocabulary) for _ in range(rng.randint(0, 40))]
+    after = _mutate(rng, before, vocabulary)
+    if rng.random() < 0.2 and after and after[-1] != "\n":
+        after[-1] = after[-1].rstrip("\n")
+    context = rng.choice((0, 1, 3))
+    assert unified_diff(before, after, "a/A.java", "b/A.java", context) == _gnu_diff(tmp_path, before, after, context)
@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+
+from utils import validation_cache
+from utils.validation_cache import (
+    ValidationCache, cached_compile, cached_test, compile_variant, is_noop, patch_set_hash, unchanged_test_result)
+
+BUG = "Lang_1"
+VARIANT = compile_variant()
+TESTS = validation_cache.test_variant(["org.A::t"])
+
+class _Calls:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self.results.pop(0)
+
+@pytest.fixture
+def store(tmp_path):
+    store = ValidationCache(str(tmp_path / "cache.sqlite"))
+    yield store
+    store.close()
+
+def test_hash_ignores_line_endings_and_trailing_whitespace():
+    a = {"A.java": ("old", "class A {\n  int x;\n}\n")}
+    b = {"A.java": ("other", "class A {  \r\n  int x;\r\n}\r\n")}
+    c = {"A.java": ("old", "class A {\n  int y;\n}\n")}
+    assert patch_set_hash(a) == patch_set_hash(b)
+    assert patch_set_hash(a) != patch_set_hash(c)
+    assert patch_set_hash(a) != patch_set_hash({"B.java": a["A.java"]})
+
+def test_noop_patches():
+    assert is_noop({"A.java": ("int x;\n", "int x;  \r\n")})
+    assert not is_noop({"A.java": ("int x;\n", "int x;\n"), "B.java": ("a", "b")})
+
+def test_unchanged_result_fails_the_triggering_tests():
+    returncode, failed_tests, stdout, stderr = unchanged_test_result(["org.A::t1", "org.A::t2"])
+    assert (returncode, failed_tests, stderr) == (0, ["org.A::t1", "org.A::t2"], '')
+    assert stdout == "Failing tests: 2\n  - org.A::t1\n  - org.A::t2\n"
+
+def test_compile_hit_reports_no_time(store):
+    compile_fn = _Calls((1, "error: ';' expected"))
+    returncode, errors, seconds, hit = cached_compile(store, BUG, "h", VARIANT, compile_fn)
+    assert (returncode, errors, hit) == (1, "error: ';' expected", False)
+    assert cached_compile(store, BUG, "h", VARIANT, compile_fn) == (1, "error: ';' expected", 0.0, True)
+    assert compile_fn.count == 1
+
+def test_compile_results_are_kept_per_bug_and_variant(store):
+    compile_fn = _Calls((0, ''), (0, ''), (0, ''))
+    cached_compile(store, BUG, "h", VARIANT, compile_fn)
+    assert not cached_compile(store, "Lang_2", "h", VARIANT, compile_fn)[3]
+    assert not cached_compile(store, BUG, "h", compile_variant(incremental=True), compile_fn)[3]
+    assert compile_fn.count == 3
+
+def test_harness_errors_are_not_cached(store):
+    compile_fn = _Calls((-1, "timeout"), (0, ''))
+    cached_compile(store, BUG, "h", VARIANT, compile_fn)
+    assert cached_compile(store, BUG, "h", VARIANT, compile_fn)[::3] == (0, False)
+    test_fn = _Calls((-1, [], '', 'defects4j died'), (0, [], '', ''))
+    cached_test(store, BUG, "h", TESTS, test_fn)
+    assert cached_test(store, BUG, "h", TESTS, test_fn)[5] is False
+    assert test_fn.count == 2
+
+def test_test_hit_reports_no_time(store):
+    test_fn = _Calls((0, ["org.A::t"], "Failing tests: 1\n  - org.A::t\n", ''))
+    result = cached_test(store, BUG, "h", TESTS, test_fn)
+    assert result[:4] == (0, ["org.A::t"], "Failing tests: 1\n  - org.A::t\n", '') and result[5] is False
+    assert cached_test(store, BUG, "h", TESTS, test_fn) == (0, ["org.A::t"], "Failing tests: 1\n  - org.A::t\n", '', 0.0, True)
+    assert not cached_test(store, BUG, "h", validation_cache.test_variant(["org.A::t"], full_suite=False), _Calls((0, [], '', '')))[5]
+    assert test_fn.count == 1
+
+def test_test_miss_after_compile_hit_compiles_first(store):
+    events = []
+    compile_fn = lambda: events.append("compile") or (0, '')
+    test_fn = lambda: events.append("test") or (0, [], '', '')
+    cached_test(store, BUG, "h", TESTS, test_fn, compile_fn)
+    assert events == ["compile", "test"]
+    cached_test(store, BUG, "h", TESTS, test_fn, compile_fn)
+    assert events == ["compile", "test"]
+
+def test_no_cache_always_runs():
+    compile_fn = _Calls((0, ''), (0, ''))
+    assert not cached_compile(None, BUG, None, VARIANT, compile_fn)[3]
+    assert not cached_compile(None, BUG, None, VARIANT, compile_fn)[3]
+    assert compile_fn.count == 2
+
+def test_results_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    store = ValidationCache(path)
+    cached_compile(store, BUG, "h", VARIANT, _Calls((0, '')))
+    store.close()
+    store = ValidationCache(path)
+    assert cached_compile(store, BUG, "h", VARIANT, _Calls())[3]
+    store.close()
+
+def test_compile_results_without_variant_are_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE compile_results (bug TEXT, content_hash TEXT, returncode INTEGER, errors TEXT, compile_time REAL)")
+    conn.execute("INSERT INTO compile_results VALUES ('Lang_1', 'h', 0, '', 1.0)")
+    conn.commit()
+    conn.close()
+    store = ValidationCache(path)
+    assert store.get_compile(BUG, "h", VARIANT) is None
+    store.close()
@@ -0,0 +1,27 @@
+import asyncio
+
+def generate_hunks_concurrently(generate_fn, hunk_indices, max_concurrency=1):
+    """
+    Calls `generate_fn(bug_num)` for every hunk index and returns a dict
+    mapping each index to its result. Hunk prompts of one bug do not depend
+    on each other before patches are applied, so up to `max_concurrency`
+    requests are kept in flight at once and the bug waits roughly as long as
+    its slowest hunk. Callers apply the results in their own order.
+    """
+    hunk_indices = list(hunk_indices)
+    if max_concurrency <= 1 or len(hunk_indices) <= 1:
+        return {bug_num: generate_fn(bug_num) for bug_num in hunk_indices}
+
+    return asyncio.run(_generate_all(generate_fn, hunk_indices, max_concurrency))
+
+async def _generate_all(generate_fn, hunk_indices, max_concurrency):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate_one(bug_num):
+        async with semaphore:
+            # invoke_llm and invoke_gemini are blocking clients; run them on
+            # the default executor so the event loop can overlap them.
+            return await asyncio.to_thread(generate_fn, bug_num)
+
+    results = await asyncio.gather(*(generate_one(bug_num) for bug_num in hunk_indices))
+    return dict(zip(hunk_indices, results))
@@ -0,0 +1,80 @@
+import os
+import json
+import glob
+import logging
+
+def load_bug_costs(trajectory_logs_paths):
+    """
+    Reads `*_trajectory.json` files of earlier runs and returns a dict mapping
+    "<project>_<bug_id>" to its observed cost in seconds. Later directories
+    win when a bug appears more than once.
+    """
+    costs = {}
+    for logs_path in trajectory_logs_paths:
+        for log_file in glob.glob(os.path.join(logs_path, "*_trajectory.json")):
+            try:
+                with open(log_file, 'r', encoding='utf-8') as f:
+                    trajectory_log = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping unreadable trajectory log {log_file}: {e}")
+                continue
+
+            cost = _trajectory_cost(trajectory_log)
+            if cost > 0:
+                bug = trajectory_log.get("bug_id") or os.path.basename(log_file)[:-len("_trajectory.json")]
+                costs[bug] = cost
+    return costs
+
+def _trajectory_cost(trajectory_log):
+    if trajectory_log.get("duration_seconds"):
+        return float(trajectory_log["duration_seconds"])
+
+    # Runs killed before the bug finished have no duration; fall back to the
+    # JVM time, which is what dominates the tail of a parallel run.
+    cost = float(trajectory_log.get("time_compilation_iteration", 0) or 0) + float(trajectory_log.get("time_test_iteration", 0) or 0)
+    for iteration in trajectory_log.get("iterations", []):
+        cost += float(iteration.get("time_total_iteration", 0) or 0) or (
+            float(iteration.get("time_compilation_iteration", 0) or 0) + float(iteration.get("time_test_iteration", 0) or 0)
+        )
+    return cost
+
+def estimate_bug_costs(bugs, history, dataset=None):
+    """
+    Predicts the cost of every (project, bug_id): its own history if there is
+    any, else the average of its project, else the average cost per hunk
+    times its hunk count. Without any history the hunk count alone is used.
+    """
+    project_costs = {}
+    for bug, cost in history.items():
+        project_costs.setdefault(bug.split("_")[0], []).append(cost)
+    project_averages = {project: sum(costs) / len(costs) for project, costs in project_costs.items()}
+
+    def hunk_count(bug):
+        if dataset and bug in dataset:
+            return max(1, int(dataset[bug].get("bug_count", 1)))
+        return 1
+
+    known_hunks = sum(hunk_count(bug) for bug in history)
+    cost_per_hunk = sum(history.values()) / known_hunks if known_hunks else 1.0
+
+    estimates = {}
+    for project, bug_id in bugs:
+        bug = f"{project}_{bug_id}"
+        if bug in history:
+            estimates[bug] = history[bug]
+        elif project in project_averages:
+            estimates[bug] = project_averages[project]
+        else:
+            estimates[bug] = cost_per_hunk * hunk_count(bug)
+    return estimates
+
+def order_longest_first(bugs, trajectory_logs_paths, dataset=None):
+    """
+    Returns `bugs` sorted by predicted cost, longest first, so the slowest
+    bugs (Closure, JacksonDatabind, ...) start early instead of forming a
+    single-bug tail at the end of a parallel run. Ties keep dataset order.
+    """
+    history = load_bug_costs(trajectory_logs_paths)
+    estimates = estimate_bug_costs(bugs, history, dataset)
+    logging.info(f"Scheduling {len(bugs)} bugs longest-first ({len(history)} with history)")
+    return sorted(bugs, key=lambda entry: -estimates[f"{entry[0]}_{entry[1]}"])
@@ -0,0 +1,71 @@
+import os
+import time
+from .run_journal import JsonLinesLog
+
+COMPLETION_KEY_FIELDS = ("bug", "hunk", "mode", "model", "scope", "method", "iteration")
+
+def completion_key(bug, hunk, mode, model, scope=None, method=None, iteration=0):
+    return (str(bug), int(hunk), str(mode), str(model), str(scope), str(method), int(iteration))
+
+class CompletionStore(JsonLinesLog):
+    """
+    Per-hunk store of LLM completions keyed by (bug, hunk, mode, model, scope,
+    method, iteration). The generated_patches/*.txt files are append-only text
+    and cannot be read back per hunk; this store can, so a resumed run reuses
+    every completion it already paid for and goes straight to validation.
+    """
+    def __init__(self, path, sync_every=1, sync_interval=0.0):
+        self._completions = {}
+        # Every completion costs money, so by default each one is fsync'ed.
+        super().__init__(path, sync_every, sync_interval)
+
+    @classmethod
+    def for_results(cls, results_base_path):
+        return cls(os.path.join(results_base_path, "completions.jsonl"))
+
+    def get(self, key):
+        with self._lock:
+            return self._completions.get(key)
+
+    def put(self, key, completion, llm_time, prompt):
+        entry = dict(zip(COMPLETION_KEY_FIELDS, key))
+        entry.update({"ts": round(time.time(), 3), "completion": completion, "llm_time": llm_time, "prompt": prompt})
+        self.append(entry)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._completions)
+
+    def _apply(self, entry):
+        try:
+            key = completion_key(*(entry[field] for field in COMPLETION_KEY_FIELDS))
+        except (KeyError, TypeError, ValueError):
+            return
+        self._completions[key] = {
+            "completion": entry.get("completion"),
+            "llm_time": entry.get("llm_time", 0),
+            "prompt": entry.get("prompt", "")
+        }
+
+def reuse_completions(store, generate_fn, bug, mode, model, scope=None, method=None, iteration=0):
+    """
+    Wraps `generate_fn(bug_num) -> (patches, llm_time, prompt)` so that stored
+    completions are returned without calling the LLM and new successful ones
+    are stored. With `store` None, `generate_fn` is returned unchanged.
+    """
+    if store is None:
+        return generate_fn
+
+    def generate(bug_num):
+        key = completion_key(bug, bug_num, mode, model, scope, method, iteration)
+        stored = store.get(key)
+        if stored is not None:
+            return stored["completion"], stored["llm_time"], stored["prompt"]
+
+        result = generate_fn(bug_num)
+        if result is not None and result[0] is not None:
+            patches, llm_time, prompt = result
+            store.put(key, patches, llm_time, prompt)
+        return result
+
+    return generate
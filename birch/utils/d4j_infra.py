@@ -1,20 +1,35 @@
 import os
 import subprocess
 import csv
+import io
 import json
+import shutil
+import tempfile
+import threading
+import time
 from llm.llm_api_call import invoke_llm
 from llm.invoke_gemini_flash_no_reasoning import invoke_gemini
 from prompts.prompt import generate_prompt
 from dotenv import load_dotenv
 from llm.models import Models
+from .worktree_store import get_worktree_store
+from .test_runner import run_tests_warm, TestRunnerError
+from .work_dir_manager import recycle_work_dir, discard_tree
+from .test_baseline import get_test_baselines
+from .java_signatures import api_changed
+from utils.file_content import read_text
 import logging
 
+# Serializes writers of files shared by every bug in a run (results CSV,
+# processed list) so parallel workers cannot interleave partial writes.
+_shared_writer_lock = threading.Lock()
+
+_dataset_cache = {}
+_dataset_cache_lock = threading.Lock()
+
 def clear_work_dir(work_dir):
-    if not os.path.exists(work_dir):
-        os.makedirs(work_dir)
-        return
-    
-    os.system(f'rm -rf {work_dir}/*')
+    # Old trees are renamed away and deleted in the background.
+    recycle_work_dir(work_dir)
 
 def extract_projects_and_bugs(dataset_path):
     with open(dataset_path, 'r') as file:
@@ -33,32 +48,53 @@ def strip_code_block(content):
         return '\n'.join(lines[1:-1]).strip()
     return content.strip()
 
+def append_to_file(file_path, text):
+    # Hunks of one bug may be generated concurrently and share these files.
+    with _shared_writer_lock, open(file_path, 'a', encoding='utf-8') as file:
+        file.write(text)
+
 def write_result_csv(project, bug_id, compile_result, test_result, failed_tests, mode, results_base_path, llm_time, compile_time, test_time):
     results_file_path = os.path.abspath(os.path.join(results_base_path, f"test_results_mode_{mode}.csv"))
-    file_exists = os.path.isfile(results_file_path)
-    with open(results_file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(['bug', 'pass', 'test_fail', 'compile_fail', 'failed_tests', 'llm_time', 'compile_time', 'test_time'])
-        
-        # Determine pass, test_fail, and compile_fail
-        pass_status = 'Yes' if test_result == 1 and compile_result == 0 else 'No'
-        test_fail = 'Yes' if pass_status == 'No' and compile_result == 0 else 'No'
-        compile_fail = 'Yes' if compile_result != 0 else 'No'
-        
-        writer.writerow([
-            f'{project}-{bug_id}', 
-            pass_status, 
-            test_fail, 
-            compile_fail, 
-            '; '.join(failed_tests), 
-            f'{llm_time:.2f}', 
-            f'{compile_time:.2f}', 
-            f'{test_time:.2f}'
-        ])
+
+    # Determine pass, test_fail, and compile_fail
+    pass_status = 'Yes' if test_result == 1 and compile_result == 0 else 'No'
+    test_fail = 'Yes' if pass_status == 'No' and compile_result == 0 else 'No'
+    compile_fail = 'Yes' if compile_result != 0 else 'No'
+
+    row = io.StringIO()
+    writer = csv.writer(row)
+    writer.writerow([
+        f'{project}-{bug_id}', 
+        pass_status, 
+        test_fail, 
+        compile_fail, 
+        '; '.join(failed_tests), 
+        f'{llm_time:.2f}', 
+        f'{compile_time:.2f}', 
+        f'{test_time:.2f}'
+    ])
+
+    with _shared_writer_lock, open(results_file_path, mode='a', newline='') as file:
+        prefix = ''
+        if file.tell() == 0:
+            header = io.StringIO()
+            csv.writer(header).writerow(['bug', 'pass', 'test_fail', 'compile_fail', 'failed_tests', 'llm_time', 'compile_time', 'test_time'])
+            prefix = header.getvalue()
+        elif not _ends_with_newline(results_file_path):
+            # A previous run was killed mid-row; start on a fresh line.
+            prefix = '\r\n'
+        # One write per row, synced, so a crash never leaves half a row behind.
+        file.write(prefix + row.getvalue())
+        file.flush()
+        os.fsync(file.fileno())
 
     logging.info(f"Results written for {project}-{bug_id}: Pass: {pass_status}, Test Fail: {test_fail}, Compile Fail: {compile_fail}, Failed Tests: {failed_tests}, LLM Time: {llm_time:.2f}, Compile Time: {compile_time:.2f}, Test Time: {test_time:.2f}")
 
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
 def save_test_results(project, bug_id, stdout, stderr, TEST_RESULT_PATH):
     result_dir = os.path.join(TEST_RESULT_PATH,"{project}_{bug_id}_failed_tests")
     if not os.path.exists(result_dir):
@@ -85,9 +121,18 @@ def save_compile_results(project, bug_id, stdout, COMPILE_RESULTS_PATH):
 
     logging.info(f"Test results saved for {project}-{bug_id}: stdout -> {stdout_path}")
 
+def load_dataset_cached(dataset_path):
+    # Prompts for every hunk read the trigger tests from the dataset file;
+    # parse it once per (path, mtime) instead of once per hunk.
+    key = (os.path.abspath(dataset_path), os.stat(dataset_path).st_mtime_ns)
+    with _dataset_cache_lock:
+        if key not in _dataset_cache:
+            with open(dataset_path, 'r') as json_file:
+                _dataset_cache[key] = json.load(json_file)
+        return _dataset_cache[key]
+
 def concatenate_trigger_test_info(json_file_path, current_bug):
-    with open(json_file_path, 'r') as json_file:
-        data = json.load(json_file)
+    data = load_dataset_cached(json_file_path)
 
     if "triggered_tests" not in data[current_bug]:
         print("No 'triggered_tests' key found in the JSON data.")
@@ -147,8 +192,7 @@ def get_fix_code(project, bug_id, bug_num, dataset, mode, model, PROMPT_PATH, GE
         if not os.path.exists(PROMPT_PATH):
             os.makedirs(PROMPT_PATH)
         suggestion_prompt_file_path = os.path.join(PROMPT_PATH, f'{current_bug}_prompt_{mode}.txt')
-        with open(suggestion_prompt_file_path, 'a', encoding='utf-8') as file:
-            file.write(prompt)
+        append_to_file(suggestion_prompt_file_path, prompt)
 
         if model == "gemini-2.5-flash-preview-04-17":
             fixed_code, inference_time = invoke_gemini(model, system_prompt, prompt, API_HOST)
@@ -162,21 +206,45 @@ def get_fix_code(project, bug_id, bug_num, dataset, mode, model, PROMPT_PATH, GE
         if not os.path.exists(GENERATED_PATCHES_PATH):
             os.makedirs(GENERATED_PATCHES_PATH)
         generated_patches_file_path = os.path.join(GENERATED_PATCHES_PATH, f'{current_bug}_generated_patches_{mode}.txt')
-        with open(generated_patches_file_path, 'a', encoding='utf-8') as file:
-            file.write(fixed_code)
-            file.write("\n")
+        append_to_file(generated_patches_file_path, fixed_code + "\n")
         return fixed_code, inference_time, prompt
     else:
         print(f"No buggy function found for {current_bug}")
         return None
 
     
-def compile_repo(repo_dir_path):
+def compile_repo(repo_dir_path, patched_files=None, pristine_repo_dir=None):
+    """
+    Runs `defects4j compile`. With the repository-relative `patched_files` and
+    the compiled pristine checkout the work tree was cloned from, only the
+    patched files are compiled with javac against its classes and cp.compile;
+    bugs that cannot be compiled that way fall back to the full build. So do
+    patches changing what other classes compile against (non-private
+    signatures, constants), after the build outputs copied from the pristine
+    checkout are removed.
+    """
+    if patched_files and pristine_repo_dir:
+        if _signatures_changed(repo_dir_path, patched_files, pristine_repo_dir):
+            _discard_build_outputs(repo_dir_path, pristine_repo_dir)
+        else:
+            incremental_result = _compile_incrementally(repo_dir_path, patched_files, pristine_repo_dir)
+            if incremental_result is not None:
+                return incremental_result
+
     compile_proc = subprocess.run(
         ['defects4j', 'compile'],
         stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=repo_dir_path)
     
-    compile_error_lines = compile_proc.stderr.decode('utf-8').split('\n')[2:]
+    compile_error_msg = _filter_javac_output(compile_proc.stderr.decode('utf-8').split('\n')[2:])
+    
+    if compile_proc.returncode != 0:
+        logging.error(f"Compilation failed for repo {repo_dir_path} with errors: {compile_error_msg}")
+    else:
+        logging.info(f"Compilation succeeded for repo {repo_dir_path}")
+
+    return compile_proc.returncode, compile_error_msg
+
+def _filter_javac_output(compile_error_lines):
     compile_error_lines = [
         e for e in compile_error_lines if '[javac] [' not in e]
     compile_error_lines = [e for e in compile_error_lines if '[javac]' in e]
@@ -186,18 +254,170 @@ def compile_repo(repo_dir_path):
         e for e in compile_error_lines if '[javac] Note:' not in e]
     compile_error_lines = [
         e for e in compile_error_lines if 'compiler be upgraded.' not in e]
-    compile_error_msg = '\n'.join(compile_error_lines)
-    
-    if compile_proc.returncode != 0:
-        logging.error(f"Compilation failed for repo {repo_dir_path} with errors: {compile_error_msg}")
-    else:
-        logging.info(f"Compilation succeeded for repo {repo_dir_path}")
+    return '\n'.join(compile_error_lines)
+
+# Tried in order on the unpatched files of a bug; the first set that compiles
+# them is used for its patched versions. Older projects need ISO-8859-1
+# sources or a 1.4 source level (e.g. Lang's `enum` package).
+JAVAC_OPTION_CANDIDATES = (
+    ['-encoding', 'UTF-8'],
+    ['-encoding', 'ISO-8859-1'],
+    ['-source', '1.4', '-target', '1.4', '-encoding', 'ISO-8859-1'],
+)
+_javac_options = {}
+_javac_options_lock = threading.Lock()
+
+def _signatures_changed(repo_dir_path, patched_files, pristine_repo_dir):
+    # javac rewrites only the patched classes, and Ant recompiles only sources
+    # newer than their classes: dependents of a changed signature go stale.
+    for patched_file in set(patched_files):
+        try:
+            buggy_source, _ = read_text(os.path.join(pristine_repo_dir, patched_file))
+            patched_source, _ = read_text(os.path.join(repo_dir_path, patched_file))
+        except (OSError, UnicodeError):
+            return True
+        if api_changed(buggy_source, patched_source):
+            logging.info(f"Patch changes the signatures of {patched_file}; rebuilding {repo_dir_path} with defects4j compile")
+            return True
+    return False
+
+def _discard_build_outputs(repo_dir_path, pristine_repo_dir):
+    # Build outputs are copied, never hard-linked, from the pristine checkout.
+    output_dirs = (_pristine_metadata(pristine_repo_dir).get("classes_dir") or _export_property(repo_dir_path, 'dir.bin.classes'),
+                   _export_property(repo_dir_path, 'dir.bin.tests'))
+    for output_dir in filter(None, output_dirs):
+        shutil.rmtree(os.path.join(repo_dir_path, output_dir), ignore_errors=True)
+
+def _compile_incrementally(repo_dir_path, patched_files, pristine_repo_dir):
+    """Returns (returncode, errors) like compile_repo, or None if the bug needs a full build."""
+    metadata = _pristine_metadata(pristine_repo_dir)
+    if not metadata.get("baseline_compiles") or not metadata.get("classes_dir") or metadata.get("cp_compile") is None:
+        return None
+    patched_files = sorted(set(patched_files))
+    javac_options = _calibrate_javac(pristine_repo_dir, patched_files, metadata)
+    if javac_options is None:
+        return None
 
-    return compile_proc.returncode, compile_error_msg
+    # cp.compile was exported in the pristine checkout; point it at the clone.
+    classpath = metadata["cp_compile"].replace(pristine_repo_dir, repo_dir_path)
+    classes_dir = os.path.join(repo_dir_path, metadata["classes_dir"])
+    javac_proc = _run_javac(repo_dir_path, patched_files, classpath, classes_dir, javac_options)
+    # Shape javac's diagnostics like Ant's so callers parse both the same way.
+    compile_error_msg = _filter_javac_output([f"    [javac] {line}" for line in javac_proc.stderr.split('\n') if line])
 
-def run_test(repo_dir_path):
-    '''Returns failing test number and test details.'''
-    test_process = subprocess.run(['defects4j', 'test'],
+    if javac_proc.returncode != 0:
+        logging.error(f"Incremental compilation failed for repo {repo_dir_path} with errors: {compile_error_msg}")
+    else:
+        logging.info(f"Incremental compilation of {len(patched_files)} files succeeded for repo {repo_dir_path}")
+    return javac_proc.returncode, compile_error_msg
+
+def _calibrate_javac(pristine_repo_dir, patched_files, metadata):
+    key = (pristine_repo_dir, tuple(patched_files))
+    with _javac_options_lock:
+        if key in _javac_options:
+            return _javac_options[key]
+
+    javac_options = None
+    with tempfile.TemporaryDirectory() as output_dir:
+        for candidate in JAVAC_OPTION_CANDIDATES:
+            if _run_javac(pristine_repo_dir, patched_files, metadata["cp_compile"], output_dir, candidate).returncode == 0:
+                javac_options = candidate
+                break
+    if javac_options is None:
+        logging.warning(f"Unpatched {patched_files} of {pristine_repo_dir} do not compile with javac alone; using defects4j compile")
+
+    with _javac_options_lock:
+        _javac_options[key] = javac_options
+    return javac_options
+
+def _run_javac(repo_dir_path, source_files, classpath, output_dir, javac_options):
+    # Absolute paths, so diagnostics name files the way Ant's do.
+    source_paths = [os.path.join(repo_dir_path, source_file) for source_file in source_files]
+    return subprocess.run(
+        ['javac', '-nowarn', '-d', output_dir, '-cp', classpath, *javac_options, *source_paths],
+        capture_output=True, text=True, errors='replace', cwd=repo_dir_path)
+
+def trigger_test_ids(bug_info):
+    '''Returns the dataset's triggering tests of a bug as `Class::method` ids.'''
+    return [
+        f"{test_info['test_path']}::{test_info['test_method']}"
+        for test_info in bug_info.get("triggered_tests", {}).values()
+        if test_info.get("test_path") and test_info.get("test_method")
+    ]
+
+def run_test(repo_dir_path, trigger_tests=None, pristine_repo_dir=None, relevant_only=False, full_suite=True, selected_tests=None):
+    '''
+    Returns failing test number and test details. With `trigger_tests`, those
+    run first (`defects4j test -t`), stopping at the first one that fails,
+    and the full suite only if all of them pass. A failing run's failed_tests
+    therefore lists only the failures of that first failing triggering test,
+    not those of the suite. With the pristine checkout the work tree was
+    cloned from as well, the triggering tests run in a warm JUnit JVM instead
+    (see utils/test_runner.py);
+    a failure it reports is only final once `defects4j test -t` reproduces
+    it, and a bug whose failures Defects4J does not reproduce stops using it.
+    With `relevant_only`, the suite is narrowed to the tests relevant to the
+    bug (`defects4j test -r`). `selected_tests` (from the test impact index)
+    run with the triggering tests in the warm JVM; they never get a
+    `defects4j test -t` process each. With `full_suite` False, a pass is
+    confirmed by `defects4j test -r` alone, one process running every
+    relevant test and so every selected one, instead of the full suite.
+    '''
+    warm_tests = list(dict.fromkeys((trigger_tests or []) + (selected_tests or [])))
+    if warm_tests and pristine_repo_dir:
+        failed_tests = _run_trigger_tests_warm(repo_dir_path, warm_tests, pristine_repo_dir)
+        if failed_tests:
+            confirmation = _run_defects4j_test(repo_dir_path, failed_tests[0])
+            if confirmation[0] == 0 and confirmation[1]:
+                return confirmation
+            if confirmation[0] == 0:
+                logging.warning(f"Defects4J passes {failed_tests[0]}, which failed in the warm test runner for {repo_dir_path}; using defects4j test for this bug")
+                _warm_runner_unsupported.add(pristine_repo_dir)
+            failed_tests = None
+        if failed_tests is not None:
+            # A pass is always confirmed by Defects4J's own run.
+            return _run_defects4j_test(repo_dir_path, relevant_only=relevant_only or not full_suite)
+
+    if trigger_tests:
+        trigger_stdout = []
+        trigger_stderr = []
+        for trigger_test in trigger_tests:
+            returncode, failed_tests, stdout, stderr = _run_defects4j_test(repo_dir_path, trigger_test)
+            trigger_stdout.append(stdout)
+            trigger_stderr.append(stderr)
+            if returncode != 0:
+                return returncode, failed_tests, ''.join(trigger_stdout), ''.join(trigger_stderr)
+            if failed_tests:
+                # One failure rejects the patch; the rest would not change that.
+                logging.info(f"Triggering test {trigger_test} still fails for repo {repo_dir_path}; skipping the remaining tests")
+                return 0, failed_tests, ''.join(trigger_stdout), ''.join(trigger_stderr)
+    return _run_defects4j_test(repo_dir_path, relevant_only=relevant_only or not full_suite)
+
+_warm_runner_unsupported = set()
+
+def _run_trigger_tests_warm(repo_dir_path, trigger_tests, pristine_repo_dir):
+    '''Returns the failing triggering tests, or None if the bug has to use defects4j test.'''
+    if pristine_repo_dir in _warm_runner_unsupported:
+        return None
+    cp_test = _pristine_metadata(pristine_repo_dir).get("cp_test")
+    if not cp_test:
+        return None
+    try:
+        failed_tests = run_tests_warm(repo_dir_path, cp_test.replace(pristine_repo_dir, repo_dir_path), trigger_tests)
+    except TestRunnerError as e:
+        logging.warning(f"Warm test runner failed for {repo_dir_path}, using defects4j test for this bug: {e}")
+        _warm_runner_unsupported.add(pristine_repo_dir)
+        return None
+    logging.info(f"Warm test runner: {len(failed_tests)} of {len(trigger_tests)} triggering tests fail for {repo_dir_path}")
+    return failed_tests
+
+def _run_defects4j_test(repo_dir_path, single_test=None, relevant_only=False):
+    command = ['defects4j', 'test']
+    if single_test:
+        command += ['-t', single_test]
+    elif relevant_only:
+        command.append('-r')
+    test_process = subprocess.run(command,
                                   capture_output=True, cwd=repo_dir_path)
     captured_stdout = test_process.stdout.decode()
     captured_stderr = test_process.stderr.decode()
@@ -222,13 +442,163 @@ def run_test(repo_dir_path):
 
         return 0, failed_tests, captured_stdout, captured_stderr
 
-def checkout_repo(project, bug_id, work_dir):
+def ensure_test_baseline(baseline_dir, project, bug_id, repo_dir_path, runs=3):
+    '''
+    Returns the test baseline of a bug (see utils/test_baseline.py), measuring
+    it on `repo_dir_path` first if it is not stored yet. The checkout must
+    not be patched yet. Returns None if no baseline run produced results.
+    '''
+    baselines = get_test_baselines(baseline_dir, runs)
+    with baselines.lock(project, bug_id):
+        baseline = baselines.get(project, bug_id)
+        if baseline is not None:
+            return baseline
+
+        run_failures = []
+        run_seconds = []
+        for run in range(baselines.runs):
+            start_time = time.time()
+            returncode, failed_tests, _, _ = _run_defects4j_test(repo_dir_path)
+            if returncode != 0:
+                logging.warning(f"Baseline test run {run + 1} of {project}-{bug_id} produced no results")
+                continue
+            run_failures.append(failed_tests)
+            run_seconds.append(time.time() - start_time)
+        if not run_failures:
+            return None
+
+        modified_classes = _export_property(repo_dir_path, 'classes.modified')
+        baseline = baselines.put(
+            project, bug_id, run_failures, run_seconds,
+            _export_property(repo_dir_path, 'dir.src.classes'),
+            modified_classes.split() if modified_classes else []
+        )
+        logging.info(f"Test baseline of {project}-{bug_id}: {len(baseline['failing'])} failing, {len(baseline['flaky'])} flaky over {baseline['runs']} runs")
+        return baseline
+
+def checkout_repo(project, bug_id, work_dir, pristine_dir=None, clone_mode="reflink", worktree_store=None):
+    if pristine_dir:
+        return _clone_pristine_checkout(project, bug_id, work_dir, pristine_dir, clone_mode, worktree_store)
+    if worktree_store:
+        if get_worktree_store(worktree_store).materialize(project, bug_id, f'{work_dir}/{project}_{bug_id}'):
+            return True
+        print(f"Checkout failed for {project}-{bug_id}")
+        return False
     try:
         subprocess.run(['defects4j', 'checkout', '-p', project, '-v', f'{bug_id}b', '-w', f'{work_dir}/{project}_{bug_id}'], check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"Checkout failed for {project}-{bug_id}: {e}")
         return False
+
+_pristine_locks = {}
+_pristine_locks_lock = threading.Lock()
+PRISTINE_READY_MARKER = ".pristine_ready"
+# reflink: `cp -a --reflink=auto`, copy-on-write on btrfs/XFS/APFS-like file
+#          systems and a plain copy elsewhere.
+# hardlink: source directories are hard-linked, everything else (build
+#          outputs, properties, libraries) is copied; apply_patch breaks the
+#          link of every file it rewrites.
+CLONE_MODES = ("reflink", "hardlink")
+
+def prepare_pristine_checkout(project, bug_id, pristine_dir, worktree_store=None):
+    """
+    Checks the buggy version out once into `pristine_dir` and compiles it, so
+    every run touching the bug (models, modes, scopes, retrieval methods) can
+    start from a copy with up-to-date build outputs. Returns the checkout path,
+    or None if checkout or compilation failed. The checkout is never written
+    to afterwards.
+    """
+    current_bug = f"{project}_{bug_id}"
+    with _pristine_locks_lock:
+        lock = _pristine_locks.setdefault(current_bug, threading.Lock())
+
+    with lock:
+        repo_dir = os.path.join(pristine_dir, current_bug)
+        if os.path.exists(os.path.join(repo_dir, PRISTINE_READY_MARKER)):
+            return repo_dir
+
+        os.makedirs(pristine_dir, exist_ok=True)
+        discard_tree(repo_dir)
+        if not checkout_repo(project, bug_id, pristine_dir, worktree_store=worktree_store):
+            return None
+        compile_returncode, compile_errormsg = compile_repo(repo_dir)
+        if compile_returncode != 0:
+            logging.error(f"Buggy baseline of {current_bug} does not compile:\n{compile_errormsg}")
+        source_dirs = [d for d in (_export_property(repo_dir, 'dir.src.classes'), _export_property(repo_dir, 'dir.src.tests')) if d]
+        metadata = {
+            "source_dirs": source_dirs,
+            "baseline_compiles": compile_returncode == 0,
+            "classes_dir": _export_property(repo_dir, 'dir.bin.classes'),
+            "cp_compile": _export_property(repo_dir, 'cp.compile'),
+            "cp_test": _export_property(repo_dir, 'cp.test'),
+        }
+        with open(os.path.join(repo_dir, PRISTINE_READY_MARKER), 'w') as f:
+            json.dump(metadata, f)
+        return repo_dir
+
+def pristine_checkout_path(project, bug_id, pristine_dir):
+    if not pristine_dir:
+        return None
+    return os.path.join(pristine_dir, f"{project}_{bug_id}")
+
+def _export_property(repo_dir, prop):
+    export_proc = subprocess.run(['defects4j', 'export', '-p', prop], capture_output=True, text=True, cwd=repo_dir)
+    value = export_proc.stdout.strip()
+    if export_proc.returncode != 0 or not value:
+        logging.warning(f"Could not export {prop} for {repo_dir}: {export_proc.stderr.strip()}")
+        return None
+    return value
+
+def _pristine_metadata(repo_dir):
+    try:
+        with open(os.path.join(repo_dir, PRISTINE_READY_MARKER), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Markers written before clone modes existed are empty.
+        return {}
+
+def _clone_pristine_checkout(project, bug_id, work_dir, pristine_dir, clone_mode="reflink", worktree_store=None):
+    repo_dir = prepare_pristine_checkout(project, bug_id, pristine_dir, worktree_store)
+    if repo_dir is None:
+        print(f"Checkout failed for {project}-{bug_id}")
+        return False
+
+    target_dir = os.path.join(work_dir, f"{project}_{bug_id}")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        if clone_mode == "hardlink":
+            _hardlink_sources(repo_dir, target_dir, _pristine_metadata(repo_dir).get("source_dirs", []))
+        else:
+            # -a keeps timestamps, so the copied build outputs stay up to date.
+            subprocess.run(['cp', '-a', '--reflink=auto', repo_dir, target_dir], check=True)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Copying checkout failed for {project}-{bug_id}: {e}")
+        return False
+    marker = os.path.join(target_dir, PRISTINE_READY_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+    return True
+
+def _hardlink_sources(repo_dir, target_dir, source_dirs):
+    # Only sources are shared: javac and ant rewrite build outputs in place,
+    # which would write through a hard link into the pristine checkout.
+    source_prefixes = tuple(os.path.join(repo_dir, d) + os.sep for d in source_dirs)
+
+    def link_or_copy(src, dst):
+        if source_prefixes and src.startswith(source_prefixes):
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                # The work dir is on another file system (e.g. tmpfs).
+                pass
+        shutil.copy2(src, dst)
+
+    shutil.copytree(repo_dir, target_dir, symlinks=True, copy_function=link_or_copy)
+
+def remove_pristine_checkout(project, bug_id, pristine_dir):
+    discard_tree(os.path.join(pristine_dir, f"{project}_{bug_id}"))
     
 def load_processed(PROCESSED_FILE):
     if os.path.exists(PROCESSED_FILE):
@@ -241,5 +611,18 @@ def load_processed(PROCESSED_FILE):
         return processed
 
 def save_processed(processed, PROCESSED_FILE):
-    with open(PROCESSED_FILE, 'w') as f:
-        json.dump(processed, f, indent=4)
+    with _shared_writer_lock:
+        _write_json_atomic(processed, PROCESSED_FILE)
+
+def save_trajectory_log(trajectory_log, logs_output_path):
+    os.makedirs(os.path.dirname(logs_output_path), exist_ok=True)
+    _write_json_atomic(trajectory_log, logs_output_path, encoding='utf-8')
+    logging.info(f"Trajectory logs saved to: {logs_output_path}")
+
+def _write_json_atomic(data, path, encoding=None):
+    # Write next to the target and rename over it, so readers (and a resumed
+    # run) never observe a half-written file.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding=encoding) as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
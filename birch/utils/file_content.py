@@ -0,0 +1,73 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+# Tried in order; ISO-8859-1 decodes any byte sequence, so it ends the chain
+# for Defects4J sources in practice.
+ENCODINGS = ('utf-8', 'ISO-8859-1', 'latin-1', 'cp1252')
+
+class FileContentCache:
+    """
+    Decoded contents of source files, keyed by (path, mtime, size) and kept
+    in an LRU of at most `max_files` entries. A file is read once as bytes
+    and decoded with the first encoding in the chain that succeeds; later
+    reads of the unchanged file (the same buggy file across hunks, attempts,
+    AST parsing and dataset building) come from memory. Line endings are
+    translated as text-mode `open` does.
+    """
+    def __init__(self, max_files=256):
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path, encodings=ENCODINGS):
+        """
+        Returns (text, lines, encoding) of `path`. Raises OSError if the file
+        cannot be read and UnicodeDecodeError if no encoding decodes it.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, tuple(encodings))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        last_error = None
+        for encoding in encodings:
+            try:
+                text = data.decode(encoding)
+                break
+            except UnicodeDecodeError as e:
+                last_error = e
+        else:
+            raise last_error or UnicodeDecodeError('unknown', data, 0, len(data), f"no encoding given for {path}")
+        # Split on line endings only, as readlines() does; str.splitlines
+        # also breaks on form feeds, \x85 and \u2028, shifting line numbers.
+        lines = io.StringIO(text, newline=None).readlines()
+        entry = (''.join(lines), tuple(lines), encoding)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+        return entry
+
+# Import this module as utils.file_content only: birch.utils.* or relative
+# imports would load a second copy with its own cache.
+_file_contents = FileContentCache()
+
+def read_text(path, encodings=ENCODINGS):
+    """Returns (text, encoding) of a source file through the shared cache."""
+    text, _, encoding = _file_contents.read(path, encodings)
+    return text, encoding
+
+def read_lines(path, encodings=ENCODINGS):
+    """Returns (lines with line endings, encoding) of a source file through the shared cache."""
+    _, lines, encoding = _file_contents.read(path, encodings)
+    return list(lines), encoding
@@ -1,11 +1,9 @@
+from utils.file_content import read_text
+
 def read_file_content(file_path):
-    encodings = ['utf-8', 'ISO-8859-1', 'latin-1', 'cp1252']
-    
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', encoding=encoding) as file:
-                return file.read()
-        except Exception as e:
-            print(f"Error reading {file_path} with encoding {encoding}: {e}")
+    try:
+        return read_text(file_path)[0]
+    except (OSError, UnicodeError) as e:
+        print(f"Error reading {file_path}: {e}")
     
     raise IOError(f"Failed to read {file_path} with all tried encodings.")
\ No newline at end of file
@@ -0,0 +1,115 @@
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.Method;
+import java.lang.reflect.Modifier;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.util.List;
+
+/**
+ * Long-lived JUnit runner driven by birch/utils/test_runner.py over stdin and
+ * stdout, so repeated test runs of a work tree pay for neither Perl, Ant nor
+ * JVM startup. Every request loads the classpath (JUnit included) into a fresh
+ * class loader, so recompiled classes and static state never leak between
+ * attempts. JUnit is only reached through reflection; the server itself has
+ * no dependencies and runs on Java 8.
+ *
+ * Requests, one per line, tab separated:
+ *   RUN  classpath  test[,test...]      test = Class or Class::method
+ *   QUIT
+ * Replies: one "FAIL  Class::method" line per failing test followed by
+ * "DONE  run_count  failure_count", or a single "ERROR  message" line.
+ */
+public class D4jTestServer {
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        // Tests print freely; keep their output off the protocol stream.
+        PrintStream sink = new PrintStream(new OutputStream() {
+            @Override public void write(int b) {}
+            @Override public void write(byte[] b, int off, int len) {}
+        });
+        System.setOut(sink);
+        System.setErr(sink);
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] parts = line.split("\t", -1);
+            if (parts[0].equals("QUIT")) {
+                break;
+            }
+            if (!parts[0].equals("RUN") || parts.length != 3) {
+                protocol.println("ERROR\tmalformed request");
+                continue;
+            }
+            try {
+                run(parts[1], parts[2].split(","), protocol);
+            } catch (Throwable t) {
+                protocol.println("ERROR\t" + String.valueOf(t).replace('\n', ' ').replace('\t', ' '));
+            }
+        }
+        System.exit(0);
+    }
+
+    private static void run(String classpath, String[] tests, PrintStream protocol) throws Exception {
+        String[] entries = classpath.split(File.pathSeparator);
+        URL[] urls = new URL[entries.length];
+        for (int i = 0; i < entries.length; i++) {
+            urls[i] = new File(entries[i]).toURI().toURL();
+        }
+
+        URLClassLoader loader = new URLClassLoader(urls, ClassLoader.getSystemClassLoader().getParent());
+        Thread thread = Thread.currentThread();
+        ClassLoader previous = thread.getContextClassLoader();
+        thread.setContextClassLoader(loader);
+        try {
+            Class<?> requestClass = loader.loadClass("org.junit.runner.Request");
+            Class<?> coreClass = loader.loadClass("org.junit.runner.JUnitCore");
+            Method classRequest = requestClass.getMethod("aClass", Class.class);
+            Method methodRequest = requestClass.getMethod("method", Class.class, String.class);
+            Method runRequest = coreClass.getMethod("run", requestClass);
+            Object core = coreClass.newInstance();
+
+            StringBuilder failures = new StringBuilder();
+            int runCount = 0;
+            int failureCount = 0;
+            for (String test : tests) {
+                if (test.isEmpty()) {
+                    continue;
+                }
+                int separator = test.indexOf("::");
+                String className = separator < 0 ? test : test.substring(0, separator);
+                Class<?> testClass = Class.forName(className, false, loader);
+                if (Modifier.isAbstract(testClass.getModifiers())) {
+                    continue;
+                }
+                Object request = separator < 0
+                        ? classRequest.invoke(null, testClass)
+                        : methodRequest.invoke(null, testClass, test.substring(separator + 2));
+                Object result = runRequest.invoke(core, request);
+                runCount += (Integer) result.getClass().getMethod("getRunCount").invoke(result);
+                for (Object failure : (List<?>) result.getClass().getMethod("getFailures").invoke(result)) {
+                    Object description = failure.getClass().getMethod("getDescription").invoke(failure);
+                    Object failedClass = description.getClass().getMethod("getClassName").invoke(description);
+                    Object failedMethod = description.getClass().getMethod("getMethodName").invoke(description);
+                    failures.append("FAIL\t").append(failedClass);
+                    if (failedMethod != null) {
+                        failures.append("::").append(failedMethod);
+                    }
+                    failures.append('\n');
+                    failureCount++;
+                }
+            }
+            protocol.print(failures);
+            protocol.println("DONE\t" + runCount + "\t" + failureCount);
+        } finally {
+            thread.setContextClassLoader(previous);
+            loader.close();
+        }
+    }
+}
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import threading
+import javalang
+
+# Signatures of unpatched files, by hash of their text; every attempt of a
+# bug compares against the same buggy files.
+_signatures = {}
+_signatures_lock = threading.Lock()
+
+def _key(node, skip=()):
+    # Position-free structural key of a javalang node.
+    if isinstance(node, javalang.ast.Node):
+        return (type(node).__name__,) + tuple(
+            (attr, _key(getattr(node, attr))) for attr in node.attrs if attr not in skip and attr != 'documentation')
+    if isinstance(node, (list, tuple)):
+        return tuple(_key(child) for child in node)
+    if isinstance(node, set):
+        return tuple(sorted(node))
+    return node
+
+def _member_keys(declarations, interface):
+    keys = []
+    for member in declarations or []:
+        if not isinstance(member, javalang.ast.Node):
+            # Initializer blocks.
+            continue
+        modifiers = getattr(member, 'modifiers', None) or set()
+        if 'private' in modifiers and not interface:
+            continue
+        if isinstance(member, javalang.tree.TypeDeclaration):
+            keys.append(_type_key(member))
+        elif isinstance(member, javalang.tree.FieldDeclaration):
+            # Dependents inline constants, so the initializers of final
+            # fields are part of the signature.
+            if 'final' in modifiers or interface:
+                keys.append(_key(member))
+            else:
+                keys.append(_key(member, skip=('declarators',)) + tuple(
+                    (declarator.name, declarator.dimensions) for declarator in member.declarators))
+        elif isinstance(member, (javalang.tree.MethodDeclaration, javalang.tree.ConstructorDeclaration)):
+            keys.append(_key(member, skip=('body',)))
+        else:
+            keys.append(_key(member))
+    return tuple(sorted(keys, key=repr))
+
+def _type_key(type_declaration):
+    interface = isinstance(type_declaration, (javalang.tree.InterfaceDeclaration, javalang.tree.AnnotationDeclaration))
+    header = _key(type_declaration, skip=('body',))
+    body = type_declaration.body
+    if isinstance(type_declaration, javalang.tree.EnumDeclaration):
+        constants = tuple(sorted(constant.name for constant in body.constants or []))
+        return header + (constants, _member_keys(body.declarations, interface))
+    return header + (_member_keys(body, interface),)
+
+def api_signature(source):
+    """
+    Returns a key of everything in a Java source that other classes compile
+    against: declared types with their non-private members (signatures,
+    modifiers, annotations and initializers of final fields), but not method
+    bodies or private members. Returns None if javalang cannot parse it.
+    """
+    try:
+        tree = javalang.parse.parse(source)
+    except Exception as e:
+        # javalang also fails on some valid inputs (e.g. pre-Java 5 sources).
+        logging.debug(f"javalang could not parse the file: {e!r}")
+        return None
+    package = tree.package.name if tree.package else None
+    return package, tuple(sorted((_type_key(type_declaration) for type_declaration in tree.types), key=repr))
+
+def _buggy_signature(source):
+    key = hashlib.sha1(source.encode('utf-8', errors='replace')).hexdigest()
+    with _signatures_lock:
+        if key in _signatures:
+            return _signatures[key]
+    signature = api_signature(source)
+    with _signatures_lock:
+        _signatures[key] = signature
+    return signature
+
+def api_changed(buggy_source, patched_source):
+    """
+    True if classes depending on the file may need recompiling after the
+    patch, or if either version cannot be parsed to tell.
+    """
+    buggy_signature = _buggy_signature(buggy_source)
+    if buggy_signature is None:
+        return True
+    patched_signature = api_signature(patched_source)
+    return patched_signature is None or patched_signature != buggy_signature
@@ -0,0 +1,93 @@
+import os
+
+def resolve_dataset_path(multihunk, scope, dataset_path, baseline_dataset_path, baseline_block_dataset_path=None, baseline_class_dataset_path=None, baseline_file_dataset_path=None):
+    if multihunk:
+        if scope == 'block' and baseline_block_dataset_path:
+            return os.path.abspath(baseline_block_dataset_path)
+        elif scope == 'class' and baseline_class_dataset_path:
+            return os.path.abspath(baseline_class_dataset_path)
+        elif scope == 'file' and baseline_file_dataset_path:
+            return os.path.abspath(baseline_file_dataset_path)
+        else:
+            return os.path.abspath(baseline_dataset_path)
+    return os.path.abspath(dataset_path)
+
+class RepairConfig:
+    """
+    Settings of one repair run together with the result directories derived
+    from them. Drivers build it from their command-line arguments; library
+    callers (batch drivers, experiment matrices) build it directly, so several
+    configurations can live in one process.
+    """
+    def __init__(self, model, mode, dataset_path, work_dir="/tmp/work_dir", scope="method", api_host=None,
+                 results_path=None, processed_file="processed.json", method=None, checkout_dir=None,
+                 fixed_dir=None, fixed_json=None, max_iterations=3, hunk_concurrency=1, pristine_dir=None,
+                 clone_mode="reflink", worktree_store=None,
+                 incremental_compile=False, trigger_tests_first=False,
+                 warm_test_runner=False, tmpfs_dir=None, workers=1,
+                 test_baseline_dir=None, baseline_runs=3,
+                 test_impact_dir=None, impact_full_suite=False, async_patch_files=False,
+                 validation_cache=None, syntax_gate=False):
+        self.model = model
+        self.mode = mode
+        self.scope = scope
+        self.api_host = api_host
+        self.work_dir = work_dir
+        self.method = method.lower() if method else None
+        self.checkout_dir = checkout_dir
+        self.fixed_dir = fixed_dir
+        self.fixed_json = fixed_json
+        self.max_iterations = max_iterations
+        self.hunk_concurrency = max(1, hunk_concurrency)
+        # When set, checkouts are copied from a compiled checkout shared by
+        # every configuration instead of running `defects4j checkout` each time.
+        self.pristine_dir = pristine_dir
+        # How work trees are cloned from it: "reflink" or "hardlink".
+        self.clone_mode = clone_mode
+        # Directory of per-project git repositories that checkouts are
+        # materialized from as worktrees (see utils/worktree_store.py).
+        self.worktree_store = worktree_store
+        # Compile only the patched files with javac against the pristine
+        # checkout's classes (requires pristine_dir).
+        self.incremental_compile = incremental_compile
+        # Run the bug's triggering tests before (and instead of, if they
+        # fail) the full test suite.
+        self.trigger_tests_first = trigger_tests_first
+        # Run those triggering tests in a long-lived JUnit JVM (requires
+        # pristine_dir).
+        self.warm_test_runner = warm_test_runner
+        # RAM-backed directory for checkouts that fit, shared by `workers`
+        # validation workers (see utils/tmpfs_placement.py).
+        self.tmpfs_dir = tmpfs_dir
+        self.workers = max(1, workers)
+        # Per-bug baselines of the buggy version's test outcomes, measured
+        # over `baseline_runs` runs; test failures are judged against them
+        # (see utils/test_baseline.py).
+        self.test_baseline_dir = test_baseline_dir
+        self.baseline_runs = max(1, baseline_runs)
+        # Per-bug coverage indexes (see build_test_impact_index.py): the tests
+        # covering the patched lines run in the warm runner, and a pass is
+        # confirmed by the relevant tests, or the full suite if
+        # `impact_full_suite`.
+        self.test_impact_dir = test_impact_dir
+        self.impact_full_suite = impact_full_suite
+        # Write linux_patches/*.patch from a background thread.
+        self.async_patch_files = async_patch_files
+        # SQLite file caching compile and test outcomes per patched-file
+        # content (see utils/validation_cache.py).
+        self.validation_cache = validation_cache
+        # Parse patched files with javalang and report syntax errors as
+        # compile errors without running the build.
+        self.syntax_gate = syntax_gate
+
+        self.dataset_path = os.path.abspath(dataset_path)
+        self.processed_file = os.path.join(os.path.dirname(self.dataset_path), processed_file)
+
+        self.results_base_path = results_path if results_path else f"./results/mode_{mode}_model_{model}"
+        self.prompt_path = os.path.join(self.results_base_path, "suggestion_prompt")
+        self.generated_patches_path = os.path.join(self.results_base_path, "generated_patches")
+        self.linux_patches_path = os.path.join(self.results_base_path, "linux_patches")
+        self.test_results_path = os.path.join(self.results_base_path, "test_results")
+        self.compile_results_path = os.path.join(self.results_base_path, "compile_results")
+        self.compile_info_path = os.path.join(self.results_base_path, "compile_info")
+        self.trajectory_logs_path = os.path.join(self.results_base_path, "trajectory_logs")
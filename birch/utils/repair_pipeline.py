@@ -0,0 +1,112 @@
+import queue
+import logging
+import threading
+import traceback
+from .worker_pool import WorkDirPool
+
+_STOP = object()
+
+class RepairPipeline:
+    """
+    Two-stage pipeline that overlaps LLM latency with JVM work.
+
+    `generate_fn(job)` runs on `generate_workers` threads and returns the job
+    (or None to drop it). Generated jobs are handed to `validate_workers`
+    threads through a queue of at most `queue_size` entries, so generation
+    blocks once validation falls behind. `validate_fn(job, work_dir)` receives
+    a private work directory and returns True when the job needs another
+    generation round (feedback loops), which re-enqueues it for generation.
+    `done_fn(job)`, if given, runs once a job leaves the pipeline, whether it
+    finished, was dropped or failed in either stage.
+
+    At most `generate_workers + validate_workers + queue_size` jobs are in
+    flight at any time; new jobs are only admitted as earlier ones finish.
+    """
+    def __init__(self, generate_fn, validate_fn, work_dir, generate_workers=4, validate_workers=1, queue_size=None, done_fn=None):
+        self.generate_fn = generate_fn
+        self.validate_fn = validate_fn
+        self.done_fn = done_fn
+        self.generate_workers = max(1, generate_workers)
+        self.validate_workers = max(1, validate_workers)
+        self.queue_size = max(1, queue_size if queue_size else self.validate_workers)
+        self.max_in_flight = self.generate_workers + self.validate_workers + self.queue_size
+        self.work_dir_pool = WorkDirPool(work_dir, self.validate_workers)
+
+        # The generation queue can hold every in-flight job, so validators
+        # re-enqueueing a job for another round never block.
+        self._generate_queue = queue.Queue(maxsize=self.max_in_flight)
+        self._validate_queue = queue.Queue(maxsize=self.queue_size)
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+
+    def run(self, jobs):
+        generators = [threading.Thread(target=self._generate_worker, daemon=True) for _ in range(self.generate_workers)]
+        validators = [threading.Thread(target=self._validate_worker, daemon=True) for _ in range(self.validate_workers)]
+        for thread in generators + validators:
+            thread.start()
+
+        for job in jobs:
+            self._in_flight.acquire()
+            self._generate_queue.put(job)
+
+        # Wait for every admitted job to leave the pipeline.
+        for _ in range(self.max_in_flight):
+            self._in_flight.acquire()
+
+        for _ in generators:
+            self._generate_queue.put(_STOP)
+        for thread in generators:
+            thread.join()
+        for _ in validators:
+            self._validate_queue.put(_STOP)
+        for thread in validators:
+            thread.join()
+
+        for _ in range(self.max_in_flight):
+            self._in_flight.release()
+
+    def _generate_worker(self):
+        while True:
+            job = self._generate_queue.get()
+            if job is _STOP:
+                return
+            try:
+                generated = self.generate_fn(job)
+            except Exception as e:
+                self._report_error("generation", e)
+                generated = None
+
+            if generated is None:
+                self._finish(job)
+            else:
+                self._validate_queue.put(generated)
+
+    def _validate_worker(self):
+        while True:
+            job = self._validate_queue.get()
+            if job is _STOP:
+                return
+            try:
+                with self.work_dir_pool.acquire() as work_dir:
+                    again = self.validate_fn(job, work_dir)
+            except Exception as e:
+                self._report_error("validation", e)
+                again = False
+
+            if again:
+                self._generate_queue.put(job)
+            else:
+                self._finish(job)
+
+    def _finish(self, job):
+        try:
+            if self.done_fn is not None:
+                self.done_fn(job)
+        except Exception as e:
+            self._report_error("completion", e)
+        finally:
+            self._in_flight.release()
+
+    def _report_error(self, stage, e):
+        logging.error(f"Unhandled error in {stage} stage: {e}")
+        print(f"Unhandled error in {stage} stage: {e}")
+        traceback.print_exc()
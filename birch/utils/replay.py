@@ -0,0 +1,76 @@
+import os
+import json
+import glob
+import logging
+
+class RecordedOutputs:
+    """
+    LLM outputs recorded in the trajectory logs of an earlier run
+    (`<results_dir>/trajectory_logs/*_trajectory.json`). Replaying them
+    re-validates the same patches with the current patch application,
+    compilation and test setup without calling any model.
+    """
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self._hunks = {}
+        self._iterations = {}
+
+        logs_path = os.path.join(results_dir, "trajectory_logs")
+        log_files = sorted(glob.glob(os.path.join(logs_path, "*_trajectory.json")))
+        if not log_files:
+            raise FileNotFoundError(f"No trajectory logs to replay in {logs_path}")
+
+        for log_file in log_files:
+            try:
+                with open(log_file, 'r', encoding='utf-8') as f:
+                    trajectory_log = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping unreadable trajectory log {log_file}: {e}")
+                continue
+
+            bug = trajectory_log.get("bug_id") or os.path.basename(log_file)[:-len("_trajectory.json")]
+            if "iterations" in trajectory_log:
+                self._iterations[bug] = {
+                    iteration.get("iteration", index + 1): _index_hunks(iteration.get("hunks", []))
+                    for index, iteration in enumerate(trajectory_log["iterations"])
+                }
+                self._hunks[bug] = self._iterations[bug].get(1, {})
+            else:
+                self._hunks[bug] = _index_hunks(trajectory_log.get("hunks", []))
+
+    def bugs(self):
+        projects_bugs = []
+        for bug in self._hunks:
+            project, bug_id = bug.split('_')
+            projects_bugs.append((project, int(bug_id)))
+        return projects_bugs
+
+    def iteration_count(self, bug):
+        return len(self._iterations.get(bug, {})) or (1 if bug in self._hunks else 0)
+
+    def hunk_output(self, bug, bug_num, iteration=None):
+        """Returns (patches, llm_time, prompt) like get_fix_code; patches is None if nothing was recorded."""
+        hunks = self._iterations.get(bug, {}).get(iteration) if iteration else self._hunks.get(bug)
+        hunk_log = (hunks or {}).get(int(bug_num))
+        if hunk_log is None:
+            logging.warning(f"No recorded output for {bug} hunk {bug_num} (iteration {iteration})")
+            return None, 0, ""
+        output = hunk_log.get("output")
+        if output is None or output == "None":
+            # The feedback loop logs str(None) for failed LLM calls.
+            output = None
+        # latency_ms holds the invocation time divided by 1000.
+        return output, hunk_log.get("latency_ms", 0) * 1000.0, hunk_log.get("input", "")
+
+    def fix_code_fn(self):
+        """Drop-in for the drivers' fix_code(project, bug_id, bug_num, dataset)."""
+        return lambda project, bug_id, bug_num, dataset: self.hunk_output(f"{project}_{bug_id}", bug_num)
+
+def _index_hunks(hunk_logs):
+    return {int(hunk_log["hunk_index"]): hunk_log for hunk_log in hunk_logs if "hunk_index" in hunk_log}
+
+def replay_results_path(replay_dir, results_path=None):
+    """Replayed results never overwrite the recorded run: default to <replay_dir>_replay."""
+    if results_path:
+        return results_path
+    return os.path.normpath(replay_dir) + "_replay"
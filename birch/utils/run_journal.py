@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+class JsonLinesLog:
+    """
+    Append-only JSON-lines file. Every record is one line, so a crash can at
+    most lose or tear the last record; nothing already written is rewritten.
+
+    Lines are flushed immediately and fsync'ed in batches of `sync_every`
+    records or every `sync_interval` seconds, whichever comes first. Opening
+    an existing file replays it through `_apply`; a torn trailing line is
+    dropped and truncated away.
+    """
+    def __init__(self, path, sync_every=32, sync_interval=1.0):
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path):
+            self._replay()
+        else:
+            self._seed()
+
+        self._file = open(path, 'a', encoding='utf-8')
+        atexit.register(self.close)
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._apply(entry)
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.time() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+    def _apply(self, entry):
+        pass
+
+    def _seed(self):
+        pass
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def _replay(self):
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    logging.warning(f"Dropping torn last record of {self.path}")
+                    break
+                try:
+                    entry = json.loads(raw_line)
+                except (ValueError, UnicodeDecodeError):
+                    logging.warning(f"Skipping unreadable record in {self.path} at byte {valid_bytes}")
+                    valid_bytes += len(raw_line)
+                    continue
+                self._apply(entry)
+                valid_bytes += len(raw_line)
+
+        if valid_bytes < os.path.getsize(self.path):
+            # Cut the torn tail so the next append starts on a fresh line.
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+class RunJournal(JsonLinesLog):
+    """
+    Journal of a repair run: every state transition of a bug (and of its
+    hunks) is one record. Resuming replays it to find the finished bugs.
+    """
+    def __init__(self, path, sync_every=32, sync_interval=1.0, legacy_processed_file=None):
+        self._done = {}
+        self.legacy_processed_file = legacy_processed_file
+        super().__init__(path, sync_every, sync_interval)
+
+    @classmethod
+    def for_processed_file(cls, processed_file, reset=False, **kwargs):
+        """
+        Opens the journal that replaces `processed_file` (processed.json ->
+        processed.jsonl), importing the legacy file the first time.
+        """
+        journal_path = journal_path_for(processed_file)
+        if reset:
+            archived_path = reset_journal(journal_path)
+            if archived_path:
+                print(f"Previous run journal moved to {archived_path}")
+        return cls(journal_path, legacy_processed_file=processed_file, **kwargs)
+
+    def record(self, event, mode, bug, **fields):
+        entry = {"ts": round(time.time(), 3), "event": event, "mode": str(mode), "bug": bug}
+        entry.update(fields)
+        self.append(entry)
+
+    def mark_done(self, mode, bug, status=None, **fields):
+        self.record("bug_done", mode, bug, status=status, **fields)
+
+    def is_done(self, mode, bug):
+        with self._lock:
+            return bug in self._done.get(str(mode), {})
+
+    def done_bugs(self, mode):
+        with self._lock:
+            return dict(self._done.get(str(mode), {}))
+
+    def _apply(self, entry):
+        if entry.get("event") == "bug_done":
+            self._done.setdefault(entry["mode"], {})[entry["bug"]] = entry.get("status")
+
+    def _seed(self):
+        if self.legacy_processed_file and os.path.exists(self.legacy_processed_file):
+            self._seed_from_processed_json(self.legacy_processed_file)
+
+    def _seed_from_processed_json(self, processed_file):
+        try:
+            with open(processed_file, 'r') as f:
+                processed = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not import {processed_file}: {e}")
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for mode, bugs in processed.items():
+                for bug in bugs:
+                    entry = {"ts": round(time.time(), 3), "event": "bug_done", "mode": str(mode), "bug": bug, "status": None, "imported": True}
+                    f.write(json.dumps(entry) + "\n")
+                    self._apply(entry)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        logging.info(f"Imported {processed_file} into {self.path}")
+
+def journal_path_for(processed_file):
+    return os.path.splitext(processed_file)[0] + ".jsonl"
+
+def reset_journal(journal_path):
+    """
+    Moves a journal aside (processed.jsonl -> processed.<timestamp>.jsonl) and
+    leaves an empty one, so the next run starts from scratch without losing
+    the old record or re-importing a legacy processed.json.
+    """
+    archived_path = None
+    if os.path.exists(journal_path):
+        base, ext = os.path.splitext(journal_path)
+        archived_path = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        os.replace(journal_path, archived_path)
+    open(journal_path, 'a').close()
+    return archived_path
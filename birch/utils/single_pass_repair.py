@@ -0,0 +1,212 @@
+import os
+import time
+import logging
+from patch_validation import apply_patches
+from redwood.utils.tokens_counter import count_tokens
+from .d4j_infra import write_result_csv, checkout_repo, run_test, trigger_test_ids, compile_repo, pristine_checkout_path, ensure_test_baseline, save_test_results, save_compile_results, clear_work_dir, save_trajectory_log, load_dataset_cached
+from .async_generation import generate_hunks_concurrently
+from .completion_store import reuse_completions
+from .tmpfs_placement import get_tmpfs_placement
+from .test_baseline import classify_failures, only_modified_classes_patched
+from .test_impact import get_test_impact_index
+from .syntax_gate import reject_unparsable
+from .validation_cache import get_validation_cache, patch_set_hash, is_noop, unchanged_test_result, compile_variant, test_variant, cached_compile, cached_test
+
+def generate_bug_patches(project, bug_id, config, fix_code_fn, journal=None, completions=None, dataset=None):
+    """
+    Generation stage of a single-pass repair: queries the LLM for every hunk
+    of the bug through `fix_code_fn(project, bug_id, bug_num, dataset)`, which
+    returns (patches, llm_time, prompt), and returns the job to validate.
+    """
+    trajectory_log = {
+        "bug_id": f"{project}_{bug_id}",
+        "resolution_status": None,
+        "duration_seconds": 0,
+        "hunks": []
+    }
+
+    start_time = time.time()
+
+    if dataset is None:
+        dataset = load_dataset_cached(config.dataset_path)
+
+    current_bug = f"{project}_{bug_id}"
+    bug_count = dataset[current_bug]["bug_count"]
+
+    llm_error = False
+    hunk_patches = []
+
+    generated = generate_hunks_concurrently(
+        reuse_completions(completions, lambda bug_num: fix_code_fn(project, bug_id, bug_num, dataset), current_bug, config.mode, config.model, config.scope, config.method),
+        range(bug_count - 1, -1, -1),
+        config.hunk_concurrency
+    )
+
+    total_llm_time = 0
+    for bug_num in range(bug_count - 1, -1, -1):
+        patches, llm_invocation_time, prompt = generated[bug_num]
+        total_llm_time += llm_invocation_time
+        if patches is None:
+            llm_error = True
+            if journal:
+                journal.record("hunk_failed", config.mode, current_bug, hunk=bug_num)
+            continue
+        output = "\n".join(patches) if isinstance(patches, list) else str(patches)
+        hunk_log = {
+                "hunk_index": bug_num,
+                "input": prompt,
+                "output": output,
+                "latency_ms": llm_invocation_time / 1000.0,
+                "input_tokens": count_tokens(prompt),
+                "output_tokens": count_tokens(output)
+            }
+        trajectory_log["hunks"].append(hunk_log)
+        hunk_patches.append((bug_num, patches))
+        if journal:
+            journal.record("hunk_generated", config.mode, current_bug, hunk=bug_num, llm_time=llm_invocation_time)
+
+    return {
+        "project": project,
+        "bug_id": bug_id,
+        "bug_info": dataset[current_bug],
+        "hunk_patches": hunk_patches,
+        "llm_error": llm_error,
+        "total_llm_time": total_llm_time,
+        "trajectory_log": trajectory_log,
+        "start_time": start_time
+    }
+
+def validate_bug_patches(job, config, journal=None, work_dir=None):
+    """
+    Validation stage: checks the bug out into `work_dir`, applies the
+    generated hunks, compiles, runs the tests and records the results.
+    """
+    if work_dir is None:
+        work_dir = config.work_dir
+    project = job["project"]
+    bug_id = job["bug_id"]
+    bug_info = job["bug_info"]
+    llm_error = job["llm_error"]
+    total_llm_time = job["total_llm_time"]
+    trajectory_log = job["trajectory_log"]
+    start_time = job["start_time"]
+    current_bug = f"{project}_{bug_id}"
+    trajectory_log_path = os.path.join(config.trajectory_logs_path, f"{current_bug}_trajectory.json")
+
+    placement = get_tmpfs_placement(config.tmpfs_dir, config.workers, config.work_dir) if config.tmpfs_dir else None
+    if placement:
+        work_dir = placement.work_dir_for(project, work_dir)
+
+    clear_work_dir(work_dir)
+
+    if not checkout_repo(project, bug_id, work_dir, config.pristine_dir, config.clone_mode, config.worktree_store):
+        return
+
+    baseline = None
+    if config.test_baseline_dir:
+        baseline = ensure_test_baseline(config.test_baseline_dir, project, bug_id, os.path.join(work_dir, f'{project}_{bug_id}'), config.baseline_runs)
+
+    encodings = ['utf-8', 'ISO-8859-1', 'latin-1', 'cp1252']
+
+    patched_contents = apply_patches(bug_info, os.path.join(work_dir, f'{project}_{bug_id}'), job["hunk_patches"], encodings, current_bug, config.linux_patches_path, config.mode, config.async_patch_files)
+
+    validation_cache = get_validation_cache(config.validation_cache) if config.validation_cache else None
+    content_hash = patch_set_hash(patched_contents) if validation_cache else None
+    # The buggy version's outcome is known; only bugs with triggering tests
+    # to report are short-circuited.
+    unchanged = bool(trigger_test_ids(bug_info)) and is_noop(patched_contents)
+    trajectory_log["unchanged"] = unchanged
+    if unchanged:
+        logging.info(f"Patches of {project}-{bug_id} leave the buggy code unchanged; recording its outcome without compiling or testing")
+
+    patched_files = [bug_info["buggy_code"][str(bug_num)]["file"] for bug_num, _ in job["hunk_patches"]]
+    pristine_repo_dir = pristine_checkout_path(project, bug_id, config.pristine_dir) if config.incremental_compile else None
+
+    def compile_fn():
+        rejected = reject_unparsable(os.path.join(work_dir, f'{project}_{bug_id}'), patched_contents) if config.syntax_gate else None
+        return rejected or compile_repo(os.path.join(work_dir, f'{project}_{bug_id}'), patched_files, pristine_repo_dir)
+
+    if unchanged:
+        compile_returncode, compile_errormsg, compile_seconds, compile_cached = 0, '', 0.0, False
+    else:
+        compile_returncode, compile_errormsg, compile_seconds, compile_cached = cached_compile(
+            validation_cache, current_bug, content_hash,
+            compile_variant(pristine_repo_dir is not None, config.syntax_gate, config.pristine_dir), compile_fn)
+    trajectory_log["compile_cached"] = compile_cached
+    compile_time = compile_seconds if compile_returncode == 0 else 0
+
+    if journal:
+        journal.record("compiled", config.mode, current_bug, returncode=compile_returncode, compile_time=compile_time)
+
+    if compile_returncode != 0:
+        if placement:
+            placement.record_footprint(project, os.path.join(work_dir, f'{project}_{bug_id}'))
+        write_result_csv(project, bug_id, compile_returncode, -1, [], config.mode, config.results_base_path, total_llm_time, compile_time, 0)
+        save_compile_results(project, bug_id, compile_errormsg, config.compile_results_path)
+        logging.error(f"Compilation failed for {project}-{bug_id}:\n{compile_errormsg}")
+        print(f"Compilation failed for {project}-{bug_id}:\n{compile_errormsg}")
+        end_time = time.time()
+        total_duration = end_time - start_time
+        trajectory_log["duration_seconds"] = total_duration
+        if llm_error:
+            trajectory_log["resolution_status"] = "llm_failure"
+        else:
+            trajectory_log["resolution_status"] = "compile_failure"
+        save_trajectory_log(trajectory_log, trajectory_log_path)
+        if journal:
+            journal.mark_done(config.mode, current_bug, status=trajectory_log["resolution_status"])
+        return
+
+    trigger_tests = trigger_test_ids(bug_info) if config.trigger_tests_first else None
+    impacted_tests = None
+    if config.test_impact_dir:
+        hunks = [(bug_info["buggy_code"][str(bug_num)]["file"], bug_info["buggy_code"][str(bug_num)]["start_line"], bug_info["buggy_code"][str(bug_num)]["end_line"]) for bug_num, _ in job["hunk_patches"]]
+        impacted_tests = get_test_impact_index(config.test_impact_dir).covering_tests(project, bug_id, hunks)
+    warm_runner_dir = pristine_checkout_path(project, bug_id, config.pristine_dir) if config.warm_test_runner else None
+    relevant_only = only_modified_classes_patched(baseline, patched_files)
+    full_suite = impacted_tests is None or config.impact_full_suite
+    if unchanged:
+        test_returncode, failed_tests, stdout, stderr = unchanged_test_result(trigger_test_ids(bug_info))
+        test_time, test_cached = 0.0, False
+    else:
+        test_returncode, failed_tests, stdout, stderr, test_time, test_cached = cached_test(
+            validation_cache, current_bug, content_hash, test_variant((trigger_tests or []) + (impacted_tests or []), relevant_only, full_suite),
+            lambda: run_test(os.path.join(work_dir, f'{project}_{bug_id}'), trigger_tests, warm_runner_dir, relevant_only, full_suite, impacted_tests),
+            compile_fn if compile_cached else None)
+    trajectory_log["test_cached"] = test_cached
+    failed_tests, flaky_tests, preexisting_tests = classify_failures(failed_tests, baseline, trigger_test_ids(bug_info))
+    if flaky_tests or preexisting_tests:
+        logging.info(f"Ignoring baseline failures for {project}-{bug_id}: flaky {flaky_tests}, preexisting {preexisting_tests}")
+    if placement:
+        placement.record_footprint(project, os.path.join(work_dir, f'{project}_{bug_id}'))
+
+    test_pass = test_returncode == 0 and len(failed_tests) == 0
+
+    write_result_csv(project, bug_id, compile_returncode, test_pass, failed_tests, config.mode, config.results_base_path, total_llm_time, compile_time, test_time)
+    save_test_results(project, bug_id, stdout, stderr, config.test_results_path)
+
+    if not test_pass:
+        logging.error(f"Test failures for {project}-{bug_id}:\nFailed tests: {failed_tests}")
+        print(f"Test failures for {project}-{bug_id}:\nFailed tests: {failed_tests}")
+
+    end_time = time.time()
+    total_duration = end_time - start_time
+    trajectory_log["time_compilation_iteration"] = compile_time
+    trajectory_log["time_test_iteration"] = test_time
+    trajectory_log["duration_seconds"] = total_duration
+
+    if llm_error:
+        trajectory_log["resolution_status"] = "llm_failure"
+    else:
+        if test_pass:
+            trajectory_log["resolution_status"] = "pass"
+        else:
+            trajectory_log["resolution_status"] = "test_failure"
+
+    save_trajectory_log(trajectory_log, trajectory_log_path)
+    if journal:
+        journal.mark_done(config.mode, current_bug, status=trajectory_log["resolution_status"])
+
+def process_bug(project, bug_id, config, fix_code_fn, journal=None, completions=None, work_dir=None):
+    job = generate_bug_patches(project, bug_id, config, fix_code_fn, journal, completions)
+    validate_bug_patches(job, config, journal, work_dir)
@@ -0,0 +1,78 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+import javalang
+
+# Whether the buggy version of a file parses, by (file, hash of its text).
+_buggy_parses = {}
+_buggy_parses_lock = threading.Lock()
+
+def syntax_error(source):
+    """
+    Returns (line, column, message) of the first syntax error javalang finds
+    in `source`, or None if it parses. Line and column may be None.
+    """
+    try:
+        javalang.parse.parse(source)
+    except javalang.tokenizer.LexerError as e:
+        match = re.search(r', line (\d+):', str(e))
+        return (int(match.group(1)) if match else None), None, f"syntax error: {str(e).split(' at ')[0]}"
+    except javalang.parser.JavaSyntaxError as e:
+        position = getattr(e.at, 'position', None)
+        if position is None:
+            return source.count('\n') + 1, None, "reached end of file while parsing"
+        return position[0], position[1], f"syntax error: {e.description} at '{e.at.value}'"
+    return None
+
+def _parses(source):
+    try:
+        return syntax_error(source)
+    except (RecursionError, IndexError, TypeError, AttributeError, StopIteration) as e:
+        # javalang itself fails on some valid inputs; leave those to javac.
+        logging.debug(f"javalang could not parse the file: {e!r}")
+        return False
+
+def reject_unparsable(repo_dir_path, patched_files):
+    """
+    Parses every patched file (`{file: (buggy text, patched text)}` from
+    apply_patches) with javalang before compilation. If one does not parse
+    while its buggy version does, returns (1, errors) with the errors in the
+    format of compile_repo (`[javac] path:line: error: message`, the source
+    line and a caret), so parse_compiler_errors and the feedback prompts read
+    them like javac's. Returns None if every file parses, or if javalang
+    cannot parse the buggy version either (e.g. pre-Java 5 sources using
+    `enum` as an identifier).
+    """
+    error_lines = []
+    for relative_path, (buggy_text, patched_text) in sorted(patched_files.items()):
+        error = _parses(patched_text)
+        if not error:
+            continue
+        key = (relative_path, hashlib.sha1(buggy_text.encode('utf-8', errors='replace')).hexdigest())
+        with _buggy_parses_lock:
+            buggy_parses = _buggy_parses.get(key)
+        if buggy_parses is None:
+            buggy_parses = _parses(buggy_text) is None
+            with _buggy_parses_lock:
+                _buggy_parses[key] = buggy_parses
+        if not buggy_parses:
+            continue
+
+        line, column, message = error
+        file_path = os.path.join(repo_dir_path, relative_path)
+        error_lines.append(f"    [javac] {file_path}:{line}: error: {message}")
+        source_lines = patched_text.split('\n')
+        if line and line <= len(source_lines):
+            error_lines.append(f"    [javac] {source_lines[line - 1]}")
+            if column:
+                error_lines.append(f"    [javac] {' ' * (column - 1)}^")
+
+    if not error_lines:
+        return None
+    error_count = sum(1 for line in error_lines if ': error: ' in line)
+    error_lines.append(f"    [javac] {error_count} error{'s' if error_count > 1 else ''}")
+    compile_error_msg = '\n'.join(error_lines)
+    logging.error(f"Patched files of {repo_dir_path} do not parse; skipping compilation:\n{compile_error_msg}")
+    return 1, compile_error_msg
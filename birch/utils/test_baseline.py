@@ -0,0 +1,119 @@
+import os
+import json
+import logging
+import threading
+
+class TestBaselineStore:
+    """
+    Per-bug record of how the buggy version's test suite behaves, kept as
+    `<baseline_dir>/<project>_<bug_id>.json`. It is measured once per bug by
+    running `defects4j test` `runs` times on an unpatched checkout, and holds
+    the tests failing in every run, the tests failing in some runs only
+    (flaky), the suite's wall-clock time per run and the classes the fix
+    modifies. Every model, mode and iteration then judges its test results
+    against it instead of against an empty failure list.
+    """
+    def __init__(self, baseline_dir, runs=3):
+        self.baseline_dir = os.path.abspath(os.path.expanduser(baseline_dir))
+        self.runs = max(1, runs)
+        os.makedirs(self.baseline_dir, exist_ok=True)
+        self._cache = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def lock(self, project, bug_id):
+        with self._locks_lock:
+            return self._locks.setdefault(f"{project}_{bug_id}", threading.Lock())
+
+    def path(self, project, bug_id):
+        return os.path.join(self.baseline_dir, f"{project}_{bug_id}.json")
+
+    def get(self, project, bug_id):
+        key = f"{project}_{bug_id}"
+        if key not in self._cache:
+            try:
+                with open(self.path(project, bug_id), 'r') as f:
+                    self._cache[key] = json.load(f)
+            except FileNotFoundError:
+                return None
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable test baseline of {key}: {e}")
+                return None
+        return self._cache[key]
+
+    def put(self, project, bug_id, run_failures, run_seconds, src_dir, modified_classes):
+        """Stores the failing tests of each baseline run and returns the baseline."""
+        failing_sets = [set(failures) for failures in run_failures]
+        always_failing = set.intersection(*failing_sets) if failing_sets else set()
+        sometimes_failing = set.union(*failing_sets) if failing_sets else set()
+        baseline = {
+            "runs": len(failing_sets),
+            "failing": sorted(always_failing),
+            "flaky": sorted(sometimes_failing - always_failing),
+            "suite_seconds": [round(seconds, 3) for seconds in run_seconds],
+            "src_dir": src_dir,
+            "modified_classes": sorted(modified_classes),
+        }
+        path = self.path(project, bug_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        os.replace(tmp_path, path)
+        self._cache[f"{project}_{bug_id}"] = baseline
+        return baseline
+
+def classify_failures(failed_tests, baseline, trigger_tests=()):
+    """
+    Splits the failing tests of a patched version into (failures, flaky,
+    preexisting). Triggering tests always count as failures. Other tests count
+    unless the baseline saw them fail intermittently (flaky) or in every run
+    (preexisting, e.g. environment-dependent tests); only `failures` decide
+    whether the patch passes.
+    """
+    if not baseline:
+        return list(failed_tests), [], []
+    trigger_tests = set(trigger_tests)
+    flaky_tests = set(baseline.get("flaky", []))
+    failing_tests = set(baseline.get("failing", []))
+    failures, flaky, preexisting = [], [], []
+    for test in failed_tests:
+        if test in trigger_tests:
+            failures.append(test)
+        elif test in flaky_tests:
+            flaky.append(test)
+        elif test in failing_tests:
+            preexisting.append(test)
+        else:
+            failures.append(test)
+    return failures, flaky, preexisting
+
+def patched_classes(patched_files, src_dir):
+    """Maps patched source files to class names; None if one lies outside `src_dir`."""
+    prefix = src_dir.rstrip('/') + '/'
+    classes = []
+    for patched_file in patched_files:
+        if not patched_file.startswith(prefix) or not patched_file.endswith('.java'):
+            return None
+        classes.append(patched_file[len(prefix):-len('.java')].replace('/', '.'))
+    return classes
+
+def only_modified_classes_patched(baseline, patched_files):
+    """
+    True if every patched file is a class the developer fix modifies, so the
+    tests Defects4J deems relevant to the bug (`defects4j test -r`, the tests
+    loading one of those classes) are the only ones the patch can affect.
+    """
+    if not baseline or not baseline.get("src_dir") or not baseline.get("modified_classes"):
+        return False
+    classes = patched_classes(patched_files, baseline["src_dir"])
+    return bool(classes) and set(classes) <= set(baseline["modified_classes"])
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_test_baselines(baseline_dir, runs=3):
+    baseline_dir = os.path.abspath(os.path.expanduser(baseline_dir))
+    with _stores_lock:
+        if baseline_dir not in _stores:
+            _stores[baseline_dir] = TestBaselineStore(baseline_dir, runs)
+        return _stores[baseline_dir]
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import logging
+import threading
+import subprocess
+import xml.etree.ElementTree as ET
+
+# Test methods as listed in the `all_tests` file `defects4j test` writes.
+_ALL_TESTS_LINE = re.compile(r'^\s*([^\s(]+)\(([^\s)]+)\)\s*$')
+
+class TestImpactIndex:
+    """
+    Per-bug map from the source lines of the buggy version to the test
+    methods covering them, kept as `<index_dir>/<project>_<bug_id>.json` and
+    filled offline by build_test_impact_index.py. Only the classes the
+    developer fix modifies are instrumented, which are the files the dataset's
+    hunks patch. Coverage is stored per source file (relative to its source
+    root) as `[test index, [[first line, last line], ...]]` entries.
+    """
+    def __init__(self, index_dir):
+        self.index_dir = os.path.abspath(os.path.expanduser(index_dir))
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._cache = {}
+
+    def path(self, project, bug_id):
+        return os.path.join(self.index_dir, f"{project}_{bug_id}.json")
+
+    def get(self, project, bug_id):
+        key = f"{project}_{bug_id}"
+        if key not in self._cache:
+            try:
+                with open(self.path(project, bug_id), 'r') as f:
+                    self._cache[key] = json.load(f)
+            except FileNotFoundError:
+                return None
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable test impact index of {key}: {e}")
+                return None
+        return self._cache[key]
+
+    def put(self, project, bug_id, test_coverage):
+        """Stores `{test: {source file: [[first, last], ...]}}` for a bug."""
+        tests = sorted(test_coverage)
+        files = {}
+        for test_idx, test in enumerate(tests):
+            for source_file, ranges in test_coverage[test].items():
+                files.setdefault(source_file, []).append([test_idx, ranges])
+        index = {"tests": tests, "files": files}
+        path = self.path(project, bug_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        self._cache[f"{project}_{bug_id}"] = index
+
+    def covering_tests(self, project, bug_id, hunks):
+        """
+        Returns the tests covering any line of `hunks` ((patched file, first
+        line, last line) in the buggy version), or None if the bug is not
+        indexed or a hunk touches no covered line, since then coverage cannot
+        tell which tests the patch affects.
+        """
+        index = self.get(project, bug_id)
+        if index is None:
+            return None
+        selected = set()
+        for patched_file, first_line, last_line in hunks:
+            entries = _entries_for(index["files"], patched_file)
+            # One line of context on each side, so that inserted lines
+            # count as touching the statements around them.
+            first_line, last_line = first_line - 1, last_line + 1
+            hunk_tests = {
+                test_idx for test_idx, ranges in entries
+                if any(start <= last_line and first_line <= end for start, end in ranges)
+            }
+            if not hunk_tests:
+                return None
+            selected |= hunk_tests
+        return [index["tests"][test_idx] for test_idx in sorted(selected)]
+
+def _entries_for(files, patched_file):
+    # The index names files relative to the source root (org/x/Foo.java); the
+    # dataset relative to the checkout (src/main/java/org/x/Foo.java).
+    for source_file, entries in files.items():
+        if patched_file == source_file or patched_file.endswith('/' + source_file):
+            return entries
+    return []
+
+def _to_ranges(lines):
+    ranges = []
+    for line in sorted(lines):
+        if ranges and line == ranges[-1][1] + 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return ranges
+
+def read_all_tests(repo_dir_path):
+    """Returns the test methods of the last `defects4j test` run as Class::method."""
+    tests = []
+    try:
+        with open(os.path.join(repo_dir_path, 'all_tests'), 'r') as f:
+            for line in f:
+                match = _ALL_TESTS_LINE.match(line)
+                if match:
+                    tests.append(f"{match.group(2)}::{match.group(1)}")
+    except OSError as e:
+        logging.warning(f"Could not read the tests run in {repo_dir_path}: {e}")
+    return list(dict.fromkeys(tests))
+
+def read_covered_lines(coverage_xml_path):
+    """Returns `{source file: [[first, last], ...]}` of the lines a Cobertura report marks as hit."""
+    covered = {}
+    for class_element in ET.parse(coverage_xml_path).getroot().iter('class'):
+        lines = covered.setdefault(class_element.get('filename'), set())
+        for line_element in class_element.iter('line'):
+            if int(line_element.get('hits', '0')) > 0:
+                lines.add(int(line_element.get('number')))
+    return {source_file: _to_ranges(lines) for source_file, lines in covered.items() if lines}
+
+def measure_test_coverage(repo_dir_path, test, instrument_classes_path):
+    """Runs one test under `defects4j coverage` and returns its covered lines, or None."""
+    coverage_proc = subprocess.run(
+        ['defects4j', 'coverage', '-t', test, '-i', instrument_classes_path],
+        capture_output=True, text=True, errors='replace', cwd=repo_dir_path)
+    coverage_xml_path = os.path.join(repo_dir_path, 'coverage.xml')
+    if coverage_proc.returncode != 0 or not os.path.exists(coverage_xml_path):
+        logging.warning(f"Coverage of {test} failed in {repo_dir_path}: {coverage_proc.stderr.strip()}")
+        return None
+    try:
+        return read_covered_lines(coverage_xml_path)
+    except (ET.ParseError, ValueError) as e:
+        logging.warning(f"Unreadable coverage report of {test} in {repo_dir_path}: {e}")
+        return None
+    finally:
+        os.remove(coverage_xml_path)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_test_impact_index(index_dir):
+    index_dir = os.path.abspath(os.path.expanduser(index_dir))
+    with _indexes_lock:
+        if index_dir not in _indexes:
+            _indexes[index_dir] = TestImpactIndex(index_dir)
+        return _indexes[index_dir]
@@ -0,0 +1,125 @@
+import os
+import atexit
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+SERVER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "java", "D4jTestServer.java")
+# Defects4J runs tests in this time zone; several Time and Lang tests depend on it.
+SERVER_ENV = {"TZ": "America/Los_Angeles"}
+
+class TestRunnerError(Exception):
+    pass
+
+_compile_lock = threading.Lock()
+
+def _server_classes_dir():
+    """Compiles D4jTestServer.java once per source version into the temp directory."""
+    with open(SERVER_SOURCE, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    classes_dir = os.path.join(tempfile.gettempdir(), f"birch_test_runner_{digest}")
+    with _compile_lock:
+        if os.path.exists(os.path.join(classes_dir, "D4jTestServer.class")):
+            return classes_dir
+        tmp_dir = tempfile.mkdtemp(prefix="birch_test_runner_")
+        javac_proc = subprocess.run(['javac', '-source', '1.8', '-target', '1.8', '-nowarn', '-d', tmp_dir, SERVER_SOURCE],
+                                    capture_output=True, text=True)
+        if javac_proc.returncode != 0:
+            subprocess.run(['rm', '-rf', tmp_dir])
+            raise TestRunnerError(f"Could not compile {SERVER_SOURCE}: {javac_proc.stderr}")
+        try:
+            os.rename(tmp_dir, classes_dir)
+        except OSError:
+            # Another process compiled it first.
+            subprocess.run(['rm', '-rf', tmp_dir])
+        return classes_dir
+
+class TestRunnerServer:
+    """
+    One warm JVM running JUnit for one work tree (see D4jTestServer.java).
+    The JVM's working directory is the work tree, so tests that read files
+    relative to it behave as under `defects4j test`; a re-created tree needs a
+    new server.
+    """
+    def __init__(self, repo_dir_path):
+        self.repo_dir_path = repo_dir_path
+        try:
+            self.repo_inode = os.stat(repo_dir_path).st_ino
+            self.process = subprocess.Popen(
+                ['java', '-cp', _server_classes_dir(), 'D4jTestServer'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding='utf-8', cwd=repo_dir_path, env=dict(os.environ, **SERVER_ENV)
+            )
+        except OSError as e:
+            raise TestRunnerError(f"Could not start the test runner: {e}")
+
+    def serves(self, repo_dir_path):
+        try:
+            return self.process.poll() is None and self.repo_dir_path == repo_dir_path and os.stat(repo_dir_path).st_ino == self.repo_inode
+        except OSError:
+            return False
+
+    def run(self, classpath, tests, timeout=600):
+        """Runs `tests` (Class or Class::method) and returns the failing ones as Class::method."""
+        timer = threading.Timer(timeout, self.process.kill)
+        timer.start()
+        try:
+            self.process.stdin.write(f"RUN\t{classpath}\t{','.join(tests)}\n")
+            self.process.stdin.flush()
+            failed_tests = []
+            for line in self.process.stdout:
+                kind, _, payload = line.rstrip('\n').partition('\t')
+                if kind == "FAIL":
+                    failed_tests.append(payload)
+                elif kind == "DONE":
+                    return failed_tests
+                elif kind == "ERROR":
+                    raise TestRunnerError(payload)
+            raise TestRunnerError(f"Test runner exited with {self.process.wait()}")
+        except (OSError, ValueError) as e:
+            raise TestRunnerError(str(e))
+        finally:
+            timer.cancel()
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write("QUIT\n")
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+def run_tests_warm(repo_dir_path, classpath, tests, timeout=600):
+    """
+    Runs `tests` in the warm server of the worker owning `repo_dir_path`
+    (its parent directory), starting or replacing the server as needed.
+    Raises TestRunnerError if the server fails; the server is then dropped.
+    """
+    worker_dir = os.path.dirname(os.path.abspath(repo_dir_path))
+    with _servers_lock:
+        server = _servers.get(worker_dir)
+        if server is None or not server.serves(repo_dir_path):
+            if server is not None:
+                server.close()
+            server = _servers[worker_dir] = TestRunnerServer(repo_dir_path)
+
+    try:
+        return server.run(classpath, tests, timeout)
+    except TestRunnerError:
+        with _servers_lock:
+            if _servers.get(worker_dir) is server:
+                del _servers[worker_dir]
+        server.close()
+        raise
+
+@atexit.register
+def close_test_runners():
+    with _servers_lock:
+        for server in _servers.values():
+            server.close()
+        _servers.clear()
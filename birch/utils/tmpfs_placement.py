@@ -0,0 +1,112 @@
+import os
+import json
+import atexit
+import logging
+import threading
+from .work_dir_manager import recycle_work_dir
+
+def _mem_available_bytes():
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def _tree_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+class TmpfsPlacement:
+    """
+    Puts the checkouts of a worker on a RAM-backed file system when they fit.
+    Every worker gets an equal share of min(tmpfs capacity, `memory_fraction`
+    of available memory). A project goes to tmpfs once its measured footprint
+    (checkout plus build output plus test files, with `headroom`) fits that
+    share and the tmpfs currently has room for it; projects never measured
+    yet, and those too large, stay on disk. Footprints are kept per project in
+    `footprint_path` across runs and reported at exit.
+    """
+    def __init__(self, tmpfs_root, workers, footprint_path, memory_fraction=0.5, headroom=1.25):
+        self.tmpfs_root = tmpfs_root
+        self.footprint_path = footprint_path
+        self.headroom = headroom
+        os.makedirs(tmpfs_root, exist_ok=True)
+
+        tmpfs_stat = os.statvfs(tmpfs_root)
+        capacity = tmpfs_stat.f_blocks * tmpfs_stat.f_frsize
+        self.budget_per_worker = min(capacity, _mem_available_bytes() * memory_fraction) / max(1, workers)
+        logging.info(f"tmpfs work dirs under {tmpfs_root}: {self.budget_per_worker / 2**20:.0f} MiB per worker")
+
+        self.footprints = {}
+        if os.path.exists(footprint_path):
+            try:
+                with open(footprint_path, 'r') as f:
+                    self.footprints = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable footprint file {footprint_path}: {e}")
+        self.placements = {"tmpfs": 0, "disk": 0}
+        self._lock = threading.Lock()
+
+    def tmpfs_dir_for(self, work_dir):
+        return os.path.join(self.tmpfs_root, os.path.abspath(work_dir).strip(os.sep).replace(os.sep, '_'))
+
+    def fits(self, project):
+        footprint = self.footprints.get(project)
+        if footprint is None:
+            return False
+        needed = footprint * self.headroom
+        tmpfs_stat = os.statvfs(self.tmpfs_root)
+        return needed <= self.budget_per_worker and needed <= tmpfs_stat.f_bavail * tmpfs_stat.f_frsize
+
+    def work_dir_for(self, project, work_dir):
+        """
+        Returns the directory the worker owning `work_dir` should use for the
+        next checkout of `project`, and empties the location it does not use.
+        """
+        tmpfs_dir = self.tmpfs_dir_for(work_dir)
+        with self._lock:
+            use_tmpfs = self.fits(project)
+            self.placements["tmpfs" if use_tmpfs else "disk"] += 1
+        recycle_work_dir(work_dir if use_tmpfs else tmpfs_dir)
+        return tmpfs_dir if use_tmpfs else work_dir
+
+    def record_footprint(self, project, repo_dir):
+        footprint = _tree_size(repo_dir)
+        with self._lock:
+            if footprint <= self.footprints.get(project, 0):
+                return
+            self.footprints[project] = footprint
+            logging.info(f"Work dir footprint of {project}: {footprint / 2**20:.1f} MiB")
+            tmp_path = f"{self.footprint_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.footprints, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.footprint_path)
+
+    def report(self):
+        lines = [f"Work dir placements: {self.placements['tmpfs']} on tmpfs, {self.placements['disk']} on disk "
+                 f"(budget {self.budget_per_worker / 2**20:.0f} MiB per worker)"]
+        for project, footprint in sorted(self.footprints.items(), key=lambda item: -item[1]):
+            where = "tmpfs" if footprint * self.headroom <= self.budget_per_worker else "disk"
+            lines.append(f"  {project:<16} {footprint / 2**20:8.1f} MiB  {where}")
+        return "\n".join(lines)
+
+_placements = {}
+_placements_lock = threading.Lock()
+
+def get_tmpfs_placement(tmpfs_root, workers, work_dir):
+    """One placement per tmpfs root; footprints are stored next to the disk work dir."""
+    with _placements_lock:
+        if tmpfs_root not in _placements:
+            placement = TmpfsPlacement(tmpfs_root, workers, os.path.abspath(work_dir) + "_footprints.json")
+            _placements[tmpfs_root] = placement
+            atexit.register(lambda: print(placement.report()))
+        return _placements[tmpfs_root]
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compile_results (
+    bug TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    returncode INTEGER NOT NULL,
+    errors TEXT,
+    compile_time REAL,
+    PRIMARY KEY (bug, content_hash, variant)
+);
+CREATE TABLE IF NOT EXISTS test_results (
+    bug TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    returncode INTEGER NOT NULL,
+    failed_tests TEXT,
+    stdout TEXT,
+    stderr TEXT,
+    test_time REAL,
+    PRIMARY KEY (bug, content_hash, variant)
+);
+"""
+
+def _normalize(text):
+    # Line endings and trailing whitespace do not change what javac sees.
+    return '\n'.join(line.rstrip() for line in text.replace('\r\n', '\n').split('\n'))
+
+def patch_set_hash(patched_files):
+    """
+    Content hash of a patched checkout: the normalized text of every patched
+    file (`{file: (buggy text, patched text)}` from apply_patches). Patch sets
+    producing the same files hash alike, whatever model, mode or iteration
+    generated them.
+    """
+    digest = hashlib.sha256()
+    for relative_path in sorted(patched_files):
+        digest.update(relative_path.encode('utf-8') + b'\0')
+        digest.update(_normalize(patched_files[relative_path][1]).encode('utf-8', errors='replace') + b'\0')
+    return digest.hexdigest()
+
+def is_noop(patched_files):
+    """True if the patches leave every file as the buggy version has it."""
+    return all(_normalize(buggy) == _normalize(patched) for buggy, patched in patched_files.values())
+
+def unchanged_test_result(trigger_tests):
+    """
+    run_test's result for patches that leave the buggy version as it is:
+    the version compiles and its triggering tests fail.
+    """
+    stdout = f"Failing tests: {len(trigger_tests)}\n" + ''.join(f"  - {test}\n" for test in trigger_tests)
+    return 0, list(trigger_tests), stdout, ''
+
+def compile_variant(incremental=False, syntax_gate=False, pristine=False):
+    """Key of the compile harness: incremental javac, the syntax gate, a pristine clone."""
+    return json.dumps([bool(incremental), bool(syntax_gate), bool(pristine)])
+
+def test_variant(trigger_tests=None, relevant_only=False, full_suite=True):
+    """Key of the run_test arguments that change which failures are reported."""
+    return json.dumps([trigger_tests or [], bool(relevant_only), bool(full_suite)])
+
+class ValidationCache:
+    """
+    SQLite cache of validation outcomes keyed by bug and patch_set_hash:
+    per compile variant the return code, filtered compiler errors and time,
+    and per test variant the failing tests, test output and time. A patch set whose
+    files were validated before (a retry at temperature 0, a repeated
+    feedback iteration, another mode) reuses the outcome
+    instead of compiling and testing again. Only results Defects4J produced
+    are stored; errors of the harness itself (return code -1) are not.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Several runs may share the cache; wait for each other's writes.
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(compile_results)")]
+        if columns and 'variant' not in columns:
+            # Compile results of caches from before compile variants do not
+            # say which harness produced them.
+            with self._conn:
+                self._conn.execute("DROP TABLE compile_results")
+        self._conn.executescript(SCHEMA)
+
+    def get_compile(self, bug, content_hash, variant):
+        """Returns (returncode, errors, compile_time) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT returncode, errors, compile_time FROM compile_results WHERE bug = ? AND content_hash = ? AND variant = ?",
+                (bug, content_hash, variant)).fetchone()
+        return tuple(row) if row else None
+
+    def put_compile(self, bug, content_hash, variant, returncode, errors, compile_time):
+        if returncode == -1:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO compile_results VALUES (?, ?, ?, ?, ?, ?)",
+                (bug, content_hash, variant, returncode, errors, compile_time))
+
+    def get_test(self, bug, content_hash, variant):
+        """Returns (returncode, failed_tests, stdout, stderr, test_time) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT returncode, failed_tests, stdout, stderr, test_time FROM test_results WHERE bug = ? AND content_hash = ? AND variant = ?",
+                (bug, content_hash, variant)).fetchone()
+        if not row:
+            return None
+        returncode, failed_tests, stdout, stderr, test_time = row
+        return returncode, json.loads(failed_tests), stdout, stderr, test_time
+
+    def put_test(self, bug, content_hash, variant, returncode, failed_tests, stdout, stderr, test_time):
+        if returncode != 0:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO test_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (bug, content_hash, variant, returncode, json.dumps(failed_tests), stdout, stderr, test_time))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def cached_compile(cache, bug, content_hash, variant, compile_fn):
+    """
+    Returns (returncode, errors, seconds, hit) of `compile_fn()`, or the
+    cached returncode and errors with hit True; the checkout is then not
+    compiled and seconds is 0, the time actually spent.
+    """
+    if cache is not None:
+        cached = cache.get_compile(bug, content_hash, variant)
+        if cached is not None:
+            logging.info(f"Validation cache hit for {bug}: reusing compile result {cached[0]}")
+            return cached[0], cached[1], 0.0, True
+    start_time = time.time()
+    returncode, errors = compile_fn()
+    seconds = time.time() - start_time
+    if cache is not None:
+        cache.put_compile(bug, content_hash, variant, returncode, errors, seconds)
+    return returncode, errors, seconds, False
+
+def cached_test(cache, bug, content_hash, variant, test_fn, compile_fn=None):
+    """
+    Returns (returncode, failed_tests, stdout, stderr, seconds, hit) of
+    `test_fn()`, or the cached ones with seconds 0 and hit True. Pass
+    `compile_fn` if the compile result was a cache hit: on a miss the
+    checkout is compiled before testing.
+    """
+    if cache is not None:
+        cached = cache.get_test(bug, content_hash, variant)
+        if cached is not None:
+            logging.info(f"Validation cache hit for {bug}: reusing {len(cached[1])} failing tests")
+            return (*cached[:4], 0.0, True)
+    if compile_fn is not None:
+        compile_fn()
+    start_time = time.time()
+    returncode, failed_tests, stdout, stderr = test_fn()
+    seconds = time.time() - start_time
+    if cache is not None:
+        cache.put_test(bug, content_hash, variant, returncode, failed_tests, stdout, stderr, seconds)
+    return returncode, failed_tests, stdout, stderr, seconds, False
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_validation_cache(db_path):
+    db_path = os.path.abspath(os.path.expanduser(db_path))
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = ValidationCache(db_path)
+        return _caches[db_path]
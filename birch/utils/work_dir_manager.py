@@ -0,0 +1,87 @@
+import os
+import uuid
+import queue
+import shutil
+import logging
+import threading
+
+TRASH_DIR_NAME = ".work_dir_trash"
+
+class WorkDirTrash:
+    """
+    Takes old checkouts off the critical path: `discard` renames a tree into
+    a trash directory on the same file system (a single atomic rename) and a
+    background thread deletes it. At most `max_pending` trees wait for
+    deletion; beyond that `discard` blocks until the deleter catches up, so a
+    slow disk cannot fill up with trash. Trees left behind by an earlier run
+    are deleted on startup.
+    """
+    def __init__(self, trash_dir, max_pending=8):
+        self.trash_dir = trash_dir
+        os.makedirs(trash_dir, exist_ok=True)
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._leftovers = [os.path.join(trash_dir, name) for name in os.listdir(trash_dir)]
+        self._thread = threading.Thread(target=self._delete_loop, name="work-dir-trash", daemon=True)
+        self._thread.start()
+
+    def discard(self, path):
+        if not os.path.lexists(path):
+            return
+        trashed_path = os.path.join(self.trash_dir, f"{os.path.basename(path)}.{uuid.uuid4().hex}")
+        try:
+            os.rename(path, trashed_path)
+        except OSError as e:
+            # Different file system or a busy tree: delete it in place.
+            logging.warning(f"Could not move {path} to {self.trash_dir} ({e}); deleting synchronously")
+            _delete_tree(path)
+            return
+        self._pending.put(trashed_path)
+
+    def drain(self):
+        """Blocks until everything discarded so far is deleted."""
+        self._pending.join()
+
+    def _delete_loop(self):
+        for leftover in self._leftovers:
+            _delete_tree(leftover)
+        while True:
+            trashed_path = self._pending.get()
+            try:
+                _delete_tree(trashed_path)
+            finally:
+                self._pending.task_done()
+
+def _delete_tree(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if os.path.lexists(path):
+        logging.error(f"Could not delete {path}")
+
+_trashes = {}
+_trashes_lock = threading.Lock()
+
+def get_trash(path):
+    """Returns the trash shared by every work directory next to `path`."""
+    trash_dir = os.path.join(os.path.dirname(os.path.abspath(path)), TRASH_DIR_NAME)
+    with _trashes_lock:
+        if trash_dir not in _trashes:
+            _trashes[trash_dir] = WorkDirTrash(trash_dir)
+        return _trashes[trash_dir]
+
+def recycle_work_dir(work_dir):
+    """Empties `work_dir` without waiting for the deletion of its contents."""
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+        return
+    trash = get_trash(work_dir)
+    for name in os.listdir(work_dir):
+        trash.discard(os.path.join(work_dir, name))
+
+def discard_tree(path):
+    """Removes `path` (a checkout) in the background."""
+    get_trash(path).discard(path)
@@ -0,0 +1,58 @@
+import os
+import queue
+import logging
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+class WorkDirPool:
+    """
+    Hands out one private work directory per worker so that concurrent bugs
+    never share (or wipe) each other's checkout. With a single worker the
+    base work directory itself is used, keeping the sequential layout intact.
+    """
+    def __init__(self, work_dir, workers):
+        if workers <= 1:
+            self.work_dirs = [work_dir]
+        else:
+            self.work_dirs = [os.path.join(work_dir, f"worker_{i}") for i in range(workers)]
+
+        self._available = queue.Queue()
+        for worker_dir in self.work_dirs:
+            os.makedirs(worker_dir, exist_ok=True)
+            self._available.put(worker_dir)
+
+    @contextmanager
+    def acquire(self):
+        worker_dir = self._available.get()
+        try:
+            yield worker_dir
+        finally:
+            self._available.put(worker_dir)
+
+def run_in_worker_pool(entries, process_fn, work_dir, workers):
+    """
+    Calls `process_fn(project, bug_id, worker_dir)` for every (project, bug_id)
+    entry using up to `workers` threads. Bugs are dominated by LLM latency and
+    defects4j subprocesses, so threads are enough to keep every core busy.
+    A failing bug is logged and does not stop the remaining ones.
+    """
+    pool = WorkDirPool(work_dir, workers)
+
+    def run_entry(entry):
+        project, bug_id = entry
+        with pool.acquire() as worker_dir:
+            try:
+                process_fn(project, int(bug_id), worker_dir)
+            except Exception as e:
+                logging.error(f"Unhandled error while processing {project}-{bug_id}: {e}")
+                print(f"Unhandled error while processing {project}-{bug_id}: {e}")
+                traceback.print_exc()
+
+    if workers <= 1:
+        for entry in entries:
+            run_entry(entry)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run_entry, entries))
@@ -0,0 +1,204 @@
+import os
+import re
+import shutil
+import logging
+import threading
+import subprocess
+
+# Fixed identity so that importing the same checkout twice yields the same tree
+# and the store does not depend on the user's git configuration.
+_GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "defects4j",
+    "GIT_AUTHOR_EMAIL": "defects4j@localhost",
+    "GIT_COMMITTER_NAME": "defects4j",
+    "GIT_COMMITTER_EMAIL": "defects4j@localhost",
+}
+
+VERSIONS = ("b", "f")
+
+def d4j_repository(project):
+    """Returns the project repository Defects4J checks versions out from (`defects4j info -p`), or None."""
+    info_proc = subprocess.run(['defects4j', 'info', '-p', project], capture_output=True, text=True)
+    for line in info_proc.stdout.splitlines():
+        key, _, value = line.partition(':')
+        if key.strip() == 'Repository':
+            return value.strip()
+    return None
+
+class WorktreeStore:
+    """
+    One bare git repository per Defects4J project (`<store_dir>/<project>.git`)
+    holding every imported buggy and fixed version as a commit under
+    `refs/d4j/<bug_id><b|f>`. Work trees are materialized from it with
+    `git worktree add` instead of `defects4j checkout`.
+
+    The repository starts as a clone of the project's Defects4J repository,
+    so the project history is imported once and every version reuses its
+    blobs. A bug is then imported from one `defects4j checkout` of its buggy
+    version, whose repository also tags the fixed version; only objects the
+    store lacks are copied. The checkout's D4J_* tags are kept, so git-based
+    Defects4J commands work in a materialized tree. Files Defects4J writes
+    after its last commit (`.defects4j.config`, `defects4j.build.properties`)
+    are committed on top, and empty directories are recreated.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = os.path.abspath(os.path.expanduser(store_dir))
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def repo_path(self, project):
+        return os.path.join(self.store_dir, f"{project}.git")
+
+    def ref(self, bug_id, version="b"):
+        return f"refs/d4j/{bug_id}{version}"
+
+    def empty_dirs_ref(self, bug_id, version="b"):
+        return f"refs/d4j-empty-dirs/{bug_id}{version}"
+
+    def _git(self, project, *args, check=True, env=None, cwd=None, input=None):
+        return subprocess.run(
+            ['git', f'--git-dir={self.repo_path(project)}', *args],
+            capture_output=True, text=input is None or isinstance(input, str),
+            check=check, env=env, cwd=cwd, input=input
+        )
+
+    def _ensure_repo(self, project):
+        with self._lock(project):
+            repo_path = self.repo_path(project)
+            if os.path.exists(os.path.join(repo_path, "HEAD")):
+                return
+            os.makedirs(self.store_dir, exist_ok=True)
+            tmp_path = f"{repo_path}.tmp"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            upstream = d4j_repository(project)
+            # A local clone hard-links the upstream objects.
+            if not upstream or subprocess.run(['git', 'clone', '--bare', '-q', upstream, tmp_path], capture_output=True).returncode != 0:
+                # E.g. projects Defects4J keeps in Subversion.
+                logging.info(f"No git repository of {project} to clone; its store starts empty")
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                subprocess.run(['git', 'init', '--bare', '-q', tmp_path], check=True)
+            os.rename(tmp_path, repo_path)
+
+    def has_version(self, project, bug_id, version="b"):
+        if not os.path.exists(self.repo_path(project)):
+            return False
+        return self._git(project, 'rev-parse', '--verify', '-q', self.ref(bug_id, version), check=False).returncode == 0
+
+    def import_bug(self, project, bug_id):
+        """Imports the buggy and fixed version of a bug, from one Defects4J checkout where possible."""
+        self._ensure_repo(project)
+        with self._lock((project, bug_id)):
+            for version in VERSIONS:
+                if not self.has_version(project, bug_id, version) and not self._import_checkout(project, bug_id, version):
+                    return False
+            return True
+
+    def _import_checkout(self, project, bug_id, version):
+        tmp_dir = os.path.join(self.store_dir, "tmp", f"{project}_{bug_id}{version}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(tmp_dir), exist_ok=True)
+        env = dict(os.environ, **_GIT_IDENTITY)
+
+        def tmp_git(*args, input=None, extra_env=None):
+            return subprocess.run(['git', '-C', tmp_dir, *args], capture_output=True, text=True, check=True,
+                                  input=input, env=dict(env, **(extra_env or {})))
+
+        try:
+            subprocess.run(['defects4j', 'checkout', '-p', project, '-v', f'{bug_id}{version}', '-w', tmp_dir],
+                           capture_output=True, check=True)
+            empty_dirs = sorted(
+                os.path.relpath(root, tmp_dir) for root, dirs, files in os.walk(tmp_dir)
+                if not dirs and not files and root != tmp_dir and '.git' not in os.path.relpath(root, tmp_dir).split(os.sep)
+            )
+            # The checkout's own repository holds the versions Defects4J
+            # committed; everything it wrote afterwards goes on top.
+            if not os.path.isdir(os.path.join(tmp_dir, ".git")):
+                tmp_git('init', '-q')
+            head = subprocess.run(['git', '-C', tmp_dir, 'rev-parse', '--verify', '-q', 'HEAD'], capture_output=True, text=True).stdout.strip()
+            tags = dict(line.split(' ', 1)[::-1] for line in tmp_git('for-each-ref', '--format=%(objectname) %(refname)', 'refs/tags').stdout.split('\n') if line)
+            tmp_git('add', '-A', '-f', '.')
+            tree = tmp_git('write-tree').stdout.strip()
+            commits = {version: tmp_git('commit-tree', tree, *(['-p', head] if head else []), '-m', f"{project}-{bug_id}{version}").stdout.strip()}
+
+            fixed_tag = next((ref for ref in tags if ref.endswith(f"_{bug_id}_FIXED_VERSION")), None)
+            if version == "b" and fixed_tag:
+                commits["f"] = self._fixed_commit(tmp_git, project, bug_id, tmp_dir, tree, fixed_tag)
+
+            self._copy_objects(project, tmp_dir, list(commits.values()) + list(tags))
+            for ref, objectname in tags.items():
+                self._git(project, 'update-ref', ref, objectname)
+            empty_dirs_blob = self._git(project, 'hash-object', '-w', '--stdin', input='\n'.join(empty_dirs)).stdout.strip()
+            for imported_version, commit in commits.items():
+                self._git(project, 'update-ref', self.empty_dirs_ref(bug_id, imported_version), empty_dirs_blob)
+                self._git(project, 'update-ref', self.ref(bug_id, imported_version), commit)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Importing {project}-{bug_id}{version} into {self.repo_path(project)} failed: {e.stderr}")
+            return False
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return True
+
+    def _fixed_commit(self, tmp_git, project, bug_id, tmp_dir, buggy_tree, fixed_tag):
+        # The files written after the last commit are those of the buggy
+        # checkout; the fixed version's config names the fixed version.
+        index_env = {"GIT_INDEX_FILE": os.path.join(tmp_dir, ".git", "fixed_index")}
+        tmp_git('read-tree', fixed_tag, extra_env=index_env)
+        changed = tmp_git('diff-tree', '-r', '--no-renames', '--name-only', 'HEAD', buggy_tree).stdout.split('\n')
+        for path in filter(None, changed):
+            entry = tmp_git('ls-tree', buggy_tree, '--', path).stdout.strip()
+            if not entry:
+                continue
+            mode, _, blob = entry.split('\t')[0].split(' ')
+            if path == ".defects4j.config":
+                config = tmp_git('cat-file', 'blob', blob).stdout
+                config = re.sub(r'(?m)^vid=.*$', f'vid={bug_id}f', config)
+                blob = tmp_git('hash-object', '-w', '--stdin', input=config).stdout.strip()
+            tmp_git('update-index', '--add', '--cacheinfo', f"{mode},{blob},{path}", extra_env=index_env)
+        fixed_tree = tmp_git('write-tree', extra_env=index_env).stdout.strip()
+        return tmp_git('commit-tree', fixed_tree, '-p', fixed_tag, '-m', f"{project}-{bug_id}f").stdout.strip()
+
+    def _copy_objects(self, project, tmp_dir, tips):
+        # The checkout's repository shares no commits with the store, so a
+        # fetch would copy every blob; send only the objects the store lacks.
+        rev_list = subprocess.run(['git', '-C', tmp_dir, 'rev-list', '--objects', *tips], capture_output=True, text=True, check=True)
+        objects = [line.split(' ')[0] for line in rev_list.stdout.split('\n') if line]
+        check = self._git(project, 'cat-file', '--batch-check', input='\n'.join(objects) + '\n').stdout.split('\n')
+        missing = [line.split(' ')[0] for line in check if line.endswith(' missing')]
+        if not missing:
+            return
+        pack = subprocess.run(['git', '-C', tmp_dir, 'pack-objects', '-q', '--stdout'],
+                              input=('\n'.join(missing) + '\n').encode(), capture_output=True, check=True).stdout
+        self._git(project, 'index-pack', '--stdin', input=pack)
+
+    def materialize(self, project, bug_id, target_dir, version="b"):
+        """Creates a detached worktree of the version at `target_dir`, importing the bug first if needed."""
+        if not self.has_version(project, bug_id, version) and not self.import_bug(project, bug_id):
+            return False
+        target_dir = os.path.abspath(target_dir)
+        with self._lock(project):
+            try:
+                # Work directories are removed with rm -rf between attempts;
+                # drop their stale registrations before adding a new one.
+                self._git(project, 'worktree', 'prune')
+                self._git(project, 'worktree', 'add', '-f', '--detach', target_dir, self.ref(bug_id, version))
+            except subprocess.CalledProcessError as e:
+                logging.error(f"Materializing {project}-{bug_id}{version} at {target_dir} failed: {e.stderr}")
+                return False
+        empty_dirs = self._git(project, 'cat-file', 'blob', self.empty_dirs_ref(bug_id, version), check=False).stdout
+        for empty_dir in filter(None, empty_dirs.split('\n')):
+            os.makedirs(os.path.join(target_dir, empty_dir), exist_ok=True)
+        return True
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_worktree_store(store_dir):
+    store_dir = os.path.abspath(os.path.expanduser(store_dir))
+    with _stores_lock:
+        if store_dir not in _stores:
+            _stores[store_dir] = WorktreeStore(store_dir)
+        return _stores[store_dir]
@@ -1,7 +1,7 @@
 import os
 import argparse
 import json
-from utils.d4j_json_utils import get_bug_report_info, get_buggy_lines, get_failing_tests, extract_test_method_content, determine_bug_type, d4j_path_prefix, d4j_test_path_prefix, get_buggy_files, extract_hunks_from_file, load_existing_buggy_code, explicit_delineation, classify_single_hunk, decide_bug_scope
+from utils.d4j_json_utils import use_metadata_store, get_bug_report_info, get_buggy_lines, get_failing_tests, extract_test_method_content, determine_bug_type, d4j_path_prefix, d4j_test_path_prefix, get_buggy_files, extract_hunks_from_file, load_existing_buggy_code, explicit_delineation, classify_single_hunk, decide_bug_scope
 from utils.general_utils import read_file_content
 
 PROJECTS = {
@@ -149,7 +149,11 @@ if __name__ == "__main__":
     parser.add_argument('--output_dir', type=str, default=os.path.join(os.getcwd(), 'config'), help='Output directory for processed bug files')
     parser.add_argument('--json_files_path', type=str, default=os.path.join(os.getcwd(), 'config'), help='Path to the JSON files containing existing buggy code')
     parser.add_argument('--mode', type=str, choices=['block', 'method', 'class', 'file'], default='method')
+    parser.add_argument('--metadata_db', type=str, default=None, help='SQLite database written by export_d4j_metadata.py; bugs found there need no `defects4j info` calls')
 
     args = parser.parse_args()
 
+    if args.metadata_db:
+        use_metadata_store(args.metadata_db)
+
     process_bugs(PROJECTS, args.work_dir, args.defects4j_home, args.output_dir, args.json_files_path, args.mode)
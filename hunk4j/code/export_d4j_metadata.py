@@ -0,0 +1,80 @@
+import os
+import csv
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from utils.d4j_metadata import D4jMetadataStore
+from utils.d4j_json_utils import defects4j_info, parse_bug_report_url, parse_failing_tests, parse_modified_classes, count_hunks_and_lines, get_buggy_lines
+
+def read_active_bugs(defects4j_home, project):
+    with open(os.path.join(defects4j_home, 'framework/projects', project, 'active-bugs.csv'), 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def read_dir_layout(defects4j_home, project):
+    """Maps revision ids to (source dir, test dir) from the project's dir-layout.csv."""
+    layouts = {}
+    layout_path = os.path.join(defects4j_home, 'framework/projects', project, 'dir-layout.csv')
+    if not os.path.exists(layout_path):
+        return layouts
+    with open(layout_path, 'r', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) >= 3:
+                layouts[row[0]] = (row[1], row[2])
+    return layouts
+
+def export_bug(store, defects4j_home, project, active_bug, layouts):
+    bug_id = int(active_bug['bug.id'])
+    revision_buggy = active_bug.get('revision.id.buggy')
+    revision_fixed = active_bug.get('revision.id.fixed')
+    src_dir, test_dir = layouts.get(revision_buggy) or layouts.get(revision_fixed) or (None, None)
+
+    info = defects4j_info(project, bug_id)
+    store.put_bug(
+        project, bug_id, revision_buggy, revision_fixed,
+        active_bug.get('report.url') or parse_bug_report_url(info),
+        src_dir, test_dir, info,
+        parse_modified_classes(info),
+        parse_failing_tests(info)
+    )
+
+    patch_file_path = os.path.join(defects4j_home, f'framework/projects/{project}/patches/{bug_id}.src.patch')
+    if os.path.exists(patch_file_path):
+        store.put_patch(project, bug_id, patch_file_path, count_hunks_and_lines(patch_file_path), get_buggy_lines(patch_file_path))
+    print(f"{project}-{bug_id}")
+
+def export_metadata(defects4j_home, db_path, projects=None, workers=8):
+    projects_dir = os.path.join(defects4j_home, 'framework/projects')
+    if not projects:
+        projects = sorted(p for p in os.listdir(projects_dir) if os.path.exists(os.path.join(projects_dir, p, 'active-bugs.csv')))
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    store = D4jMetadataStore(db_path)
+    tasks = []
+    for project in projects:
+        layouts = read_dir_layout(defects4j_home, project)
+        for active_bug in read_active_bugs(defects4j_home, project):
+            tasks.append((project, active_bug, layouts))
+
+    def run_task(task):
+        project, active_bug, layouts = task
+        try:
+            export_bug(store, defects4j_home, project, active_bug, layouts)
+        except Exception as e:
+            logging.error(f"Exporting {project}-{active_bug.get('bug.id')} failed: {e}")
+
+    # Each bug costs one `defects4j info` (a Perl process); run them in parallel.
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(run_task, tasks))
+    store.close()
+    print(f"Exported {len(tasks)} bugs of {len(projects)} projects to {db_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exports Defects4J metadata of every active bug into a SQLite database used by d4j_json_creator.py.')
+    parser.add_argument('--defects4j_home', type=str, default=os.path.expanduser("~/Desktop/defects4j"), help='Path to the Defects4J home directory')
+    parser.add_argument('--db_path', type=str, default=os.path.join(os.getcwd(), 'config', 'd4j_metadata.sqlite'), help='SQLite database to create or update')
+    parser.add_argument('--projects', type=str, nargs='*', default=None, help='Projects to export (default: every project in the Defects4J home)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of bugs exported in parallel')
+
+    args = parser.parse_args()
+
+    export_metadata(args.defects4j_home, args.db_path, args.projects, args.workers)
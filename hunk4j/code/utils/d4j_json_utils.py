@@ -18,6 +18,24 @@ import logging
 import javalang
 from playwright.sync_api import sync_playwright
 from urllib.parse import urlparse
+from .d4j_metadata import D4jMetadataStore
+
+# Set by use_metadata_store(); lookups fall back to Defects4J for bugs the
+# store does not have.
+_metadata_store = None
+
+def use_metadata_store(db_path):
+    global _metadata_store
+    _metadata_store = D4jMetadataStore(db_path)
+    return _metadata_store
+
+def defects4j_info(project, bug_id):
+    if _metadata_store:
+        info = _metadata_store.info(project, bug_id)
+        if info is not None:
+            return info
+    result = subprocess.run(['defects4j', 'info', '-p', project, '-b', str(bug_id)], capture_output=True, text=True)
+    return result.stdout
 
 def count_hunks_and_lines(file_path):
     with open(file_path, 'r', encoding='ISO-8859-1') as file:
@@ -109,6 +127,8 @@ def d4j_path_prefix(proj, bug_num):
         return 'src/main/java/'
     elif proj == 'JxPath':
         return 'src/java/'
+    elif _metadata_store and _metadata_store.dir_layout(proj, bug_num):
+        return _metadata_store.dir_layout(proj, bug_num)[0] + '/'
     else:
         raise ValueError(f'Unrecognized project {proj}')
     
@@ -155,6 +175,8 @@ def d4j_test_path_prefix(proj, bug_num):
         return 'src/test/java/'
     elif proj == 'JxPath':
         return 'src/test/'
+    elif _metadata_store and _metadata_store.dir_layout(proj, bug_num):
+        return _metadata_store.dir_layout(proj, bug_num)[1] + '/'
     else:
         raise ValueError(f'Cannot find test path prefix for {proj}{bug_num}')
 
@@ -273,20 +295,26 @@ def parse_bug_report_description(url, project, bug_id):
 
     return description
 
-def get_bug_report_info(project, bug_id):
-    cmd = f"defects4j info -p {project} -b {bug_id}"
-    result = subprocess.run(cmd.split(), capture_output=True, text=True)
-    lines = result.stdout.splitlines()
+def parse_bug_report_url(info):
+    lines = info.splitlines()
     url = ""
     for i, line in enumerate(lines):
         if line.startswith("Bug report url:"):
             url = lines[i + 1].strip()
             break
+    return url
+
+def get_bug_report_info(project, bug_id):
+    url = parse_bug_report_url(defects4j_info(project, bug_id))
     
     description = parse_bug_report_description(url, project, bug_id)
     return url, description
 
 def get_buggy_lines(patch_file_path):
+    if _metadata_store:
+        stored_lines = _metadata_store.buggy_lines(patch_file_path)
+        if stored_lines is not None:
+            return stored_lines
     buggy_lines = {}
     try:
         with open(patch_file_path, 'r', encoding='utf-8') as patch_file:
@@ -315,10 +343,15 @@ def get_buggy_lines(patch_file_path):
 
 def get_failing_tests(project, bug_id):
     bug_id = int(bug_id)
-    cmd = f"defects4j info -p {project} -b {bug_id}"
-    result = subprocess.run(cmd.split(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    output = result.stdout
+    if _metadata_store:
+        stored_tests = _metadata_store.trigger_tests(project, bug_id)
+        if stored_tests:
+            return stored_tests
+    return parse_failing_tests(defects4j_info(project, bug_id))
+
+def parse_failing_tests(output):
     test_methods = []
+    current_test = None
     pattern_test = re.compile(r' - (.*)::(.*)')
     pattern_error = re.compile(r'   --> (.*)')
     for line in output.split('\n'):
@@ -361,8 +394,11 @@ def extract_test_method_content(test_file_content, method_name):
         return None 
 
 def determine_bug_type(project, bug_id, defects4j_home):
-    patch_file_path = os.path.join(defects4j_home, f'framework/projects/{project}/patches/{bug_id}.src.patch')
-    hunk_count, line_count, single_line, file_count = count_hunks_and_lines(patch_file_path)
+    patch_stats = _metadata_store.patch_stats(project, bug_id) if _metadata_store else None
+    if patch_stats is None:
+        patch_file_path = os.path.join(defects4j_home, f'framework/projects/{project}/patches/{bug_id}.src.patch')
+        patch_stats = count_hunks_and_lines(patch_file_path)
+    hunk_count, line_count, single_line, file_count = patch_stats
     
     if single_line:
         return 'single_line_bug'
@@ -386,21 +422,27 @@ def determine_bug_type(project, bug_id, defects4j_home):
             return 'multi_file_four_or_more_hunks'
     return 'unknown'
 
-def get_buggy_files(proj, bug_num):
-    cmd = f"defects4j info -p {proj} -b {bug_num}"
-    result = subprocess.run(cmd.split(), capture_output=True, text=True)
-    lines = result.stdout.splitlines()
-    buggy_files = []
+def parse_modified_classes(info):
+    modified_classes = []
     capture = False
-    for line in lines:
+    for line in info.splitlines():
         if line.startswith('List of modified sources'):
             capture = True
             continue
         if capture:
             if line.startswith(" - "):
-                modified_file = line[3:].strip().replace('.', '/') + '.java'
-                prefix = d4j_path_prefix(proj, int(bug_num))
-                buggy_files.append(os.path.join(prefix, modified_file))
+                modified_classes.append(line[3:].strip())
+    return modified_classes
+
+def get_buggy_files(proj, bug_num):
+    modified_classes = _metadata_store.modified_classes(proj, bug_num) if _metadata_store else []
+    if not modified_classes:
+        modified_classes = parse_modified_classes(defects4j_info(proj, bug_num))
+    buggy_files = []
+    for modified_class in modified_classes:
+        modified_file = modified_class.replace('.', '/') + '.java'
+        prefix = d4j_path_prefix(proj, int(bug_num))
+        buggy_files.append(os.path.join(prefix, modified_file))
     return buggy_files
 
 
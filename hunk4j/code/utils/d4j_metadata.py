@@ -0,0 +1,126 @@
+import os
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bugs (
+    project TEXT NOT NULL,
+    bug_id INTEGER NOT NULL,
+    revision_buggy TEXT,
+    revision_fixed TEXT,
+    report_url TEXT,
+    src_dir TEXT,
+    test_dir TEXT,
+    info TEXT,
+    PRIMARY KEY (project, bug_id)
+);
+CREATE TABLE IF NOT EXISTS modified_classes (
+    project TEXT NOT NULL,
+    bug_id INTEGER NOT NULL,
+    class_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS modified_classes_by_bug ON modified_classes (project, bug_id);
+CREATE INDEX IF NOT EXISTS modified_classes_by_class ON modified_classes (class_name);
+CREATE TABLE IF NOT EXISTS trigger_tests (
+    project TEXT NOT NULL,
+    bug_id INTEGER NOT NULL,
+    test_class TEXT NOT NULL,
+    test_method TEXT NOT NULL,
+    clean_err_msg TEXT
+);
+CREATE INDEX IF NOT EXISTS trigger_tests_by_bug ON trigger_tests (project, bug_id);
+CREATE TABLE IF NOT EXISTS patches (
+    project TEXT NOT NULL,
+    bug_id INTEGER NOT NULL,
+    patch_path TEXT NOT NULL,
+    hunk_count INTEGER,
+    line_count INTEGER,
+    single_line INTEGER,
+    file_count INTEGER,
+    buggy_lines TEXT,
+    PRIMARY KEY (project, bug_id)
+);
+CREATE INDEX IF NOT EXISTS patches_by_path ON patches (patch_path);
+"""
+
+class D4jMetadataStore:
+    """
+    SQLite store of Defects4J bug metadata filled once by
+    export_d4j_metadata.py: the raw `defects4j info` output, modified classes,
+    triggering tests with their root causes, bug report URLs, source and test
+    directory layouts and per-patch hunk statistics. Lookups return None for
+    bugs that were not exported, so callers can fall back to Defects4J.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def info(self, project, bug_id):
+        rows = self._query("SELECT info FROM bugs WHERE project = ? AND bug_id = ?", (project, int(bug_id)))
+        return rows[0][0] if rows and rows[0][0] is not None else None
+
+    def report_url(self, project, bug_id):
+        rows = self._query("SELECT report_url FROM bugs WHERE project = ? AND bug_id = ?", (project, int(bug_id)))
+        return rows[0][0] if rows else None
+
+    def dir_layout(self, project, bug_id):
+        rows = self._query("SELECT src_dir, test_dir FROM bugs WHERE project = ? AND bug_id = ?", (project, int(bug_id)))
+        return rows[0] if rows and rows[0][0] else None
+
+    def modified_classes(self, project, bug_id):
+        return [row[0] for row in self._query(
+            "SELECT class_name FROM modified_classes WHERE project = ? AND bug_id = ? ORDER BY rowid", (project, int(bug_id)))]
+
+    def bugs_modifying(self, class_name):
+        return self._query("SELECT project, bug_id FROM modified_classes WHERE class_name = ? ORDER BY project, bug_id", (class_name,))
+
+    def trigger_tests(self, project, bug_id):
+        return self._query(
+            "SELECT test_class, test_method, clean_err_msg FROM trigger_tests WHERE project = ? AND bug_id = ? ORDER BY rowid",
+            (project, int(bug_id)))
+
+    def patch_stats(self, project, bug_id):
+        """Returns (hunk_count, line_count, single_line, file_count) like count_hunks_and_lines."""
+        rows = self._query(
+            "SELECT hunk_count, line_count, single_line, file_count FROM patches WHERE project = ? AND bug_id = ?",
+            (project, int(bug_id)))
+        return tuple(rows[0]) if rows else None
+
+    def buggy_lines(self, patch_path):
+        rows = self._query("SELECT buggy_lines FROM patches WHERE patch_path = ?", (os.path.abspath(patch_path),))
+        if not rows:
+            return None
+        return {file: [tuple(span) for span in spans] for file, spans in json.loads(rows[0][0]).items()}
+
+    def put_bug(self, project, bug_id, revision_buggy, revision_fixed, report_url, src_dir, test_dir, info, modified_classes, trigger_tests):
+        bug_id = int(bug_id)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bugs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (project, bug_id, revision_buggy, revision_fixed, report_url, src_dir, test_dir, info))
+            self._conn.execute("DELETE FROM modified_classes WHERE project = ? AND bug_id = ?", (project, bug_id))
+            self._conn.executemany(
+                "INSERT INTO modified_classes VALUES (?, ?, ?)",
+                [(project, bug_id, class_name) for class_name in modified_classes])
+            self._conn.execute("DELETE FROM trigger_tests WHERE project = ? AND bug_id = ?", (project, bug_id))
+            self._conn.executemany(
+                "INSERT INTO trigger_tests VALUES (?, ?, ?, ?, ?)",
+                [(project, bug_id, test_class, test_method, clean_err_msg) for test_class, test_method, clean_err_msg in trigger_tests])
+
+    def put_patch(self, project, bug_id, patch_path, stats, buggy_lines):
+        hunk_count, line_count, single_line, file_count = stats
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO patches VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (project, int(bug_id), os.path.abspath(patch_path), hunk_count, line_count, single_line, file_count, json.dumps(buggy_lines)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -9,6 +9,7 @@ import litellm, numpy as np, tiktoken
 
 from redwood.algorithms.ast_algorithm import BuildFullASTDataset, load_dataset, P
 from redwood.algorithms.bm25_algorithm import TokenizeStructure
+from redwood.algorithms.artifact_cache import load_pickle, load_faiss_index
 
 # Ensure your key is set in the environment:
 litellm.api_key = os.getenv("OPENAI_API_KEY")
@@ -112,10 +113,9 @@ def QueryAdaDatabaseEmb(
 ):
     query_embedding = get_litellm_embedding(query_buggy_code, model_name)[None, :]
 
-    index = faiss.read_index(db_path)
+    index = load_faiss_index(db_path)
     meta_path = os.path.splitext(db_path)[0] + "_metadata.pkl"
-    with open(meta_path, "rb") as f:
-        metadata_entries = pickle.load(f)
+    metadata_entries = load_pickle(meta_path)
 
     distances, indices = index.search(query_embedding, k)
     results = []
@@ -152,10 +152,9 @@ def QueryAdaDatabaseEmbAST(
     query_str = " ".join(query_tokens)
     query_emb = get_litellm_embedding(query_str, model_name)[None, :]
 
-    index = faiss.read_index(db_path)
+    index = load_faiss_index(db_path)
     meta_path = os.path.splitext(db_path)[0] + "_metadata.pkl"
-    with open(meta_path, "rb") as f:
-        metadata_entries = pickle.load(f)
+    metadata_entries = load_pickle(meta_path)
 
     distances, indices = index.search(query_emb, k)
     results = []
@@ -0,0 +1,66 @@
+import pickle
+import threading
+from functools import lru_cache
+
+# Retrieval artifacts (FAISS indexes, pickled metadata, embedding models) are
+# read-only during a repair run. Loading them once per process instead of
+# once per query is what makes in-process batch runs cheap.
+_load_lock = threading.RLock()
+
+@lru_cache(maxsize=None)
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+@lru_cache(maxsize=None)
+def _load_faiss_index(db_path):
+    import faiss
+    return faiss.read_index(db_path)
+
+@lru_cache(maxsize=None)
+def _load_sentence_transformer(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def load_pickle(path):
+    with _load_lock:
+        return _load_pickle(path)
+
+def load_faiss_index(db_path):
+    with _load_lock:
+        return _load_faiss_index(db_path)
+
+def load_sentence_transformer(model_name):
+    with _load_lock:
+        return _load_sentence_transformer(model_name)
+
+def cached(loader):
+    """
+    Memoizes an expensive loader for the lifetime of the process, e.g. a BM25
+    corpus derived from a metadata file. Arguments must be hashable. Calls
+    with different arguments run concurrently; equal ones wait for the first.
+    """
+    results = {}
+    key_locks = {}
+
+    def wrapper(*args):
+        with _load_lock:
+            if args in results:
+                return results[args]
+            key_lock = key_locks.setdefault(args, threading.Lock())
+        with key_lock:
+            with _load_lock:
+                if args in results:
+                    return results[args]
+            result = loader(*args)
+            with _load_lock:
+                results[args] = result
+            return result
+
+    def cache_clear():
+        with _load_lock:
+            results.clear()
+            key_locks.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
@@ -3,11 +3,11 @@ import json
 import os
 import difflib
 from birch.utils.d4j_json_utils import find_enclosing_block
+from utils.file_content import read_text, read_lines
 
 def read_java_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return read_text(file_path, encodings=('utf-8',))[0]
     except FileNotFoundError:
         print(f"File not found: {file_path}")
         return None
@@ -179,17 +179,11 @@ def extract_code_from_file(file_path, start_line, end_line):
     Extracts the code from the specified file between start_line and end_line.
     """
     try:
-        # Attempt to read the file using UTF-8 encoding
-        with open(file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
+        # UTF-8 first, then ISO-8859-1
+        lines, _ = read_lines(file_path, encodings=('utf-8', 'ISO-8859-1'))
     except UnicodeDecodeError:
-        # If UTF-8 fails, try reading the file with ISO-8859-1 encoding
-        try:
-            with open(file_path, 'r', encoding='ISO-8859-1') as file:
-                lines = file.readlines()
-        except UnicodeDecodeError:
-            # If both encodings fail, raise a descriptive error
-            raise ValueError(f"Unable to decode the file {file_path} using both UTF-8 and ISO-8859-1 encodings.")
+        # If both encodings fail, raise a descriptive error
+        raise ValueError(f"Unable to decode the file {file_path} using both UTF-8 and ISO-8859-1 encodings.")
     
     return lines[start_line - 1:end_line]
 
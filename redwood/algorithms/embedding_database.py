@@ -10,6 +10,7 @@ from sentence_transformers import SentenceTransformer
 from redwood.algorithms.ast_algorithm import BuildFullASTDataset, load_dataset, P
 
 from redwood.algorithms.bm25_algorithm import TokenizeStructure
+from redwood.algorithms.artifact_cache import load_pickle, load_faiss_index, load_sentence_transformer
 
 def embed_text_sliding_window(embed_model, text: str,
                               window_size: int = 256,
@@ -104,16 +105,15 @@ def QueryEmbeddingDatabaseEmb(
     window_size: int = 512,
     overlap: int = 64
 ):
-    embed_model = SentenceTransformer(model_name)
+    embed_model = load_sentence_transformer(model_name)
 
     query_embedding = embed_text_sliding_window(
         embed_model, query_buggy_code, window_size, overlap
     )[None, :]
 
-    index = faiss.read_index(db_path)
+    index = load_faiss_index(db_path)
     meta_path = os.path.splitext(db_path)[0] + "_metadata.pkl"
-    with open(meta_path, "rb") as f:
-        metadata_entries = pickle.load(f)
+    metadata_entries = load_pickle(meta_path)
 
     distances, indices = index.search(query_embedding, k)
     results = []
@@ -150,16 +150,15 @@ def QueryEmbeddingDatabaseEmbAST(
         return []
 
     query_str = " ".join(query_tokens)
-    embed_model = SentenceTransformer(model_name)
+    embed_model = load_sentence_transformer(model_name)
 
     query_emb = embed_text_sliding_window(
         embed_model, query_str, window_size, overlap
     ).astype("float32")[None, :]
 
-    index = faiss.read_index(db_path)
+    index = load_faiss_index(db_path)
     meta_path = os.path.splitext(db_path)[0] + "_metadata.pkl"
-    with open(meta_path, "rb") as f:
-        metadata_entries = pickle.load(f)
+    metadata_entries = load_pickle(meta_path)
 
     distances, indices = index.search(query_emb, k)
     results = []
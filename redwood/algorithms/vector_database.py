@@ -7,6 +7,7 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from redwood.algorithms.bm25_algorithm import BM25, TokenizeStructure  
 from redwood.algorithms.ast_algorithm import BuildFullASTDataset, load_dataset, P 
+from redwood.algorithms.artifact_cache import load_pickle, load_faiss_index, cached
 
 def BuildVectorDatabase(dataset_ast, exclude_bug_ids=None, db_path="vector_db.index"):
     vectorizer = TfidfVectorizer()
@@ -70,14 +71,29 @@ def BuildVectorDatabase(dataset_ast, exclude_bug_ids=None, db_path="vector_db.in
 
 
 
+@cached
+def _structure_bm25(metadata_path):
+    corpus_tokens = [entry[0] for entry in load_pickle(metadata_path) if entry[0]]
+    if not corpus_tokens:
+        return None
+    return BM25(corpus_tokens)
+
+@cached
+def _buggy_code_bm25(metadata_path):
+    corpus = []
+    for _, meta in load_pickle(metadata_path):
+        buggy_code_snippet = meta.get("buggy_code", "") or ""
+        corpus.append(buggy_code_snippet)
+
+    tokenized_corpus = [snippet.split() for snippet in corpus]
+    return BM25(tokenized_corpus)
+
 def QueryVectorDatabase(query_subtree, k=5, query_bug_id=None, query_hunk_index=None, db_path="vector_db.index"):
-    with open("vectorizer.pkl", "rb") as f:
-        vectorizer = pickle.load(f)
+    vectorizer = load_pickle("vectorizer.pkl")
 
-    index = faiss.read_index(db_path)
+    index = load_faiss_index(db_path)
 
-    with open("vector_metadata.pkl", "rb") as f:
-        metadata_store = pickle.load(f)
+    metadata_store = load_pickle("vector_metadata.pkl")
 
     query_tokens = TokenizeStructure(query_subtree)
     if not query_tokens:
@@ -97,13 +113,11 @@ def QueryVectorDatabase(query_subtree, k=5, query_bug_id=None, query_hunk_index=
         faiss_results.append((metadata, distances[0][i]))
 
     # If BM25 corpus is empty, return early
-    corpus_tokens = [entry[0] for entry in metadata_store if entry[0]]
-    if not corpus_tokens:
+    bm25 = _structure_bm25("vector_metadata.pkl")
+    if bm25 is None:
         print("Warning: BM25 corpus is empty!")
         return faiss_results
 
-    bm25 = BM25(corpus_tokens)
-
     top_k_bm25 = bm25.get_top_k(query_tokens, k)
 
     combined_results = [
@@ -116,17 +130,9 @@ def QueryVectorDatabase(query_subtree, k=5, query_bug_id=None, query_hunk_index=
     return combined_results
 
 def QueryVectorDatabaseRAG(query_buggy_code, k=5, metadata_path="vector_metadata.pkl", query_bug_id=None, query_hunk_index=None):
-    with open(metadata_path, "rb") as f:
-        metadata_store = pickle.load(f)  
-
-    corpus = []
-    for _, meta in metadata_store:
-        buggy_code_snippet = meta.get("buggy_code", "") or ""
-        corpus.append(buggy_code_snippet)
-
-    tokenized_corpus = [snippet.split() for snippet in corpus]
+    metadata_store = load_pickle(metadata_path)
 
-    bm25 = BM25(tokenized_corpus)
+    bm25 = _buggy_code_bm25(metadata_path)
 
     query_tokens = query_buggy_code.split()
 
@@ -5,105 +5,34 @@ import logging
 import re
 import argparse
 
-parser = argparse.ArgumentParser(description='Defects4J Bug Processing Script')
-parser.add_argument('--work_dir', type=str, default="/tmp/work_dir",
-                    help='Working directory')
-parser.add_argument('--dataset_path', type=str, default="../birch/config/d4j_dataset.json",
-                    help='Path to the dataset JSON file')
-parser.add_argument('--baseline_dataset_path', type=str, default="./config/method_multihunk.json", help='Path to the alternate dataset JSON file')
-parser.add_argument('--baseline_block_dataset_path', type=str, default="./config/block_multihunk.json", help='Path to the alternate dataset JSON file')
-parser.add_argument('--baseline_class_dataset_path', type=str, default="./config/class_multihunk.json", help='Path to the alternate dataset JSON file')
-parser.add_argument('--baseline_file_dataset_path', type=str, default="./config/files_multihunk.json", help='Path to the alternate dataset JSON file')
-parser.add_argument('--processed_file', type=str, default="processed.json",
-                    help='Path to the processed bugs JSON file (will be created/updated in the same directory as the dataset file)')
-parser.add_argument('--mode', type=int, choices=range(1, 5), default=4,
-                    help='Mode of operation, ranging from 1 to 4')
-parser.add_argument('--model', type=str, required=True,
-                    help='Model to use (e.g., "gpt-4").')
-parser.add_argument('--multihunk', type=str, choices=['yes', 'no'], default='yes',
-                    help='Use the multi-hunk dataset if "yes", otherwise use the primary dataset.')
-parser.add_argument('--api_host', type=str, default=None,
-                    help='API host address for connecting to an external service')
-parser.add_argument('--results_path', type=str, default=None,
-                    help='Optional parameter to configure results directory location. Default: ./results/mode_<MODE>_model_<MODEL>')
-parser.add_argument('--project', type=str, required=True,
-                    help='Defects4J project name, e.g. Lang, Chart, Closure, Math, Mockito, etc.')
-parser.add_argument('--bug_id', type=str, required=True,
-                    help='Defects4J bug ID, e.g. 1, 2, 3...')
-parser.add_argument('--max_iterations', type=int, default=3,
-                    help='Defects4J bug ID, e.g. 1, 2, 3...')
-parser.add_argument('--method', type=str, choices=['ast', 'rag', "emb-ast", "emb-rag", "ada-ast", "ada-rag"], default='rag',
-                    help='Use the AST approach if "ast", RAG approach if "rag", Embedding approach if "emb".')
-parser.add_argument("--checkout_dir", type=str, default=os.path.expanduser("~/WORK_DIR"),
-                        help="Path to the working directory where bug projects are stored")
-parser.add_argument("--fixed_dir", type=str, default=os.path.expanduser("~/WORK_DIR_FIXED"),
-                    help="Path to the working directory where bug projects are stored")
-parser.add_argument("--fixed_json", type=str, default="./config/enclosing_method_context_javaparser_fixed.json",
-                        help="Path to the dataset JSON file")
-parser.add_argument('--scope', type=str, choices=['block', 'method', 'class', 'file'], default='method', help='Choose the appropriate scope you want to run the experiment with')
-args = parser.parse_args()
-
-
-dataset_path = args.dataset_path
-
-WORK_DIR = args.work_dir
-MODE = args.mode
-MODEL = args.model
-BASELINE = args.multihunk.lower() == 'yes'
-API_HOST = args.api_host
-RESULTS_PATH = args.results_path
-SCOPE = args.scope
-FIXED_JSON = args.fixed_json
-
-
-if BASELINE:
-    if SCOPE == 'block':
-        DATASET_PATH = os.path.abspath(args.baseline_block_dataset_path)
-    elif SCOPE == 'class':
-        DATASET_PATH = os.path.abspath(args.baseline_class_dataset_path)
-    elif SCOPE == 'file':
-        DATASET_PATH = os.path.abspath(args.baseline_file_dataset_path)
-    else:
-        DATASET_PATH = os.path.abspath(args.baseline_dataset_path)
-else:
-    DATASET_PATH = os.path.abspath(args.dataset_path)
-
-PROCESSED_FILE = os.path.join(os.path.dirname(DATASET_PATH), args.processed_file)
-
-CHECKOUT_DIR = args.checkout_dir
-FIXED_DIR = args.fixed_dir
-
-PROJECT = args.project
-BUG_ID = args.bug_id
-MODE = args.mode
-MODEL = args.model
-MAX_ITERATIONS = args.max_iterations
-RESULTS_PATH = args.results_path
-METHOD = args.method.lower()
-results_base_path = f"./results/mode_{MODE}_model_{MODEL}"
-if RESULTS_PATH:
-    results_base_path = RESULTS_PATH
-
-PROMPT_PATH = os.path.join(results_base_path, "suggestion_prompt")
-GENERATED_PATCHES_PATH = os.path.join(results_base_path, "generated_patches")
-LINUX_PATCHES_PATH = os.path.join(results_base_path, "linux_patches")
-TEST_RESULTS_PATH = os.path.join(results_base_path, "test_results")
-COMPILE_RESULTS_PATH = os.path.join(results_base_path, "compile_results")
-COMPILE_INFO_PATH = os.path.join(results_base_path, "compile_info")
-TRAJECTORY_LOGS_PATH = os.path.join(results_base_path, "trajectory_logs")
-
-
 from birch.utils.d4j_infra import (
     checkout_repo,
     compile_repo,
+    pristine_checkout_path,
+    ensure_test_baseline,
     run_test,
+    trigger_test_ids,
     write_result_csv,
     save_compile_results,
     save_test_results,
     save_processed,
-    clear_work_dir
+    clear_work_dir,
+    extract_projects_and_bugs,
+    save_trajectory_log
 )
-from birch.patch_validation import PatchValidation
+from birch.utils.repair_config import RepairConfig, resolve_dataset_path
+from birch.utils.repair_pipeline import RepairPipeline
+from birch.utils.run_journal import RunJournal
+from birch.utils.completion_store import CompletionStore, reuse_completions
+from birch.utils.bug_scheduler import order_longest_first
+from birch.utils.replay import RecordedOutputs, replay_results_path
+from birch.utils.async_generation import generate_hunks_concurrently
+from birch.utils.tmpfs_placement import get_tmpfs_placement
+from birch.utils.test_baseline import classify_failures, only_modified_classes_patched
+from birch.utils.test_impact import get_test_impact_index
+from birch.utils.syntax_gate import reject_unparsable
+from birch.utils.validation_cache import get_validation_cache, patch_set_hash, is_noop, unchanged_test_result, compile_variant, test_variant, cached_compile, cached_test
+from birch.patch_validation import apply_patches
 from utils.feedback_loop_infra import (
     get_fix_code,
     parse_compiler_errors,
@@ -116,245 +45,494 @@ from redwood.prompts.similar_result_prompts import generate_algorithm_enhanced_p
 from redwood.algorithms.algorithm_infra import get_fix_code_algorithm
 from utils.tokens_counter import count_tokens
 
-def run_birch_with_feedback(
-    project,
-    bug_id,
-    MODE,
-    MODEL,
-    API_HOST,
-    MAX_ITERATIONS=3
-):
-    
-    clear_work_dir(WORK_DIR)
-
-    trajectory_log = {
-        "bug_id": f"{project}_{bug_id}",
-        "resolution_status": None,  
-        "duration_seconds": 0,
-        "iterations": []
-    }
-
-    start_time = time.time()
+def build_parser(default_model=None):
+    parser = argparse.ArgumentParser(description='Defects4J Bug Processing Script')
+    parser.add_argument('--work_dir', type=str, default="/tmp/work_dir",
+                        help='Working directory')
+    parser.add_argument('--dataset_path', type=str, default="../birch/config/d4j_dataset.json",
+                        help='Path to the dataset JSON file')
+    parser.add_argument('--baseline_dataset_path', type=str, default="./config/method_multihunk.json", help='Path to the alternate dataset JSON file')
+    parser.add_argument('--baseline_block_dataset_path', type=str, default="./config/block_multihunk.json", help='Path to the alternate dataset JSON file')
+    parser.add_argument('--baseline_class_dataset_path', type=str, default="./config/class_multihunk.json", help='Path to the alternate dataset JSON file')
+    parser.add_argument('--baseline_file_dataset_path', type=str, default="./config/files_multihunk.json", help='Path to the alternate dataset JSON file')
+    parser.add_argument('--processed_file', type=str, default="processed.json",
+                        help='Name of the legacy processed bugs JSON file in the dataset directory. Progress of whole-dataset runs is journaled next to it as <name>.jsonl.')
+    parser.add_argument('--schedule', type=str, choices=['dataset', 'longest_first'], default='dataset',
+                        help='Order in which bugs of a whole-dataset run are dispatched: dataset order or predicted longest first (from earlier trajectory logs).')
+    parser.add_argument('--schedule_history', type=str, nargs='*', default=[],
+                        help='Additional trajectory_logs directories of earlier runs used to predict bug durations.')
+    parser.add_argument('--reuse_completions', type=str, choices=['yes', 'no'], default='yes',
+                        help='Reuse LLM completions stored in <results_path>/completions.jsonl by an earlier, interrupted run instead of querying the LLM again.')
+    parser.add_argument('--reset_processed', action='store_true',
+                        help='Archive the run journal and start over instead of resuming.')
+    parser.add_argument('--mode', type=int, choices=range(1, 5), default=4,
+                        help='Mode of operation, ranging from 1 to 4')
+    parser.add_argument('--model', type=str, required=default_model is None, default=default_model,
+                        help='Model to use (e.g., "gpt-4").')
+    parser.add_argument('--multihunk', type=str, choices=['yes', 'no'], default='yes',
+                        help='Use the multi-hunk dataset if "yes", otherwise use the primary dataset.')
+    parser.add_argument('--api_host', type=str, default=None,
+                        help='API host address for connecting to an external service')
+    parser.add_argument('--results_path', type=str, default=None,
+                        help='Optional parameter to configure results directory location. Default: ./results/mode_<MODE>_model_<MODEL>')
+    parser.add_argument('--project', type=str, default=None,
+                        help='Defects4J project name, e.g. Lang, Chart, Closure, Math, Mockito, etc. If omitted together with --bug_id, every bug of the dataset is repaired.')
+    parser.add_argument('--bug_id', type=str, default=None,
+                        help='Defects4J bug ID, e.g. 1, 2, 3...')
+    parser.add_argument('--max_iterations', type=int, default=3,
+                        help='Defects4J bug ID, e.g. 1, 2, 3...')
+    parser.add_argument('--method', type=str, choices=['ast', 'rag', "emb-ast", "emb-rag", "ada-ast", "ada-rag"], default='rag',
+                        help='Use the AST approach if "ast", RAG approach if "rag", Embedding approach if "emb".')
+    parser.add_argument("--checkout_dir", type=str, default=os.path.expanduser("~/WORK_DIR"),
+                            help="Path to the working directory where bug projects are stored")
+    parser.add_argument("--fixed_dir", type=str, default=os.path.expanduser("~/WORK_DIR_FIXED"),
+                        help="Path to the working directory where bug projects are stored")
+    parser.add_argument("--fixed_json", type=str, default="./config/enclosing_method_context_javaparser_fixed.json",
+                            help="Path to the dataset JSON file")
+    parser.add_argument('--scope', type=str, choices=['block', 'method', 'class', 'file'], default='method', help='Choose the appropriate scope you want to run the experiment with')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of bugs compiled and tested in parallel when running the whole dataset.')
+    parser.add_argument('--llm_workers', type=int, default=1,
+                        help='Number of threads generating patches when running the whole dataset.')
+    parser.add_argument('--hunk_concurrency', type=int, default=1,
+                        help='Maximum number of concurrent LLM requests for the hunks of one bug.')
+    parser.add_argument('--pristine_dir', type=str, default=None,
+                        help='If set, every bug is checked out and compiled once into this directory and copied from there for each iteration, instead of running `defects4j checkout` every time.')
+    parser.add_argument('--clone_mode', type=str, choices=['reflink', 'hardlink'], default='reflink',
+                        help='How work trees are cloned from --pristine_dir: "reflink" copies with `cp -a --reflink=auto` (copy-on-write where the file system supports it), "hardlink" hard-links the source directories and copies only build outputs.')
+    parser.add_argument('--worktree_store', type=str, default=None,
+                        help='Directory of per-project git repositories filled by birch/prepare_corpus.py. If set, checkouts are created as git worktrees from it instead of with `defects4j checkout`.')
+    parser.add_argument('--incremental_compile', type=str, choices=['yes', 'no'], default='no',
+                        help='With --pristine_dir, compile only the patched files with javac against the cached build of the buggy version instead of running `defects4j compile`.')
+    parser.add_argument('--trigger_tests_first', type=str, choices=['yes', 'no'], default='no',
+                        help='Run the triggering tests of the dataset first and the full test suite only if they pass.')
+    parser.add_argument('--warm_test_runner', type=str, choices=['yes', 'no'], default='no',
+                        help='With --trigger_tests_first and --pristine_dir, run the triggering tests in a long-lived JUnit JVM per worker instead of one `defects4j test -t` each.')
+    parser.add_argument('--tmpfs_dir', type=str, default=None,
+                        help='RAM-backed directory (e.g. /dev/shm/birch) for checkouts whose measured footprint fits the per-worker share of memory; others stay in --work_dir.')
+    parser.add_argument('--test_baseline_dir', type=str, default=None,
+                        help='Directory of per-bug baselines of the buggy version\'s test outcomes; failures that are flaky or pre-existing in the baseline do not fail a patch.')
+    parser.add_argument('--baseline_runs', type=int, default=3,
+                        help='Test suite runs per bug when measuring a baseline (flaky tests fail in some runs only)')
+    parser.add_argument('--test_impact_dir', type=str, default=None,
+                        help='Directory of per-bug coverage indexes (build_test_impact_index.py); the tests covering the patched lines run with the triggering tests before the suite.')
+    parser.add_argument('--impact_full_suite', type=str, choices=['yes', 'no'], default='no',
+                        help='Confirm a pass of the tests selected by --test_impact_dir with the full test suite instead of the relevant tests')
+    parser.add_argument('--async_patch_files', type=str, choices=['yes', 'no'], default='no',
+                        help='Write the linux_patches/*.patch files from a background thread')
+    parser.add_argument('--validation_cache', type=str, default=None,
+                        help='SQLite file caching compile and test outcomes by bug and patched-file content; identical patch sets skip compilation and testing')
+    parser.add_argument('--syntax_gate', type=str, choices=['yes', 'no'], default='no',
+                        help='Parse the patched files with javalang first and report syntax errors as compile errors without running defects4j compile')
+    parser.add_argument('--replay', type=str, default=None,
+                        help='Results directory of an earlier run. Re-validates the LLM outputs recorded per iteration in its trajectory logs without calling any model; results go to --results_path (default: <replay>_replay).')
+    parser.add_argument('--queue_size', type=int, default=None,
+                        help='Maximum number of generated patch sets waiting for validation. Defaults to --workers.')
+    return parser
+
+def config_from_args(args):
+    dataset_path = resolve_dataset_path(
+        args.multihunk.lower() == 'yes',
+        args.scope,
+        args.dataset_path,
+        args.baseline_dataset_path,
+        args.baseline_block_dataset_path,
+        args.baseline_class_dataset_path,
+        args.baseline_file_dataset_path
+    )
+    return RepairConfig(
+        model=args.model,
+        mode=args.mode,
+        dataset_path=dataset_path,
+        work_dir=args.work_dir,
+        scope=args.scope,
+        api_host=args.api_host,
+        results_path=replay_results_path(args.replay, args.results_path) if args.replay else args.results_path,
+        processed_file=args.processed_file,
+        method=args.method,
+        checkout_dir=args.checkout_dir,
+        fixed_dir=args.fixed_dir,
+        fixed_json=args.fixed_json,
+        max_iterations=args.max_iterations,
+        hunk_concurrency=args.hunk_concurrency,
+        pristine_dir=args.pristine_dir,
+        clone_mode=args.clone_mode,
+        worktree_store=args.worktree_store,
+        incremental_compile=args.incremental_compile == 'yes',
+        trigger_tests_first=args.trigger_tests_first == 'yes',
+        warm_test_runner=args.warm_test_runner == 'yes',
+        tmpfs_dir=args.tmpfs_dir,
+        workers=args.workers,
+        test_baseline_dir=args.test_baseline_dir,
+        baseline_runs=args.baseline_runs,
+        test_impact_dir=args.test_impact_dir,
+        impact_full_suite=args.impact_full_suite == 'yes',
+        async_patch_files=args.async_patch_files == 'yes',
+        validation_cache=args.validation_cache,
+        syntax_gate=args.syntax_gate == 'yes'
+    )
 
-    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
-        dataset = json.load(f)
+def new_feedback_job(project, bug_id, config, dataset=None, journal=None, completions=None, replay=None):
+    if dataset is None:
+        with open(config.dataset_path, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+
+    return {
+        "project": project,
+        "bug_id": bug_id,
+        "dataset": dataset,
+        "journal": journal,
+        "completions": completions,
+        "replay": replay,
+        "trajectory_log": {
+            "bug_id": f"{project}_{bug_id}",
+            "resolution_status": None,  
+            "duration_seconds": 0,
+            "iterations": []
+        },
+        "start_time": time.time(),
+        "total_llm_time": 0,
+        "compile_success": False,
+        "test_success": False,
+        "iteration": 0,
+        "feedback": False,
+        "error_details": "",
+        "all_patches_applied": [],
+        "accumulated_patches": {},
+        "first_try": True,
+        "failed_tests": [],
+        "compile_time": 0,
+        "test_time": 0.0,
+        "stdout": "",
+        "stderr": ""
+    }
 
+def generate_feedback_iteration(job, config):
+    project = job["project"]
+    bug_id = job["bug_id"]
+    dataset = job["dataset"]
     current_bug = f"{project}_{bug_id}"
     bug_count = dataset[current_bug]["bug_count"]
-
-    encodings = ['utf-8', 'ISO-8859-1', 'latin-1', 'cp1252']
-
-    total_llm_time = 0
-    compile_success = False
-    test_success = False
-    iteration = 0
-    feedback = False
-    error_details = ""
-
-    all_patches_applied = []
-
+    accumulated_patches: dict[int, str] = job["accumulated_patches"]
     feedback_prompt = None
-    accumulated_patches: dict[int, str] = {}
-    last_generated_code = None
-    first_try = True
-    failed_tests = []
-
-    while iteration < MAX_ITERATIONS and (not compile_success or not test_success):
-        iteration_start = time.time()
 
-        if not checkout_repo(project, bug_id, WORK_DIR):
-            logging.error(f"Failed to check out {project}-{bug_id}.")
-            return
-        
-        iteration += 1
-        logging.info(f"\n[FeedbackLoop] Iteration {iteration} for {project}-{bug_id}")
+    job["iteration_start"] = time.time()
+    job["iteration"] += 1
+    iteration = job["iteration"]
+    logging.info(f"\n[FeedbackLoop] Iteration {iteration} for {project}-{bug_id}")
 
-        iteration_log = {
-            "iteration": iteration,
-            "hunks": []
-        }
-        iteration_llm_time = 0
-        iteration_patches = []
-        for bug_num in range(bug_count - 1, -1, -1):
-            last_code = accumulated_patches.get(bug_num)
-            if first_try:
-                patches, llm_time, prompt = get_fix_code_algorithm(
-                    project, bug_id, bug_num, dataset, MODE, MODEL,
-                    PROMPT_PATH,  
-                    GENERATED_PATCHES_PATH,
-                    DATASET_PATH,
-                    API_HOST,
-                    CHECKOUT_DIR,
-                    FIXED_DIR,
-                    METHOD,
-                    FIXED_JSON,
-                    feedback,
-                    SCOPE,
+    iteration_log = {
+        "iteration": iteration,
+        "hunks": []
+    }
+    iteration_llm_time = 0
+    iteration_patches = []
+    hunk_patches = []
+
+    def generate_hunk(bug_num):
+        last_code = accumulated_patches.get(bug_num)
+        if job["first_try"]:
+            return get_fix_code_algorithm(
+                project, bug_id, bug_num, dataset, config.mode, config.model,
+                config.prompt_path,  
+                config.generated_patches_path,
+                config.dataset_path,
+                config.api_host,
+                config.checkout_dir,
+                config.fixed_dir,
+                config.method,
+                config.fixed_json,
+                job["feedback"],
+                config.scope,
+                last_code,
+            )
+        else:
+            if not job["compile_success"]:
+                return get_fix_code(
+                    project, bug_id, bug_num, dataset, config.mode, config.model,
+                    config.prompt_path,  
+                    config.generated_patches_path,
+                    config.dataset_path,
+                    config.api_host,
+                    config.scope,
+                    job["feedback"],
                     last_code,
+                    job["error_details"],
+                    prompt_text=feedback_prompt 
                 )
             else:
-                if not compile_success:
-                    patches, llm_time, prompt = get_fix_code(
-                        project, bug_id, bug_num, dataset, MODE, MODEL,
-                        PROMPT_PATH,  
-                        GENERATED_PATCHES_PATH,
-                        DATASET_PATH,
-                        API_HOST,
-                        SCOPE,
-                        feedback,
-                        last_code,
-                        error_details,
-                        prompt_text=feedback_prompt 
-                    )
-                else:
-                    patches, llm_time, prompt = get_fix_code_algorithm(
-                        project, bug_id, bug_num, dataset, MODE, MODEL,
-                        PROMPT_PATH,  
-                        GENERATED_PATCHES_PATH,
-                        DATASET_PATH,
-                        API_HOST,
-                        CHECKOUT_DIR,
-                        FIXED_DIR,
-                        METHOD,
-                        FIXED_JSON,
-                        feedback,
-                        SCOPE,
-                        last_code,
-                        prompt_text=feedback_prompt  
-                    )
-            
-            iteration_llm_time += llm_time
-
-            input_tokens = count_tokens(prompt)
-            output = "\n".join(patches) if isinstance(patches, list) else str(patches)
-            output_tokens = count_tokens(output)
-
-            hunk_log = {
-                "hunk_index": bug_num,
-                "input": prompt,
-                "output": output,
-                "latency_ms": llm_time / 1000.0,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
-            }
-            iteration_log["hunks"].append(hunk_log)
-
-            total_llm_time += llm_time
-            if patches is None:
-                continue
-            iteration_patches.extend(patches)
-
-            accumulated_patches[bug_num] = output
-
-            patch_validator = PatchValidation(patches)
-            patch_validator.apply_patch(
-                dataset[current_bug],
-                os.path.join(
-                    WORK_DIR, f'{project}_{bug_id}',
-                    dataset[current_bug]["buggy_code"][str(bug_num)]["file"]
-                ),
-                encodings,
-                bug_num,
-                current_bug,
-                LINUX_PATCHES_PATH,
-                MODE
-            )
+                return get_fix_code_algorithm(
+                    project, bug_id, bug_num, dataset, config.mode, config.model,
+                    config.prompt_path,  
+                    config.generated_patches_path,
+                    config.dataset_path,
+                    config.api_host,
+                    config.checkout_dir,
+                    config.fixed_dir,
+                    config.method,
+                    config.fixed_json,
+                    job["feedback"],
+                    config.scope,
+                    last_code,
+                    prompt_text=feedback_prompt  
+                )
 
-        first_try = False
-        all_patches_applied.extend(iteration_patches)
+    if job["replay"]:
+        generate_hunk = lambda bug_num: job["replay"].hunk_output(current_bug, bug_num, iteration)
+    else:
+        generate_hunk = reuse_completions(job["completions"], generate_hunk, current_bug, config.mode, config.model, config.scope, config.method, iteration)
+    generated = generate_hunks_concurrently(generate_hunk, range(bug_count - 1, -1, -1), config.hunk_concurrency)
+
+    for bug_num in range(bug_count - 1, -1, -1):
+        patches, llm_time, prompt = generated[bug_num]
+        iteration_llm_time += llm_time
+
+        input_tokens = count_tokens(prompt)
+        output = "\n".join(patches) if isinstance(patches, list) else str(patches)
+        output_tokens = count_tokens(output)
+
+        hunk_log = {
+            "hunk_index": bug_num,
+            "input": prompt,
+            "output": output,
+            "latency_ms": llm_time / 1000.0,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens
+        }
+        iteration_log["hunks"].append(hunk_log)
+
+        job["total_llm_time"] += llm_time
+        if patches is None:
+            continue
+        iteration_patches.extend(patches)
+
+        accumulated_patches[bug_num] = output
+        hunk_patches.append((bug_num, patches))
+
+    job["first_try"] = False
+    job["all_patches_applied"].extend(iteration_patches)
+    job["iteration_log"] = iteration_log
+    job["iteration_llm_time"] = iteration_llm_time
+    job["iteration_patches"] = iteration_patches
+    job["hunk_patches"] = hunk_patches
+    return job
+
+def validate_feedback_iteration(job, config, work_dir=None):
+    """
+    Applies, compiles and tests the patches generated for the current
+    iteration. Returns True if the bug needs another feedback iteration;
+    otherwise the final results are written and False is returned.
+    """
+    if work_dir is None:
+        work_dir = config.work_dir
+    project = job["project"]
+    bug_id = job["bug_id"]
+    dataset = job["dataset"]
+    current_bug = f"{project}_{bug_id}"
+    iteration = job["iteration"]
+    iteration_log = job["iteration_log"]
+    iteration_patches = job["iteration_patches"]
+    trajectory_log = job["trajectory_log"]
+
+    placement = get_tmpfs_placement(config.tmpfs_dir, config.workers, config.work_dir) if config.tmpfs_dir else None
+    if placement:
+        work_dir = placement.work_dir_for(project, work_dir)
+
+    clear_work_dir(work_dir)
+
+    if not checkout_repo(project, bug_id, work_dir, config.pristine_dir, config.clone_mode, config.worktree_store):
+        logging.error(f"Failed to check out {project}-{bug_id}.")
+        return False
+
+    baseline = None
+    if config.test_baseline_dir:
+        baseline = ensure_test_baseline(
+            config.test_baseline_dir, project, bug_id,
+            os.path.join(work_dir, f'{project}_{bug_id}'),
+            config.baseline_runs
+        )
+
+    encodings = ['utf-8', 'ISO-8859-1', 'latin-1', 'cp1252']
+
+    patched_contents = apply_patches(
+        dataset[current_bug],
+        os.path.join(work_dir, f'{project}_{bug_id}'),
+        job["hunk_patches"],
+        encodings,
+        current_bug,
+        config.linux_patches_path,
+        config.mode,
+        config.async_patch_files
+    )
 
-        compile_start = time.time()
-        compile_returncode, compile_errormsg = compile_repo(
-            os.path.join(WORK_DIR, f'{project}_{bug_id}')
+    validation_cache = get_validation_cache(config.validation_cache) if config.validation_cache else None
+    content_hash = patch_set_hash(patched_contents) if validation_cache else None
+    # The buggy version's outcome is known; only bugs with triggering tests
+    # to report are short-circuited.
+    unchanged = bool(trigger_test_ids(dataset[current_bug])) and is_noop(patched_contents)
+    iteration_log["unchanged"] = unchanged
+    if unchanged:
+        logging.info(f"[FeedbackLoop] Patches of {project}-{bug_id} leave the buggy code unchanged on iteration {iteration}; recording its outcome without compiling or testing")
+
+    patched_files = [dataset[current_bug]["buggy_code"][str(bug_num)]["file"] for bug_num, _ in job["hunk_patches"]]
+    pristine_repo_dir = pristine_checkout_path(project, bug_id, config.pristine_dir) if config.incremental_compile else None
+
+    def compile_fn():
+        if config.syntax_gate:
+            rejected = reject_unparsable(os.path.join(work_dir, f'{project}_{bug_id}'), patched_contents)
+            if rejected:
+                return rejected
+        return compile_repo(
+            os.path.join(work_dir, f'{project}_{bug_id}'),
+            patched_files,
+            pristine_repo_dir
         )
-        compile_duration = time.time() - compile_start
-        compile_time = compile_duration
 
-        test_time = 0.0
+    if unchanged:
+        compile_returncode, compile_errormsg, compile_duration, compile_cached = 0, '', 0.0, False
+    else:
+        compile_returncode, compile_errormsg, compile_duration, compile_cached = cached_compile(
+            validation_cache, current_bug, content_hash,
+            compile_variant(pristine_repo_dir is not None, config.syntax_gate, config.pristine_dir),
+            compile_fn
+        )
+    iteration_log["compile_cached"] = compile_cached
+    compile_time = compile_duration
+    job["compile_time"] = compile_time
 
-        if compile_returncode == 0:
-            compile_success = True
-            logging.info(f"[FeedbackLoop] Compile Succeeded on iteration {iteration}")
-        else:
-            compile_success = False
-            feedback = True
-            error_details = parse_compiler_errors(compile_errormsg)
+    test_time = 0.0
+    job["test_time"] = test_time
 
-            log_file_path = os.path.join(COMPILE_INFO_PATH, f"{project}_{bug_id}_compile_logs_iter{iteration}.json")
-            save_compiler_logs(project, bug_id, error_details, iteration_patches, log_file_path)
+    if compile_returncode == 0:
+        job["compile_success"] = True
+        logging.info(f"[FeedbackLoop] Compile Succeeded on iteration {iteration}")
+    else:
+        job["compile_success"] = False
+        job["feedback"] = True
+        error_details = parse_compiler_errors(compile_errormsg)
+        job["error_details"] = error_details
+
+        log_file_path = os.path.join(config.compile_info_path, f"{project}_{bug_id}_compile_logs_iter{iteration}.json")
+        save_compiler_logs(project, bug_id, error_details, iteration_patches, log_file_path)
 
-            metrics_path = os.path.join(COMPILE_INFO_PATH,  f"{project}_{bug_id}_compiler_error_metrics.json")
-            track_compiler_error_metrics(error_details, metrics_path)
+        metrics_path = os.path.join(config.compile_info_path,  f"{project}_{bug_id}_compiler_error_metrics.json")
+        track_compiler_error_metrics(error_details, metrics_path)
 
+        write_result_csv(
+            project, bug_id, compile_returncode, -1, [],
+            config.mode, config.results_base_path, job["total_llm_time"], compile_time, 0
+        )
+        save_compile_results(project, bug_id, compile_errormsg, config.compile_results_path)
+        if placement:
+            placement.record_footprint(project, os.path.join(work_dir, f'{project}_{bug_id}'))
+
+        logging.error(f"[FeedbackLoop] Compilation failed for {project}-{bug_id} on iteration {iteration}:\n{compile_errormsg}")
+        print(f"[FeedbackLoop] Compilation failed for {project}-{bug_id} on iteration {iteration}:\n{compile_errormsg}")
+
+        iteration_end = time.time()
+        iteration_log["time_total_iteration"] = iteration_end - job["iteration_start"]
+        iteration_log["time_compilation_iteration"] = compile_time
+        iteration_log["time_test_iteration"] = test_time
+        iteration_log["time_llm_invocation_iteration"] = job["iteration_llm_time"] / 1000.0 
+        
+        trajectory_log["iterations"].append(iteration_log)
+        
+        if iteration < config.max_iterations:
+            logging.info(f"[FeedbackLoop] Re-running with updated prompt... Iteration: {iteration+1}")
+        else:
+            logging.info(f"[FeedbackLoop] Reached MAX_ITERATIONS={config.max_iterations}, giving up.")
+        clear_work_dir(work_dir)
+
+    if job["compile_success"]:
+        trigger_tests = trigger_test_ids(dataset[current_bug]) if config.trigger_tests_first else None
+        impacted_tests = None
+        if config.test_impact_dir:
+            buggy_code = dataset[current_bug]["buggy_code"]
+            hunks = [
+                (buggy_code[str(bug_num)]["file"], buggy_code[str(bug_num)]["start_line"], buggy_code[str(bug_num)]["end_line"])
+                for bug_num, _ in job["hunk_patches"]
+            ]
+            impacted_tests = get_test_impact_index(config.test_impact_dir).covering_tests(project, bug_id, hunks)
+        relevant_only = only_modified_classes_patched(baseline, patched_files)
+        full_suite = impacted_tests is None or config.impact_full_suite
+        if unchanged:
+            test_returncode, failed_tests, stdout, stderr = unchanged_test_result(trigger_test_ids(dataset[current_bug]))
+            test_time, test_cached = 0.0, False
+        else:
+            test_returncode, failed_tests, stdout, stderr, test_time, test_cached = cached_test(
+                validation_cache, current_bug, content_hash,
+                test_variant((trigger_tests or []) + (impacted_tests or []), relevant_only, full_suite),
+                lambda: run_test(
+                    os.path.join(work_dir, f'{project}_{bug_id}'),
+                    trigger_tests,
+                    pristine_checkout_path(project, bug_id, config.pristine_dir) if config.warm_test_runner else None,
+                    relevant_only,
+                    full_suite,
+                    impacted_tests
+                ),
+                compile_fn if compile_cached else None
+            )
+        iteration_log["test_cached"] = test_cached
+        failed_tests, flaky_tests, preexisting_tests = classify_failures(failed_tests, baseline, trigger_test_ids(dataset[current_bug]))
+        if flaky_tests or preexisting_tests:
+            logging.info(f"[FeedbackLoop] Ignoring baseline failures for {project}-{bug_id}: flaky {flaky_tests}, preexisting {preexisting_tests}")
+        job["test_time"] = test_time
+        job["failed_tests"] = failed_tests
+        job["stdout"] = stdout
+        job["stderr"] = stderr
+        if placement:
+            placement.record_footprint(project, os.path.join(work_dir, f'{project}_{bug_id}'))
+
+        job["test_success"] = (test_returncode == 0 and not failed_tests)
+
+        if not job["test_success"]:
+            job["feedback"] = True
             write_result_csv(
-                project, bug_id, compile_returncode, -1, [],
-                MODE, results_base_path, total_llm_time, compile_time, 0
+                project, bug_id,
+                0,
+                job["test_success"],
+                failed_tests,
+                config.mode,
+                config.results_base_path,
+                job["total_llm_time"],
+                compile_time,
+                test_time
             )
-            save_compile_results(project, bug_id, compile_errormsg, COMPILE_RESULTS_PATH)
-
-            logging.error(f"[FeedbackLoop] Compilation failed for {project}-{bug_id} on iteration {iteration}:\n{compile_errormsg}")
-            print(f"[FeedbackLoop] Compilation failed for {project}-{bug_id} on iteration {iteration}:\n{compile_errormsg}")
-
-            iteration_end = time.time()
-            iteration_log["time_total_iteration"] = iteration_end - iteration_start
-            iteration_log["time_compilation_iteration"] = compile_time
-            iteration_log["time_test_iteration"] = test_time
-            iteration_log["time_llm_invocation_iteration"] = iteration_llm_time / 1000.0 
-            
-            trajectory_log["iterations"].append(iteration_log)
-            
-            if iteration < MAX_ITERATIONS:
+            save_test_results(project, bug_id, stdout, stderr, config.test_results_path)
+
+            if iteration < config.max_iterations:
                 logging.info(f"[FeedbackLoop] Re-running with updated prompt... Iteration: {iteration+1}")
-                clear_work_dir(WORK_DIR)
             else:
-                logging.info(f"[FeedbackLoop] Reached MAX_ITERATIONS={MAX_ITERATIONS}, giving up.")
-                clear_work_dir(WORK_DIR)
+                logging.info(f"[FeedbackLoop] Reached MAX_ITERATIONS={config.max_iterations}, giving up.")
+            clear_work_dir(work_dir)
+
+        iteration_end = time.time()
+        iteration_log["time_total_iteration"] = iteration_end - job["iteration_start"]
+        iteration_log["time_compilation_iteration"] = compile_time
+        iteration_log["time_test_iteration"] = test_time
+        iteration_log["time_llm_invocation_iteration"] = job["iteration_llm_time"] / 1000.0 
+        
+        trajectory_log["iterations"].append(iteration_log)
 
-        if compile_success:
-            test_start_time = time.time()
-            test_returncode, failed_tests, stdout, stderr = run_test(
-                os.path.join(WORK_DIR, f'{project}_{bug_id}')
-            )
-            test_end_time = time.time()
-            test_time = test_end_time - test_start_time
-
-            test_success = (test_returncode == 0 and not failed_tests)
-
-            if not test_success:
-                feedback = True
-                write_result_csv(
-                    project, bug_id,
-                    0 if compile_success else -1,
-                    test_success,
-                    failed_tests if not (test_success and compile_success) else [],
-                    MODE,
-                    results_base_path,
-                    total_llm_time,
-                    compile_time,
-                    test_time
-                )
-                save_test_results(project, bug_id, stdout, stderr, TEST_RESULTS_PATH)
-
-                if iteration < MAX_ITERATIONS:
-                    logging.info(f"[FeedbackLoop] Re-running with updated prompt... Iteration: {iteration+1}")
-                    clear_work_dir(WORK_DIR)
-                else:
-                    logging.info(f"[FeedbackLoop] Reached MAX_ITERATIONS={MAX_ITERATIONS}, giving up.")
-                    clear_work_dir(WORK_DIR)
-
-            iteration_end = time.time()
-            iteration_log["time_total_iteration"] = iteration_end - iteration_start
-            iteration_log["time_compilation_iteration"] = compile_time
-            iteration_log["time_test_iteration"] = test_time
-            iteration_log["time_llm_invocation_iteration"] = iteration_llm_time / 1000.0 
-            
-            trajectory_log["iterations"].append(iteration_log)
-
-            if test_success:
-                break
+    # A replay can only continue as long as the recorded run did.
+    recorded_iterations = job["replay"].iteration_count(f"{project}_{bug_id}") if job["replay"] else config.max_iterations
+    if iteration < min(config.max_iterations, recorded_iterations) and (not job["compile_success"] or not job["test_success"]):
+        return True
+
+    finalize_feedback_job(job, config)
+    return False
+
+def finalize_feedback_job(job, config):
+    project = job["project"]
+    bug_id = job["bug_id"]
+    current_bug = f"{project}_{bug_id}"
+    trajectory_log = job["trajectory_log"]
+    compile_success = job["compile_success"]
+    test_success = job["test_success"]
+    failed_tests = job["failed_tests"]
 
     end_time = time.time()
-    total_duration = end_time - start_time
+    total_duration = end_time - job["start_time"]
     trajectory_log["duration_seconds"] = total_duration
 
     if compile_success and test_success:
@@ -369,31 +547,85 @@ def run_birch_with_feedback(
         0 if compile_success else -1,
         test_success,
         failed_tests if not (test_success and compile_success) else [],
-        MODE,
-        results_base_path,
-        total_llm_time,
-        compile_time,
-        test_time
+        config.mode,
+        config.results_base_path,
+        job["total_llm_time"],
+        job["compile_time"],
+        job["test_time"]
     )
     if compile_success:
-        save_test_results(project, bug_id, stdout, stderr, TEST_RESULTS_PATH)
+        save_test_results(project, bug_id, job["stdout"], job["stderr"], config.test_results_path)
+
+    save_trajectory_log(trajectory_log, os.path.join(config.trajectory_logs_path, f"{current_bug}_trajectory.json"))
+    if job["journal"]:
+        job["journal"].mark_done(config.mode, current_bug, status=trajectory_log["resolution_status"], iterations=job["iteration"])
+
+def run_birch_with_feedback(project, bug_id, config, dataset=None, work_dir=None, completions=None, replay=None):
+    """
+    Library entry point: repairs one bug with the compile/test feedback loop.
+    Pass an already loaded `dataset` to avoid re-reading it for every bug.
+    """
+    job = new_feedback_job(project, bug_id, config, dataset, completions=completions, replay=replay)
+    while True:
+        generate_feedback_iteration(job, config)
+        if not validate_feedback_iteration(job, config, work_dir):
+            break
+
+def run_dataset_with_feedback(config, bugs=None, workers=1, llm_workers=1, queue_size=None, journal=None, completions=None, schedule_history=None, replay=None):
+    """
+    Repairs every (project, bug_id) in `bugs` (default: the whole dataset) in
+    this process, overlapping LLM generation with compilation and testing.
+    The dataset is loaded once and shared by all bugs. Bugs already finished
+    according to `journal` are skipped, so an interrupted run resumes. With
+    `schedule_history` (trajectory_logs directories) bugs are dispatched
+    longest-first. With `replay` (RecordedOutputs) the recorded LLM outputs
+    of its bugs are re-validated instead of calling the model.
+    """
+    with open(config.dataset_path, 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+    if bugs is None:
+        bugs = extract_projects_and_bugs(config.dataset_path)
+    if replay:
+        recorded_bugs = set(replay.bugs())
+        bugs = [entry for entry in bugs if entry in recorded_bugs]
+    if journal:
+        bugs = [entry for entry in bugs if not journal.is_done(config.mode, f"{entry[0]}_{entry[1]}")]
+        if not bugs:
+            print(f"All bugs have been processed. Run with --reset_processed to start over ({journal.path}).")
+            return
+    if schedule_history is not None:
+        bugs = order_longest_first(bugs, schedule_history + [config.trajectory_logs_path], dataset)
+
+    pipeline = RepairPipeline(
+        lambda entry: generate_feedback_iteration(new_feedback_job(entry[0], entry[1], config, dataset, journal, completions, replay), config),
+        lambda job, worker_dir: validate_feedback_iteration(job, config, worker_dir),
+        config.work_dir,
+        generate_workers=llm_workers,
+        validate_workers=workers,
+        queue_size=queue_size
+    )
+    pipeline.run(bugs)
 
-    logs_output_path = os.path.join(TRAJECTORY_LOGS_PATH, f"{current_bug}_trajectory.json")
-    os.makedirs(os.path.dirname(logs_output_path), exist_ok=True)
+def run_from_args(args):
+    config = config_from_args(args)
+    replay = RecordedOutputs(args.replay) if args.replay else None
+    completions = CompletionStore.for_results(config.results_base_path) if args.reuse_completions == 'yes' and not replay else None
 
-    with open(logs_output_path, 'w', encoding='utf-8') as log_f:
-        json.dump(trajectory_log, log_f, indent=4)
+    if args.project and args.bug_id:
+        run_birch_with_feedback(args.project, args.bug_id, config, completions=completions, replay=replay)
+        return
 
-    logging.info(f"Trajectory logs saved to: {logs_output_path}")
+    if replay:
+        # Replays are resumed from their own results directory.
+        journal = RunJournal.for_processed_file(os.path.join(config.results_base_path, "processed.json"), reset=args.reset_processed)
+    else:
+        journal = RunJournal.for_processed_file(config.processed_file, reset=args.reset_processed)
+    run_dataset_with_feedback(config, workers=args.workers, llm_workers=args.llm_workers, queue_size=args.queue_size, journal=journal, completions=completions,
+                              schedule_history=args.schedule_history if args.schedule == 'longest_first' else None, replay=replay)
 
+def main(argv=None):
+    run_from_args(build_parser().parse_args(argv))
 
 
 if __name__ == "__main__":
-    run_birch_with_feedback(
-        project=PROJECT,
-        bug_id=BUG_ID,
-        MODE=MODE,
-        MODEL=MODEL,
-        API_HOST=API_HOST,
-        MAX_ITERATIONS=MAX_ITERATIONS
-    )
+    main()
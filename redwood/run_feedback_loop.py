@@ -1,28 +1,16 @@
-import subprocess
-import json
-import os
-import argparse
-from birch.utils.d4j_infra import extract_projects_and_bugs
+from d4j_code_repair_redwood import build_parser, run_from_args
 
-parser = argparse.ArgumentParser(description='Defects4J Bug Processing Script')
-parser.add_argument('--dataset_path', type=str, default=".config/method_multihunk.json",
-                    help='Path to the dataset JSON file')
-args = parser.parse_args()
+DEFAULT_MODEL = "bedrock/us.meta.llama3-3-70b-instruct-v1:0"
 
-DATASET = args.dataset_path
-
-def main():
-    # Path to your JSON config file
-    dataset_path = DATASET
-
-    # Read (project, bug_id) pairs from JSON
-    projects_and_bugs = extract_projects_and_bugs(dataset_path)
-
-    # Loop over each bug and run the script
-    for project, bug_id in projects_and_bugs:
-        command = f"python d4j_code_repair_redwood.py --model bedrock/us.meta.llama3-3-70b-instruct-v1:0 --project {project} --bug_id {bug_id}"
-        print(f"Executing: {command}")
-        subprocess.run(command, shell=True)
+def main(argv=None):
+    # Every bug of the dataset is repaired in this process: the dataset,
+    # retrieval indexes and embedding models are loaded once and shared,
+    # instead of paying interpreter start-up and artifact loading per bug.
+    parser = build_parser(default_model=DEFAULT_MODEL)
+    parser.description = 'Runs the Redwood feedback loop over every bug of a dataset'
+    args = parser.parse_args(argv)
+    args.project = args.bug_id = None
+    run_from_args(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,276 @@
+import os
+import argparse
+import itertools
+import threading
+import tomllib
+
+from birch.utils.d4j_infra import get_fix_code, extract_projects_and_bugs, load_dataset_cached, remove_pristine_checkout
+from birch.utils.repair_config import RepairConfig, resolve_dataset_path
+from birch.utils.repair_pipeline import RepairPipeline
+from birch.utils.run_journal import RunJournal
+from birch.utils.completion_store import CompletionStore
+from birch.utils.bug_scheduler import order_longest_first
+from birch.utils.single_pass_repair import generate_bug_patches, validate_bug_patches
+from birch.calculate_results import analyze_results
+from redwood.algorithms.algorithm_infra import get_fix_code_algorithm
+from d4j_code_repair_redwood import new_feedback_job, generate_feedback_iteration, validate_feedback_iteration
+
+# birch: single pass with the BIRCH prompts (d4j_code_repair.py)
+# retrieval: single pass with retrieved examples (d4j_repair_algorithms.py)
+# redwood: retrieval plus compile/test feedback loop (d4j_code_repair_redwood.py)
+ENGINES = ("birch", "retrieval", "redwood")
+
+DEFAULT_PATHS = {
+    "dataset_path": "../birch/config/d4j_dataset.json",
+    "baseline_dataset_path": "./config/method_multihunk.json",
+    "baseline_block_dataset_path": "./config/block_multihunk.json",
+    "baseline_class_dataset_path": "./config/class_multihunk.json",
+    "baseline_file_dataset_path": "./config/files_multihunk.json",
+    "checkout_dir": "~/WORK_DIR",
+    "fixed_dir": "~/WORK_DIR_FIXED",
+    "fixed_json": "./config/enclosing_method_context_javaparser_fixed.json",
+}
+
+DEFAULT_RUN = {
+    "work_dir": "/tmp/work_dir",
+    "pristine_dir": "/tmp/work_dir_pristine",
+    "keep_pristine": False,
+    "clone_mode": "reflink",
+    "worktree_store": None,
+    "incremental_compile": False,
+    "trigger_tests_first": False,
+    "warm_test_runner": False,
+    "tmpfs_dir": None,
+    "test_baseline_dir": None,
+    "baseline_runs": 3,
+    "test_impact_dir": None,
+    "impact_full_suite": False,
+    "async_patch_files": False,
+    "validation_cache": None,
+    "syntax_gate": False,
+    "results_path": "./results/mode_{mode}_model_{model}",
+    "multihunk": "yes",
+    "api_host": None,
+    "workers": 1,
+    "llm_workers": 1,
+    "hunk_concurrency": 1,
+    "queue_size": None,
+    "max_iterations": 3,
+    "reuse_completions": True,
+    "schedule": "dataset",
+    "bugs": None,
+}
+
+def load_matrix(matrix_path):
+    with open(matrix_path, 'rb') as f:
+        matrix = tomllib.load(f)
+
+    run = dict(DEFAULT_RUN, **matrix.get("run", {}))
+    paths = dict(DEFAULT_PATHS, **matrix.get("paths", {}))
+    for key in ("checkout_dir", "fixed_dir"):
+        paths[key] = os.path.expanduser(paths[key])
+
+    grids = matrix.get("matrix", [])
+    if isinstance(grids, dict):
+        grids = [grids]
+    if not grids:
+        raise ValueError(f"{matrix_path} has no [matrix] or [[matrix]] table")
+    return run, paths, grids
+
+def expand_cells(run, paths, grids):
+    """
+    Expands every grid (engines x models x modes x scopes x methods) into one
+    RepairConfig per cell. The birch engine does not retrieve, so it ignores
+    `methods`. Two cells may not share a results directory.
+    """
+    cells = {}
+    for grid in grids:
+        engines = grid.get("engines", ["redwood"])
+        for engine in engines:
+            if engine not in ENGINES:
+                raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+            methods = [None] if engine == "birch" else grid.get("methods", ["rag"])
+            for model, mode, scope, method in itertools.product(grid["models"], grid.get("modes", [4]), grid.get("scopes", ["method"]), methods):
+                key = (engine, model, int(mode), scope, method)
+                if key not in cells:
+                    cells[key] = _make_cell(key, run, paths)
+
+    by_results_path = {}
+    for cell in cells.values():
+        other = by_results_path.setdefault(os.path.abspath(cell["config"].results_base_path), cell)
+        if other is not cell:
+            raise ValueError(
+                f"Cells {other['name']} and {cell['name']} both write to {cell['config'].results_base_path}; "
+                "add {engine}, {scope} or {method} to results_path in [run]"
+            )
+    return list(cells.values())
+
+def _make_cell(key, run, paths):
+    engine, model, mode, scope, method = key
+    dataset_path = resolve_dataset_path(
+        str(run["multihunk"]).lower() == 'yes',
+        scope,
+        paths["dataset_path"],
+        paths["baseline_dataset_path"],
+        paths["baseline_block_dataset_path"],
+        paths["baseline_class_dataset_path"],
+        paths["baseline_file_dataset_path"]
+    )
+    results_path = run["results_path"].format(engine=engine, model=model, mode=mode, scope=scope, method=method or "none")
+    config = RepairConfig(
+        model=model,
+        mode=mode,
+        dataset_path=dataset_path,
+        work_dir=run["work_dir"],
+        scope=scope,
+        api_host=run["api_host"],
+        results_path=results_path,
+        method=method,
+        checkout_dir=paths["checkout_dir"],
+        fixed_dir=paths["fixed_dir"],
+        fixed_json=paths["fixed_json"],
+        max_iterations=run["max_iterations"],
+        hunk_concurrency=run["hunk_concurrency"],
+        pristine_dir=run["pristine_dir"],
+        clone_mode=run["clone_mode"],
+        worktree_store=run["worktree_store"],
+        incremental_compile=run["incremental_compile"],
+        trigger_tests_first=run["trigger_tests_first"],
+        warm_test_runner=run["warm_test_runner"],
+        tmpfs_dir=run["tmpfs_dir"],
+        workers=run["workers"],
+        test_baseline_dir=run["test_baseline_dir"],
+        baseline_runs=run["baseline_runs"],
+        test_impact_dir=run["test_impact_dir"],
+        impact_full_suite=run["impact_full_suite"],
+        async_patch_files=run["async_patch_files"],
+        validation_cache=run["validation_cache"],
+        syntax_gate=run["syntax_gate"]
+    )
+    return {
+        "name": f"{engine}/{model}/mode_{mode}/{scope}/{method or '-'}",
+        "engine": engine,
+        "config": config,
+        "journal": None,
+        "completions": None,
+    }
+
+def _fix_code_fn(cell):
+    config = cell["config"]
+    if cell["engine"] == "birch":
+        return lambda project, bug_id, bug_num, dataset: get_fix_code(
+            project, bug_id, bug_num, dataset, config.mode, config.model, config.prompt_path,
+            config.generated_patches_path, config.dataset_path, config.api_host, config.scope
+        )
+    return lambda project, bug_id, bug_num, dataset: get_fix_code_algorithm(
+        project, bug_id, bug_num, dataset, config.mode, config.model, config.prompt_path,
+        config.generated_patches_path, config.dataset_path, config.api_host, config.checkout_dir,
+        config.fixed_dir, config.method, config.fixed_json, False, config.scope, None
+    )
+
+def plan_jobs(cells, run):
+    """
+    Groups the pending (cell, bug) pairs by bug, longest bugs first, so every
+    cell touching a bug runs while its shared checkout, dataset entry and
+    retrieval results are hot. Returns the jobs and the cells per bug.
+    """
+    cells_per_bug = {}
+    for cell in cells:
+        config = cell["config"]
+        for project, bug_id in extract_projects_and_bugs(config.dataset_path):
+            bug = f"{project}_{bug_id}"
+            if run["bugs"] and bug not in run["bugs"]:
+                continue
+            if cell["journal"].is_done(config.mode, bug):
+                continue
+            cells_per_bug.setdefault((project, bug_id), []).append(cell)
+
+    bugs = list(cells_per_bug)
+    if run["schedule"] == "longest_first":
+        history = sorted({cell["config"].trajectory_logs_path for cell in cells})
+        bugs = order_longest_first(bugs, history, load_dataset_cached(cells[0]["config"].dataset_path))
+
+    jobs = []
+    for project, bug_id in bugs:
+        for cell in cells_per_bug[(project, bug_id)]:
+            jobs.append({"cell": cell, "project": project, "bug_id": bug_id, "state": None})
+    return jobs, cells_per_bug
+
+def run_matrix(matrix_path, dry_run=False):
+    run, paths, grids = load_matrix(matrix_path)
+    cells = expand_cells(run, paths, grids)
+    for cell in cells:
+        results_base_path = cell["config"].results_base_path
+        cell["journal"] = RunJournal(os.path.join(results_base_path, "processed.jsonl"))
+        if run["reuse_completions"]:
+            cell["completions"] = CompletionStore.for_results(results_base_path)
+        cell["fix_code"] = _fix_code_fn(cell)
+
+    jobs, cells_per_bug = plan_jobs(cells, run)
+    print(f"{len(cells)} cells, {len(cells_per_bug)} bugs, {len(jobs)} pending (cell, bug) runs")
+    if dry_run:
+        for cell in cells:
+            print(f"  {cell['name']} -> {cell['config'].results_base_path}")
+        return
+
+    remaining = {bug: len(bug_cells) for bug, bug_cells in cells_per_bug.items()}
+    remaining_lock = threading.Lock()
+
+    def generate(job):
+        cell = job["cell"]
+        config = cell["config"]
+        dataset = load_dataset_cached(config.dataset_path)
+        if cell["engine"] == "redwood":
+            if job["state"] is None:
+                job["state"] = new_feedback_job(job["project"], job["bug_id"], config, dataset, cell["journal"], cell["completions"])
+            generate_feedback_iteration(job["state"], config)
+        else:
+            job["state"] = generate_bug_patches(job["project"], job["bug_id"], config, cell["fix_code"], cell["journal"], cell["completions"], dataset)
+        return job
+
+    def validate(job, work_dir):
+        cell = job["cell"]
+        if cell["engine"] == "redwood":
+            if validate_feedback_iteration(job["state"], cell["config"], work_dir):
+                return True
+        else:
+            validate_bug_patches(job["state"], cell["config"], cell["journal"], work_dir)
+        return False
+
+    def done(job):
+        # Runs for jobs that failed in generation or validation too, so the
+        # pristine checkout of every bug is removed once its cells are done.
+        bug = (job["project"], job["bug_id"])
+        with remaining_lock:
+            remaining[bug] -= 1
+            finished = remaining[bug] == 0
+        if finished and run["pristine_dir"] and not run["keep_pristine"]:
+            remove_pristine_checkout(job["project"], job["bug_id"], run["pristine_dir"])
+
+    pipeline = RepairPipeline(
+        generate,
+        validate,
+        run["work_dir"],
+        generate_workers=run["llm_workers"],
+        validate_workers=run["workers"],
+        queue_size=run["queue_size"],
+        done_fn=done
+    )
+    pipeline.run(jobs)
+
+    for cell in cells:
+        config = cell["config"]
+        input_csv = os.path.abspath(os.path.join(config.results_base_path, f"test_results_mode_{config.mode}.csv"))
+        if os.path.exists(input_csv):
+            output_csv = os.path.abspath(os.path.join(config.results_base_path, f"test_statistics_mode_{config.mode}.csv"))
+            analyze_results(input_csv, output_csv)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs a models x modes x scopes x retrieval methods grid over Defects4J, grouped by bug')
+    parser.add_argument('matrix', type=str, help='Path to the matrix TOML file')
+    parser.add_argument('--dry_run', action='store_true', help='Only print the expanded cells and the number of pending runs')
+    args = parser.parse_args(argv)
+    run_matrix(args.matrix, args.dry_run)
+
+if __name__ == "__main__":
+    main()
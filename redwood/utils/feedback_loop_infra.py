@@ -4,7 +4,7 @@ import csv
 import json
 from birch.llm.llm_api_call import invoke_llm
 from birch.prompts.prompt import generate_prompt
-from birch.utils.d4j_infra import concatenate_trigger_test_info, strip_code_block
+from birch.utils.d4j_infra import concatenate_trigger_test_info, strip_code_block, append_to_file
 from redwood.prompts.compiler_error_prompts import generate_feedback_enhanced_prompt
 from dotenv import load_dotenv
 from birch.llm.models import Models
@@ -69,9 +69,7 @@ def get_fix_code(project, bug_id, bug_num, dataset, mode, model, PROMPT_PATH, GE
         os.makedirs(PROMPT_PATH)
     suggestion_prompt_file_path = os.path.join(PROMPT_PATH, f'{current_bug}_prompt_{mode}.txt')
 
-    with open(suggestion_prompt_file_path, 'a', encoding='utf-8') as file:
-        file.write(prompt)
-        file.write("\n\n")
+    append_to_file(suggestion_prompt_file_path, prompt + "\n\n")
 
     fixed_code, inference_time = invoke_llm(model, system_prompt, prompt, API_HOST)
     if fixed_code is None:
@@ -84,9 +82,7 @@ def get_fix_code(project, bug_id, bug_num, dataset, mode, model, PROMPT_PATH, GE
     generated_patches_file_path = os.path.join(
         GENERATED_PATCHES_PATH, f'{current_bug}_generated_patches_{mode}.txt'
     )
-    with open(generated_patches_file_path, 'a', encoding='utf-8') as file:
-        file.write(fixed_code)
-        file.write("\n")
+    append_to_file(generated_patches_file_path, fixed_code + "\n")
 
     return fixed_code, inference_time, prompt
 